@@ -7,6 +7,82 @@ class Settings(BaseSettings):
     model: str = 'claude-sonnet-4-20250514'
     default_max_tokens: int = 300
     max_tokens_limit: int = 1200
+    # 同時進行中的 Claude 呼叫上限（自適應上限的最大值）
+    max_concurrent_upstream: int = 64
+    # 自適應並發上限：初始值、下限，以及延遲超過基準幾倍視為壅塞
+    upstream_initial_concurrency: int = 16
+    upstream_min_concurrency: int = 2
+    upstream_latency_tolerance: float = 1.5
+    # 超過並發上限時最多等幾秒，等不到就直接走題庫 fallback
+    admission_wait_seconds: float = 0.25
+    # 單次 Claude 呼叫（含 SDK 重試）的 timeout；整個請求（含 hedge）的總 deadline，超過就走題庫
+    # 串流：第一個 token 與之後每段 delta 的等待上限都用 upstream_attempt_timeout_seconds
+    upstream_attempt_timeout_seconds: float = 20
+    upstream_deadline_seconds: float = 30
+    # hedged request：第一個 attempt 超過近期 p95 延遲（至少 hedge_min_delay 秒）仍未回來，
+    # 再送一個，先回來的採用；額外呼叫量上限為請求數的 hedge_budget_ratio（0 = 關閉）
+    hedge_budget_ratio: float = 0.05
+    hedge_min_delay_seconds: float = 1.0
+    # per-key 配額（每分鐘請求數 / 估計 token 數，0 = 不限）與公平排程：
+    # key_* 套用在每把 X-Api-Key，env_key_* 套用在共用的 env key（視為一把 key，權重可調高）；
+    # 預設都不限，需要時再開。配額要等超過 admission_wait_seconds 或同一把 key 排隊中的請求
+    # 達 key_max_queued 就直接走題庫
+    key_rpm_limit: int = 0
+    key_tpm_limit: int = 0
+    env_key_rpm_limit: int = 0
+    env_key_tpm_limit: int = 0
+    env_key_weight: float = 1.0
+    key_max_queued: int = 8
+    # circuit breaker：時間窗內請求數達下限且錯誤率超過門檻就跳開；
+    # 冷卻時間從 cooldown 起每次加倍（上限 max_cooldown），half-open 時放行幾個 probe
+    breaker_error_threshold: float = 0.5
+    breaker_min_requests: int = 5
+    breaker_window_seconds: float = 30
+    breaker_cooldown_seconds: float = 15
+    breaker_max_cooldown_seconds: float = 300
+    breaker_half_open_probes: int = 2
+    # 多 worker 共用 breaker 狀態的檔案（相對 backend/；空字串 = 各 process 各自一份，serve.py 會自動設定）
+    breaker_state_file: str = ''
+    # X-Api-Key client 快取上限與閒置淘汰秒數
+    client_pool_size: int = 256
+    client_idle_ttl_seconds: float = 600
+    # 預建回應檢索：keyword / semantic / hybrid，與語意相似度門檻
+    # （語意檢索需選用；現有題庫上換句話說的分數與不相干的問句重疊，門檻過低會回答無關的預建回應）
+    fallback_retrieval_mode: str = 'keyword'
+    semantic_fallback_threshold: float = 0.4
+    # 離線練習題 per-session 輪替：session 上限與閒置淘汰秒數
+    drill_rotation_max_sessions: int = 10000
+    drill_rotation_idle_ttl_seconds: float = 1800
+    # 題庫來源：auto（有最新的 bank.bin 就用 mmap 讀）/ json / binary
+    question_bank_format: str = 'auto'
+    # 題庫熱更新：每 N 秒檢查檔案變更（0 = 關閉），與管理端點用的 token（空字串 = 關閉端點）
+    question_bank_watch_seconds: float = 0
+    admin_token: str = ''
+    # 離線前端的題庫快照：保留幾個舊版本供差異同步
+    bank_snapshot_history: int = 8
+    # JSON 回應依 Accept-Encoding 壓縮（br / gzip），body 小於此大小不壓
+    response_compression_enabled: bool = True
+    response_compression_min_bytes: int = 1024
+    # 自動在 system prompt 與對話前綴加上 prompt cache breakpoint
+    prompt_cache_enabled: bool = True
+    # 伺服器端對話紀錄：memory / sqlite、容量與閒置淘汰秒數
+    conversation_store: str = 'memory'
+    conversation_sqlite_path: str = 'data/conversations.db'
+    conversation_max_sessions: int = 10000
+    conversation_idle_ttl_seconds: float = 3600
+    # 歷史超過此 token 數（粗估）就把較舊的訊息壓成摘要，至少保留最近幾則原文
+    conversation_token_budget: int = 2000
+    conversation_keep_recent: int = 6
+    # 完全相同請求的回覆快取（預設關閉）：筆數、總大小上限與存活秒數
+    response_cache_enabled: bool = False
+    response_cache_max_entries: int = 10000
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    response_cache_ttl_seconds: float = 3600
+    # 每隔幾秒丟一個空工作進 threadpool 量排隊時間（/metrics；0 = 關閉）
+    metrics_threadpool_probe_seconds: float = 5
+    # 開啟後帶 X-Profile: 1 的請求會以 cProfile 執行，.prof 寫到 profile_dir（有 admin_token 時需帶 X-Admin-Token）
+    profiling_enabled: bool = False
+    profile_dir: str = 'data/profiles'
     cors_origins: list[str] = [
         'http://localhost:5172',
         'http://127.0.0.1:5172',
@@ -1,28 +1,95 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import anthropic
 
 from config import settings
+from services.admission import AdmissionRejected, upstream_limiter
 from services.api_health import api_health
+from services.bank_snapshot import bank_snapshots
+from services.chat_stream import SectionSplitter, chunk_text, reply_section, sse_event
+from services.client_pool import ClientLease, client_pool
+from services.conversation_store import Conversation, ConversationOutOfSync, conversations
+from services.drill_text import GRAMMAR_SEPARATOR
+from services.hedging import iter_with_timeouts, upstream_hedger
+from services.metrics import (
+    MetricsMiddleware, chat_replies, fallback_reasons, probe_threadpool, registry,
+    upstream_request_duration, upstream_tokens,
+)
+from services.http_cache import etag_matches, negotiate
+from services.json_response import json_responses
+from services.key_scheduler import Throttled, estimate_tokens, key_id, key_scheduler
+from services.profiling import ProfilingMiddleware
+from services.prompt_cache import prompt_cache_stats, summary_text, with_cache_breakpoints
+from services.response_cache import cache_key, response_cache
 from services.question_bank_service import question_bank
 
 logger = logging.getLogger(__name__)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # 載入題庫
+def load_question_bank():
+    """依設定載入題庫（多 worker 啟動器會在 fork 前呼叫，worker 直接共用）"""
+    question_bank.configure_retrieval(
+        settings.fallback_retrieval_mode, settings.semantic_fallback_threshold,
+    )
+    question_bank.configure_storage(settings.question_bank_format)
+    question_bank.configure_rotation(
+        settings.drill_rotation_max_sessions, settings.drill_rotation_idle_ttl_seconds,
+    )
     question_bank.load()
     logger.info('題庫狀態: %s', question_bank.get_status())
+    # 快照（含壓縮）每個題庫版本只建一次；在這裡先建好，多 worker 時也在 fork 前共用
+    bank_snapshots.get()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 載入題庫（serve.py 已在 fork 前載入時略過）
+    if not question_bank.is_loaded:
+        load_question_bank()
 
     # 設定 API key 狀態（env 層級）
-    api_health.set_has_api_key(bool(settings.anthropic_api_key))
+    api_health.set_has_api_key(client_pool.has_default)
+
+    conversations.configure(
+        settings.conversation_store,
+        sqlite_path=Path(__file__).parent / settings.conversation_sqlite_path,
+        max_sessions=settings.conversation_max_sessions,
+        idle_ttl_seconds=settings.conversation_idle_ttl_seconds,
+        token_budget=settings.conversation_token_budget,
+        keep_recent=settings.conversation_keep_recent,
+    )
+
+    watchers = []
+    if settings.question_bank_watch_seconds > 0:
+        watchers.append(asyncio.create_task(_watch_question_bank(settings.question_bank_watch_seconds)))
+    if settings.metrics_threadpool_probe_seconds > 0:
+        watchers.append(asyncio.create_task(probe_threadpool(settings.metrics_threadpool_probe_seconds)))
 
     yield
 
+    for watcher in watchers:
+        watcher.cancel()
+    await client_pool.aclose()
+    conversations.close()
+
+
+async def _watch_question_bank(interval: float):
+    """定期檢查題庫檔案，有變更就在背景 thread 重建後換上"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(question_bank.reload)
+        except Exception as e:
+            logger.error('題庫熱更新失敗: %s', e)
+
 
 app = FastAPI(title='AI English Tutor API', lifespan=lifespan)
 
@@ -30,20 +97,74 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
     allow_methods=['POST', 'GET'],
-    allow_headers=['Content-Type', 'X-Api-Key'],
+    allow_headers=['Content-Type', 'X-Api-Key', 'X-Session-Id'],
+)
+# 帶 X-Profile: 1 的請求以 cProfile 執行（PROFILING_ENABLED=true 才生效）
+app.add_middleware(
+    ProfilingMiddleware,
+    enabled=settings.profiling_enabled,
+    output_dir=Path(__file__).parent / settings.profile_dir,
+    admin_token=settings.admin_token,
+)
+# 最外層：請求總時間包含 CORS 與串流回應
+app.add_middleware(MetricsMiddleware)
+
+# 預設 client（用 env key）與 per-key client 共用同一個 pool
+client_pool.configure(
+    settings.anthropic_api_key,
+    max_clients=settings.client_pool_size,
+    idle_ttl_seconds=settings.client_idle_ttl_seconds,
+    timeout_seconds=settings.upstream_attempt_timeout_seconds,
+)
+
+bank_snapshots.configure(
+    lambda: question_bank.generation, question_bank.export_records,
+    history=settings.bank_snapshot_history,
+)
+
+json_responses.configure(
+    settings.response_compression_enabled, settings.response_compression_min_bytes,
 )
 
-# 預設 client（用 env key）
-_default_client = None
-if settings.anthropic_api_key:
-    _default_client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+response_cache.configure(
+    settings.response_cache_enabled,
+    max_entries=settings.response_cache_max_entries,
+    max_bytes=settings.response_cache_max_bytes,
+    ttl_seconds=settings.response_cache_ttl_seconds,
+)
 
+api_health.configure(
+    settings.breaker_error_threshold,
+    min_requests=settings.breaker_min_requests,
+    window_seconds=settings.breaker_window_seconds,
+    cooldown_seconds=settings.breaker_cooldown_seconds,
+    max_cooldown_seconds=settings.breaker_max_cooldown_seconds,
+    half_open_probes=settings.breaker_half_open_probes,
+    # 多 worker 時各 worker 透過同一個檔案共用 breaker 狀態
+    state_file=Path(__file__).parent / settings.breaker_state_file if settings.breaker_state_file else '',
+)
 
-def _get_client(request_api_key: str | None) -> anthropic.Anthropic | None:
-    """取得 Anthropic client：request key > env key > None"""
-    if request_api_key:
-        return anthropic.Anthropic(api_key=request_api_key)
-    return _default_client
+# 依上游延遲 / 錯誤自動調整同時進行中的 Claude 呼叫數，超過的請求直接 fallback
+upstream_limiter.configure(
+    settings.upstream_initial_concurrency,
+    min_limit=settings.upstream_min_concurrency,
+    max_limit=settings.max_concurrent_upstream,
+    tolerance=settings.upstream_latency_tolerance,
+)
+# 在共用的上游名額之前，每把 key 先過自己的配額；排隊時依公平排程的順序取得名額
+key_scheduler.configure(
+    settings.key_rpm_limit, settings.key_tpm_limit,
+    settings.env_key_rpm_limit, settings.env_key_tpm_limit,
+    env_weight=settings.env_key_weight,
+    max_pending=settings.key_max_queued,
+)
+upstream_hedger.configure(
+    settings.upstream_deadline_seconds,
+    budget_ratio=settings.hedge_budget_ratio,
+    min_hedge_delay_seconds=settings.hedge_min_delay_seconds,
+)
+# 背景摘要 task（保留參照避免被 GC）
+_background_tasks: set[asyncio.Task] = set()
 
 
 class ChatMessage(BaseModel):
@@ -55,53 +176,464 @@ class ChatRequest(BaseModel):
     messages: list[ChatMessage]
     system_prompt: str = ''
     max_tokens: int = 0
+    # 伺服器端對話：帶 conversation_id 時 messages 只放新訊息，
+    # history_length 為後端應已保存的訊息數（0 = 新對話或重送完整歷史）
+    conversation_id: str = ''
+    history_length: int = 0
 
 
 class ChatResponse(BaseModel):
     reply: str
 
 
+def _session_id(request: Request) -> str:
+    """前端帶的 X-Session-Id，沒帶則以 client 位址區分"""
+    session_id = request.headers.get('X-Session-Id')
+    if session_id:
+        return session_id[:128]
+    return request.client.host if request.client else ''
+
+
+async def _prepare_turn(req: ChatRequest) -> Conversation | None:
+    """伺服器端對話：接上已保存的歷史；前後端不同步時回 409 讓前端重送完整歷史"""
+    if not req.conversation_id:
+        return None
+    try:
+        return await conversations.offload(
+            conversations.prepare,
+            req.conversation_id[:128], req.history_length, [m.model_dump() for m in req.messages],
+        )
+    except ConversationOutOfSync:
+        raise HTTPException(status_code=409, detail='conversation out of sync')
+
+
+async def _finish_turn(req: ChatRequest, turn: Conversation | None, reply: str, client,
+                       api_key: str | None = None):
+    """寫入這一輪；超過 token 預算就在背景壓縮較舊的訊息（摘要用同一個 client / key）"""
+    if turn is None:
+        return
+    conv_id = req.conversation_id[:128]
+    if await conversations.offload(conversations.commit, conv_id, turn, reply_section(reply)):
+        # 背景摘要另外持有 client，請求結束後被淘汰也不會在摘要途中關閉
+        task = asyncio.create_task(_compact_conversation(conv_id, client_pool.retain(client), api_key))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+async def _compact_conversation(conv_id: str, lease: ClientLease, api_key: str | None):
+    client = lease.client
+
+    async def summarize(params: dict) -> str:
+        # 摘要也是一次 Claude 呼叫：一樣經過 breaker 與 key 的配額，但不排隊；
+        # 拿不到就回空字串，改用擷取式摘要
+        if not api_key and not api_health.allow_request():
+            return ''
+        params = {'model': settings.model, **params}
+        cost = estimate_tokens(params)
+        try:
+            permit = await key_scheduler.acquire(api_key, cost, 0)
+        except AdmissionRejected:
+            if not api_key:
+                api_health.mark_skipped()
+            return ''
+        try:
+            async with permit:
+                resp = await asyncio.wait_for(
+                    client.messages.create(**params), settings.upstream_attempt_timeout_seconds,
+                )
+        except asyncio.CancelledError:
+            if not api_key:
+                api_health.mark_skipped()
+            raise
+        except Exception:
+            if not api_key:
+                api_health.mark_failure()
+            raise
+        if not api_key:
+            api_health.mark_success()
+        _record_usage(resp.usage)
+        key_scheduler.settle(api_key, cost, resp.usage)
+        return resp.content[0].text
+
+    try:
+        # 離線時直接用擷取式摘要
+        await conversations.compact(conv_id, summarize if client is not None else None)
+    except Exception as e:
+        logger.error('對話壓縮失敗: %s', e)
+    finally:
+        lease.release()
+
+
+def _upstream_params(system_prompt: str, req: ChatRequest, turn: Conversation | None) -> dict:
+    """組出送往 Claude 的參數（視設定在 system / messages 加上 cache breakpoint）"""
+    if turn is not None:
+        messages, summary = turn.messages, turn.summary
+    else:
+        messages, summary = [m.model_dump() for m in req.messages], ''
+    if settings.prompt_cache_enabled:
+        system, messages = with_cache_breakpoints(system_prompt, messages, summary)
+    else:
+        system = f'{system_prompt}\n\n{summary_text(summary)}' if summary else system_prompt
+    return {
+        'model': settings.model,
+        'max_tokens': _resolve_max_tokens(req),
+        'system': system,
+        'messages': messages,
+    }
+
+
+def _record_usage(usage):
+    """記錄 token 用量（prompt cache 統計 + metrics）"""
+    prompt_cache_stats.record(usage)
+    for kind in ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+        count = getattr(usage, kind, None) or 0
+        if count:
+            upstream_tokens.labels(settings.model, kind).inc(count)
+
+
+def _is_shared_error(e: Exception) -> bool:
+    """回覆快取 single-flight 時，帶頭請求的錯誤是否也算在等待者身上
+
+    排不到名額 / 超過配額 / key 認證與權限 / key 自己的 rate limit 只屬於帶頭的請求，
+    等待者自己重打（否則一個壞掉的 key 會讓等待者都記成上游失敗，進而觸發 breaker）。
+    """
+    return not isinstance(e, (
+        AdmissionRejected, anthropic.AuthenticationError, anthropic.PermissionDeniedError,
+        anthropic.RateLimitError,
+    ))
+
+
+def _resolve_max_tokens(req: ChatRequest) -> int:
+    """前端指定的 max_tokens（受上限約束），未指定用預設值"""
+    if req.max_tokens > 0:
+        return min(req.max_tokens, settings.max_tokens_limit)
+    return settings.default_max_tokens
+
+
 @app.post('/api/chat', response_model=ChatResponse)
-def chat(req: ChatRequest, request: Request):
+async def chat(req: ChatRequest, request: Request):
+    # 請求期間持有 client：被 LRU 淘汰時等請求結束才關閉連線
+    with client_pool.lease(request.headers.get('X-Api-Key')) as client:
+        return await _chat(req, request, client)
+
+
+async def _chat(req: ChatRequest, request: Request, client):
     system_prompt = req.system_prompt or 'You are a helpful English tutor.'
     user_message = req.messages[-1].content if req.messages else ''
 
     # 從 header 取得 API key
     request_api_key = request.headers.get('X-Api-Key')
-    client = _get_client(request_api_key)
     has_key = client is not None
 
+    # 先接上對話歷史：409 要在 allow_request() 之前回，否則 half-open 的 probe 名額會被佔住到逾時
+    turn = await _prepare_turn(req)
     # 判斷是否嘗試 API
-    should_try = has_key and (request_api_key or api_health.should_try_api)
+    should_try = has_key and (request_api_key or api_health.allow_request())
+    fallback_reason = 'breaker_open' if has_key else 'no_api_key'
 
     if should_try:
+        params = _upstream_params(system_prompt, req, turn)
+        cost = estimate_tokens(params)
+
+        async def attempt(acquire):
+            # timeout 包在 permit 裡面，逾時才會算進 admission 的壅塞訊號
+            async with await acquire():
+                start = time.perf_counter()
+                outcome = 'error'
+                try:
+                    resp = await asyncio.wait_for(
+                        client.messages.create(**params), settings.upstream_attempt_timeout_seconds,
+                    )
+                    outcome = 'ok'
+                    return resp
+                except asyncio.TimeoutError:
+                    outcome = 'timeout'
+                    raise
+                except asyncio.CancelledError:
+                    outcome = 'cancelled'
+                    raise
+                finally:
+                    upstream_request_duration.labels(settings.model, 'create', outcome).observe(
+                        time.perf_counter() - start,
+                    )
+
+        async def fetch() -> str:
+            # hedge 只用 env key（不替使用者自己的 key 多花額度），且拿不到名額就不送；
+            # hedge 從 hedge 預算出，不再扣一次 key 的配額
+            hedge = None if request_api_key else (lambda: attempt(lambda: upstream_limiter.acquire(0)))
+            resp = await upstream_hedger.call(lambda: attempt(
+                lambda: key_scheduler.acquire(request_api_key, cost, settings.admission_wait_seconds),
+            ), hedge)
+            _record_usage(resp.usage)
+            key_scheduler.settle(request_api_key, cost, resp.usage)
+            return resp.content[0].text
+
         try:
-            max_tokens = (
-                min(req.max_tokens, settings.max_tokens_limit)
-                if req.max_tokens > 0
-                else settings.default_max_tokens
-            )
-            resp = client.messages.create(
-                model=settings.model,
-                max_tokens=max_tokens,
-                system=system_prompt,
-                messages=[m.model_dump() for m in req.messages],
-            )
+            cached = False
+            if response_cache.enabled:
+                reply, cached = await response_cache.get_or_fetch(
+                    cache_key(params, key_id(request_api_key)), fetch, _is_shared_error,
+                )
+            else:
+                reply = await fetch()
+            if not request_api_key:
+                # 快取命中沒有實際打到上游，不能當成 half-open probe 的結果
+                if cached:
+                    api_health.mark_skipped()
+                else:
+                    api_health.mark_success()
+            await _finish_turn(req, turn, reply, client, request_api_key)
+            chat_replies.labels('chat', 'cache' if cached else 'api').inc()
+            # 回覆已是字串，不必再經 ChatResponse 驗證
+            return json_responses.render({'reply': reply}, request.headers.get('Accept-Encoding'))
+        except Throttled as e:
+            logger.info('超過 key 的配額（%s），改用題庫', e.reason)
+            fallback_reason = 'throttled'
+            if not request_api_key:
+                api_health.mark_skipped()
+        except AdmissionRejected:
+            logger.info('上游並發已滿（limit=%d），改用題庫', upstream_limiter.limit)
+            fallback_reason = 'admission'
             if not request_api_key:
-                api_health.mark_success()
-            return ChatResponse(reply=resp.content[0].text)
+                api_health.mark_skipped()
+        except asyncio.TimeoutError:
+            logger.warning('Claude API 逾時，改用題庫')
+            fallback_reason = 'timeout'
+            if not request_api_key:
+                api_health.mark_failure()
         except anthropic.APIError as e:
             logger.warning('Claude API 失敗: %s', e)
+            fallback_reason = 'api_error'
             if not request_api_key:
                 api_health.mark_failure()
         except Exception as e:
             logger.warning('Claude API 未預期錯誤: %s', e)
+            fallback_reason = 'error'
             if not request_api_key:
                 api_health.mark_failure()
 
-    # Fallback 到題庫
-    reply = question_bank.get_fallback_reply(system_prompt, user_message)
-    return ChatResponse(reply=reply)
+    # Fallback 到題庫（純記憶體查詢，直接在 event loop 執行）
+    reply = question_bank.get_fallback_reply(system_prompt, user_message, _session_id(request))
+    await _finish_turn(req, turn, reply, None)
+    chat_replies.labels('chat', 'fallback').inc()
+    fallback_reasons.labels(fallback_reason).inc()
+    accept_encoding = request.headers.get('Accept-Encoding')
+    if GRAMMAR_SEPARATOR in reply:
+        # 文法說明由使用者的句子產生，幾乎每則都不同：不進快取，用較低的壓縮等級現壓
+        return json_responses.render({'reply': reply}, accept_encoding)
+    # 題庫回覆的 body 與壓縮結果依回覆快取
+    return json_responses.reply(reply, accept_encoding)
+
+
+@app.post('/api/chat/stream')
+async def chat_stream(req: ChatRequest, request: Request):
+    """SSE 串流版 /api/chat
+
+    事件：reply / grammar / translation（data: {"text": ...}），
+    最後送 done（data: {"source": "api" | "cache" | "fallback"}）。
+    """
+    system_prompt = req.system_prompt or 'You are a helpful English tutor.'
+    user_message = req.messages[-1].content if req.messages else ''
+
+    request_api_key = request.headers.get('X-Api-Key')
+    turn = await _prepare_turn(req)
+    # 串流期間持有 client（產生器結束或回應結束時歸還）
+    lease = client_pool.lease(request_api_key)
+    client = lease.client
+    should_try = client is not None and (request_api_key or api_health.allow_request())
+    fallback_reason = 'breaker_open' if client is not None else 'no_api_key'
+    session_id = _session_id(request)
+
+    async def events():
+        nonlocal fallback_reason
+        splitter = SectionSplitter()
+        sent_any = False
+        reply_parts: list[str] = []
+
+        def tagged(pairs: list[tuple[str, str]]):
+            for section, text in pairs:
+                if section == 'reply':
+                    reply_parts.append(text)
+                yield sse_event(section, {'text': text})
+
+        if should_try:
+            params = _upstream_params(system_prompt, req, turn)
+            cost = estimate_tokens(params)
+            key = cache_key(params, key_id(request_api_key)) if response_cache.enabled else ''
+            cached = response_cache.lookup(key) if key else None
+            if cached is not None:
+                if not request_api_key:
+                    api_health.mark_skipped()
+                for chunk in chunk_text(cached):
+                    for event in tagged(splitter.feed(chunk)):
+                        yield event
+                for event in tagged(splitter.flush()):
+                    yield event
+                await _finish_turn(req, turn, cached, client, request_api_key)
+                chat_replies.labels('stream', 'cache').inc()
+                yield sse_event('done', {'source': 'cache'})
+                return
+
+            start = 0.0
+            try:
+                permit = await key_scheduler.acquire(request_api_key, cost, settings.admission_wait_seconds)
+                async with permit:
+                    start = time.perf_counter()
+                    async with client.messages.stream(**params) as stream:
+                        deltas = iter_with_timeouts(
+                            stream.text_stream,
+                            first_timeout=settings.upstream_attempt_timeout_seconds,
+                            idle_timeout=settings.upstream_attempt_timeout_seconds,
+                        )
+                        async for delta in deltas:
+                            # 自適應上限與 metrics 都以第一個 token 的延遲為樣本
+                            if start:
+                                upstream_request_duration.labels(settings.model, 'stream', 'ok').observe(
+                                    time.perf_counter() - start,
+                                )
+                                start = 0.0
+                            permit.observe()
+                            for event in tagged(splitter.feed(delta)):
+                                sent_any = True
+                                yield event
+                        final = await stream.get_final_message()
+                _record_usage(final.usage)
+                key_scheduler.settle(request_api_key, cost, final.usage)
+                if key:
+                    response_cache.put(key, final.content[0].text)
+                for event in tagged(splitter.flush()):
+                    yield event
+                if not request_api_key:
+                    api_health.mark_success()
+                await _finish_turn(req, turn, ''.join(reply_parts), client, request_api_key)
+                chat_replies.labels('stream', 'api').inc()
+                yield sse_event('done', {'source': 'api'})
+                return
+            except Exception as e:
+                if isinstance(e, AdmissionRejected):
+                    if isinstance(e, Throttled):
+                        logger.info('超過 key 的配額（%s），改用題庫', e.reason)
+                        fallback_reason = 'throttled'
+                    else:
+                        logger.info('上游並發已滿（limit=%d），改用題庫', upstream_limiter.limit)
+                        fallback_reason = 'admission'
+                    if not request_api_key:
+                        api_health.mark_skipped()
+                else:
+                    logger.warning('Claude API 串流失敗: %s', e)
+                    fallback_reason = 'timeout' if isinstance(e, asyncio.TimeoutError) else 'api_error'
+                    if start:
+                        outcome = 'timeout' if fallback_reason == 'timeout' else 'error'
+                        upstream_request_duration.labels(settings.model, 'stream', outcome).observe(
+                            time.perf_counter() - start,
+                        )
+                    if not request_api_key:
+                        api_health.mark_failure()
+                if sent_any:
+                    chat_replies.labels('stream', 'interrupted').inc()
+                    # 已送出部分內容，無法無縫改用題庫
+                    yield sse_event('error', {'message': 'upstream stream interrupted'})
+                    yield sse_event('done', {'source': 'api'})
+                    return
+                splitter = SectionSplitter()
+                reply_parts.clear()
+
+        # Fallback 到題庫：分段送出，前端立即看到第一段
+        reply = question_bank.get_fallback_reply(system_prompt, user_message, session_id)
+        for chunk in chunk_text(reply):
+            for event in tagged(splitter.feed(chunk)):
+                yield event
+        for event in tagged(splitter.flush()):
+            yield event
+        await _finish_turn(req, turn, reply, None)
+        chat_replies.labels('stream', 'fallback').inc()
+        fallback_reasons.labels(fallback_reason).inc()
+        # reason 讓前端判斷接下來幾輪是否直接用本機快取的題庫回答
+        yield sse_event('done', {'source': 'fallback', 'reason': fallback_reason})
+
+    return StreamingResponse(
+        lease.iterate(events()),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        # 連線在串流開始前就斷掉時產生器不會執行，由 background 歸還
+        background=BackgroundTask(lease.release),
+    )
+
+
+@app.post('/api/admin/reload-bank')
+async def reload_bank(request: Request):
+    """重新載入題庫（只重新解析有變更的檔案），需帶 X-Admin-Token"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404)
+    if request.headers.get('X-Admin-Token') != settings.admin_token:
+        raise HTTPException(status_code=403)
+    return await asyncio.to_thread(question_bank.reload)
+
+
+def _etag_response(request: Request, etag: str | None, body: dict | None) -> Response:
+    """body 為 None 表示 If-None-Match 命中，回 304"""
+    if body is None:
+        return Response(status_code=304, headers={'ETag': etag})
+    headers = {'ETag': etag} if etag else {'Cache-Control': 'no-store'}
+    return json_responses.render(body, request.headers.get('Accept-Encoding'), headers)
+
+
+@app.get('/api/drills')
+def drills(
+    request: Request,
+    drill_type: str | None = Query(None, alias='type'),
+    level: str | None = None,
+    topic: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    sample: int | None = Query(None, ge=1, le=100),
+    seed: int | None = None,
+):
+    """依題型 / 程度（CEFR）/ 主題查練習題
+
+    預設以 cursor 分頁（回傳 next_cursor）；帶 sample 時隨機抽題，加 seed 可重現。
+    支援 ETag / If-None-Match（不帶 seed 的抽樣除外）。
+    """
+    try:
+        etag, body = question_bank.query_drills(
+            drill_type, level, topic, limit, cursor, sample, seed,
+            if_none_match=request.headers.get('If-None-Match'),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _etag_response(request, etag, body)
+
+
+@app.get('/api/drills/facets')
+def drill_facets(request: Request):
+    """各題型 / 程度 / 主題的題數"""
+    return _etag_response(request, *question_bank.drill_facets(request.headers.get('If-None-Match')))
+
+
+@app.get('/api/bank/snapshot')
+def bank_snapshot(request: Request, since: str | None = None):
+    """題庫快照（前端快取在 IndexedDB，離線時在本機回答）
+
+    since 為用戶端目前的版本：相同回 304，仍在伺服器的版本歷史中回差異，否則回完整快照。
+    內容預先壓好 gzip / brotli，依 Accept-Encoding 挑選。
+    """
+    payload = bank_snapshots.get(since)
+    accept_encoding = request.headers.get('Accept-Encoding')
+    if payload.body is None:
+        body, encoding = None, negotiate(accept_encoding)
+    else:
+        body, encoding = payload.body.pick(accept_encoding)
+    # ETag 代表題庫版本；只有未壓縮的完整快照位元組唯一，壓縮版與差異用弱 ETag
+    etag = f'"{payload.version}"'
+    if encoding or payload.kind == 'delta':
+        etag = f'W/{etag}'
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if body is None or etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    headers['X-Bank-Snapshot'] = payload.kind
+    return Response(body, media_type='application/json', headers=headers)
 
 
 @app.get('/api/health')
@@ -109,10 +641,25 @@ def health():
     return {'status': 'ok'}
 
 
+@app.get('/metrics')
+async def metrics():
+    """Prometheus 文字格式的 metrics"""
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
+
+
 @app.get('/api/status')
 def status():
-    """系統狀態（API + 題庫）"""
+    """系統狀態（API + client 快取 + 上游並發 + per-key 配額與排隊 + hedge + prompt cache 用量 + 回覆快取 + 對話紀錄 + 題庫 + 題庫快照 + 回應編碼）"""
     return {
         'api': api_health.get_status(),
+        'clients': client_pool.get_status(),
+        'admission': upstream_limiter.get_status(),
+        'keys': key_scheduler.get_status(),
+        'hedging': upstream_hedger.get_status(),
+        'prompt_cache': prompt_cache_stats.get_status(),
+        'response_cache': response_cache.get_status(),
+        'conversations': conversations.get_status(),
         'question_bank': question_bank.get_status(),
+        'bank_snapshot': bank_snapshots.get_status(),
+        'responses': json_responses.get_status(),
     }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""題庫壓實 benchmark
+
+在暫存目錄產生合成題庫（--items 題，其中 --dup-rate 比例是某題改一兩個字的近似重複），
+以子行程跑 compact_question_bank.py，回報耗時、子行程最大 RSS，
+以及近似重複的召回率（被併掉的比例）與誤併率（原創題目被併掉的比例）。
+
+用法：
+  python scripts/bench_bank_compaction.py
+  python scripts/bench_bank_compaction.py --items 1000000 --dup-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from compact_question_bank import iter_json_array
+
+SCRIPT = Path(__file__).parent / 'compact_question_bank.py'
+
+WORDS = [
+    f'{a}{b}' for a in ('re', 'pro', 'con', 'de', 'in', 'ex', 'sub', 'inter', 'over', 'under')
+    for b in ('port', 'tain', 'duct', 'vise', 'form', 'spect', 'ject', 'tract', 'mit', 'pose',
+              'fer', 'scribe', 'sist', 'cede', 'vert', 'gress', 'plete', 'clude', 'sume', 'pend')
+] + ['the', 'a', 'to', 'of', 'and', 'she', 'they', 'we', 'meeting', 'report', 'team', 'project']
+
+# 檔案 → 比對欄位
+FILES = {
+    'drills/grammar_fill.json': 'sentence',
+    'drills/vocabulary.json': 'prompt',
+    'drills/situational.json': 'situation',
+    'fallback_responses/free-chat.json': 'user_example',
+}
+
+
+def sentence(rng: random.Random) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(12, 24))).capitalize() + '.'
+
+
+def near_duplicate(rng: random.Random, text: str) -> str:
+    """換掉一個字，或只改大小寫 / 標點"""
+    words = text.rstrip('.').split()
+    if rng.random() < 0.5:
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+        return ' '.join(words) + '.'
+    return ' '.join(words).upper() + '!'
+
+
+def build_bank(root: Path, items: int, dup_rate: float, seed: int) -> int:
+    """寫出合成題庫，回傳近似重複題數；題目帶 _origin 記錄原創題目的編號"""
+    rng = random.Random(seed)
+    per_file = items // len(FILES)
+    dupes = 0
+    for rel, field in FILES.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        originals: list[str] = []
+        with path.open('w', encoding='utf-8') as f:
+            f.write('[\n')
+            for i in range(per_file):
+                if originals and rng.random() < dup_rate:
+                    origin = rng.randrange(len(originals))
+                    text = near_duplicate(rng, originals[origin])
+                    dupes += 1
+                else:
+                    origin = len(originals)
+                    text = sentence(rng)
+                    originals.append(text)
+                item = {'id': f'x_{i}', field: text, 'response': text, '_origin': origin}
+                if field == 'user_example':
+                    item['keywords'] = [w.lower() for w in text.split()[:2]]
+                f.write((',\n' if i else '') + json.dumps(item))
+            f.write('\n]')
+    (root / 'metadata.json').write_text('{}', encoding='utf-8')
+    return dupes
+
+
+def evaluate(root: Path) -> tuple[int, int, int]:
+    """(保留題數, 原創題目數, 有保留到的原創題目數)"""
+    kept = origins = covered = 0
+    for rel in FILES:
+        seen: set[int] = set()
+        for item in iter_json_array(root / rel):
+            kept += 1
+            seen.add(item['_origin'])
+        origins += max(seen) + 1 if seen else 0
+        covered += len(seen)
+    return kept, origins, covered
+
+
+def main():
+    parser = argparse.ArgumentParser(description='題庫壓實 benchmark')
+    parser.add_argument('--items', type=int, default=200_000)
+    parser.add_argument('--dup-rate', type=float, default=0.1)
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        start = time.perf_counter()
+        dupes = build_bank(root, args.items, args.dup_rate, args.seed)
+        size = sum(f.stat().st_size for f in root.rglob('*.json'))
+        print(f'合成題庫：{args.items} 題（近似重複 {dupes}），{size / 1e6:.0f} MB，'
+              f'產生 {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(SCRIPT), '--data-dir', str(root), '--threshold', str(args.threshold)],
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+        peak_mib = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+        kept, origins, covered = evaluate(root)
+        removed = args.items - kept
+        # 一題都沒留下的原創題目 = 被誤併到別題
+        lost = origins - covered
+        print(f'耗時 {elapsed:.1f}s（{args.items / elapsed:,.0f} 題/s），子行程最大 RSS {peak_mib:.0f} MiB')
+        print(f'併掉 {removed} 題：近似重複召回 {min(removed - lost, dupes) / max(dupes, 1):.1%}，'
+              f'原創題目誤併 {lost}（{lost / max(origins, 1):.3%}）')
+
+
+if __name__ == '__main__':
+    main()
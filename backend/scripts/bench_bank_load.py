@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""題庫載入 benchmark：JSON vs mmap 二進位
+
+合成一份大型題庫（預設 100k 題練習題），分別以 JSON 與 bank.bin 載入，
+同時啟動多個 worker process，量測每個 worker 的啟動時間、RSS 與 PSS
+（PSS 會把共用的 page cache 頁面平均分攤，較能反映多 worker 的實際記憶體）。
+
+用法：
+  python scripts/bench_bank_load.py
+  python scripts/bench_bank_load.py --drills 100000 --workers 4
+"""
+
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.bank_file import BANK_FILENAME, compile_bank  # noqa: E402
+from services.question_bank_service import (  # noqa: E402
+    DATA_DIR, DRILL_TYPES, QuestionBankService, load_json_bank,
+)
+
+
+def build_synthetic_bank(out_dir: Path, drills: int, responses: int):
+    """以現有題目為模板複製出大型題庫"""
+    base_drills, base_responses = load_json_bank(DATA_DIR)
+    per_type = drills // len(DRILL_TYPES)
+
+    (out_dir / 'drills').mkdir(parents=True)
+    for drill_type in DRILL_TYPES:
+        templates = base_drills.get(drill_type) or [{'response': 'practice'}]
+        items = []
+        for i in range(per_type):
+            item = dict(templates[i % len(templates)])
+            item['id'] = f'{drill_type}_{i:06d}'
+            item['response'] = f"{item.get('response', '')} (#{i})"
+            items.append(item)
+        (out_dir / 'drills' / f'{drill_type}.json').write_text(
+            json.dumps(items, ensure_ascii=False), encoding='utf-8',
+        )
+
+    (out_dir / 'fallback_responses').mkdir()
+    per_scenario = responses // max(len(base_responses), 1)
+    for scenario, templates in base_responses.items():
+        items = []
+        for i in range(per_scenario):
+            item = dict(templates[i % len(templates)])
+            item['id'] = f'{scenario}_{i:06d}'
+            item['keywords'] = [f'{kw} {i}' for kw in item.get('keywords', [])]
+            items.append(item)
+        (out_dir / 'fallback_responses' / f'{scenario}.json').write_text(
+            json.dumps(items, ensure_ascii=False), encoding='utf-8',
+        )
+
+
+def _proc_kib(pid: int, path: str, field: str) -> int:
+    for line in Path(f'/proc/{pid}/{path}').read_text().splitlines():
+        if line.startswith(field + ':'):
+            return int(line.split()[1])
+    return 0
+
+
+def worker(data_dir: Path, bank_format: str):
+    """載入題庫、抽幾題，回報時間後等待 parent 量測記憶體"""
+    start = time.perf_counter()
+    service = QuestionBankService(retrieval_mode='keyword')
+    service.configure_storage(bank_format)
+    service.load(data_dir)
+    load_s = time.perf_counter() - start
+    for i in range(200):
+        service.get_fallback_reply('free chat', 'zzz', str(i))
+    print(json.dumps({'load_s': load_s, 'storage': service.get_status()['storage']}), flush=True)
+    sys.stdin.read()
+
+
+def run_workers(data_dir: Path, bank_format: str, count: int) -> list[dict]:
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, '--worker', bank_format, '--data-dir', str(data_dir)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(count)
+    ]
+    results = []
+    for p in procs:
+        info = json.loads(p.stdout.readline())
+        info['rss_kib'] = _proc_kib(p.pid, 'status', 'VmRSS')
+        info['pss_kib'] = _proc_kib(p.pid, 'smaps_rollup', 'Pss')
+        results.append(info)
+    for p in procs:
+        p.stdin.close()
+        p.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='題庫載入 benchmark')
+    parser.add_argument('--drills', type=int, default=100_000)
+    parser.add_argument('--responses', type=int, default=10_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--worker', choices=['json', 'binary'], help=argparse.SUPPRESS)
+    parser.add_argument('--data-dir', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.data_dir, args.worker)
+        return
+
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        build_synthetic_bank(data_dir, args.drills, args.responses)
+        start = time.perf_counter()
+        compile_bank(*load_json_bank(data_dir), data_dir / BANK_FILENAME)
+        compile_s = time.perf_counter() - start
+
+        json_size = sum(f.stat().st_size for f in data_dir.glob('*/*.json'))
+        bin_size = (data_dir / BANK_FILENAME).stat().st_size
+        print(f'drills={args.drills} responses={args.responses} workers={args.workers}')
+        print(f'json files: {json_size / 1024 / 1024:.1f} MiB   bank.bin: {bin_size / 1024 / 1024:.1f} MiB '
+              f'(compile {compile_s:.2f}s)')
+
+        for bank_format in ('json', 'binary'):
+            results = run_workers(data_dir, bank_format, args.workers)
+            load = sum(r['load_s'] for r in results) / len(results)
+            rss = sum(r['rss_kib'] for r in results) / len(results) / 1024
+            pss = sum(r['pss_kib'] for r in results) / 1024
+            print(f'{bank_format:<7} load={load * 1000:8.1f} ms/worker  '
+                  f'RSS={rss:7.1f} MiB/worker  PSS total={pss:7.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""離線題庫快照 benchmark
+
+1. 快照大小：目前題庫（與放大 --scale 倍的合成題庫）的 raw / gzip / brotli 大小，
+   以及修改 --edits 筆後的差異大小
+2. 請求量：啟動離線 backend（不設 API key），模擬 --sessions 個前端各聊 --turns 輪
+   （每輪間隔 --interval 秒，以模擬時鐘計算，不真的等待），比較：
+   - 原本：每輪都打 /api/chat/stream
+   - 本機題庫：啟動時同步一次快照；backend 回報 no_api_key / breaker_open 後，
+     在前端同樣的時間窗內直接用本機題庫回答（與 frontend/src/utils/offline-bank.ts 相同邏輯）
+   回報 backend 請求數與下載位元組數
+
+用法：
+  python scripts/bench_bank_snapshot.py
+  python scripts/bench_bank_snapshot.py --sessions 50 --turns 40 --interval 8 --scale 100
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.bank_snapshot import BankSnapshotService  # noqa: E402
+from services.question_bank_service import QuestionBankService  # noqa: E402
+
+# 與 frontend/src/composables/useChat.ts 相同
+LOCAL_FALLBACK_SECONDS = {'no_api_key': 60, 'breaker_open': 30}
+
+PROMPTS = [
+    'You are an interviewer for a remote AI Red Teamer position.',
+    'Free chat: you are a friendly conversation partner.',
+    'You are a helpful English tutor.\n---TRANSLATION_MODE---',
+]
+MESSAGES = [
+    'Tell me about yourself.', 'What are your salary expectations?', 'hello',
+    'I went hiking last weekend.', 'Can we practice some grammar?', 'What is the team like?',
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _scaled_records(records: dict[str, dict], scale: int) -> dict[str, dict]:
+    """把每筆紀錄複製 scale 份（文字加上編號，避免壓縮器直接看成重複內容）"""
+    out = {}
+    for n in range(scale):
+        for key, record in records.items():
+            copy = dict(record)
+            copy['en'] = f'[{n}] {record["en"]}'
+            if 'zh' in record:
+                copy['zh'] = f'[{n}] {record["zh"]}'
+            out[f'{key}~{n}'] = copy
+    return out
+
+
+def report_sizes(scale: int, edits: int):
+    bank = QuestionBankService()
+    bank.configure_retrieval('keyword', 0.3)
+    bank.load()
+    _, base_records = bank.export_records()
+
+    for label, records in (('current', base_records), (f'x{scale}', _scaled_records(base_records, scale))):
+        state = {'generation': 1, 'records': records}
+        snapshots = BankSnapshotService()
+        snapshots.configure(lambda: state['generation'], lambda: (state['generation'], state['records']))
+        start = time.perf_counter()
+        full = snapshots.get()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # 改 edits 筆再取差異
+        edited = dict(records)
+        for key in random.Random(0).sample(sorted(edited), min(edits, len(edited))):
+            edited[key] = {**edited[key], 'en': edited[key]['en'] + ' (edited)'}
+        state.update(generation=2, records=edited)
+        delta = snapshots.get(full.version)
+
+        sizes, dsizes = full.body.sizes(), delta.body.sizes()
+        print(
+            f'  {label:<8} records={len(records):<7} build={build_ms:7.0f}ms  '
+            + '  '.join(f'{k}={v / 1024:8.1f}KiB' for k, v in sizes.items())
+            + f'  | delta({edits} edits) '
+            + '  '.join(f'{k}={v / 1024:.1f}KiB' for k, v in dsizes.items())
+        )
+
+
+class SimClient:
+    """模擬前端的送出策略"""
+
+    def __init__(self, http: httpx.Client, session_id: str, use_local: bool):
+        self.http = http
+        self.session_id = session_id
+        self.use_local = use_local
+        self.local_until = 0.0
+        self.records: dict[str, dict] = {}
+        self.order: dict[str, list[str]] = {}
+        self.deck: list[str] = []
+        self.requests = 0
+        self.bytes = 0
+        self.local = 0
+
+    def sync(self):
+        r = self.http.get('/api/bank/snapshot', headers={'Accept-Encoding': 'br, gzip'})
+        self.requests += 1
+        self.bytes += r.num_bytes_downloaded
+        data = r.json()
+        self.records, self.order = data['records'], data['order']
+
+    def _local_reply(self, prompt: str, message: str) -> str:
+        lower = prompt.lower()
+        scenario = (
+            'interview-prep' if 'interview' in lower
+            else 'free-chat' if 'free chat' in lower or 'conversation partner' in lower else None
+        )
+        msg = message.lower().strip()
+        for key in self.order.get(scenario, []) if scenario else []:
+            if any(kw in msg for kw in self.records[key].get('keywords', [])):
+                return self.records[key]['en']
+        if not self.deck:
+            self.deck = [k for k, r in self.records.items() if 'type' in r]
+            random.shuffle(self.deck)
+        return self.records[self.deck.pop()]['en']
+
+    def turn(self, now: float, prompt: str, message: str):
+        if self.use_local and self.records and now < self.local_until:
+            self._local_reply(prompt, message)
+            self.local += 1
+            return
+        r = self.http.post('/api/chat/stream', json={
+            'messages': [{'role': 'user', 'content': message}], 'system_prompt': prompt,
+        }, headers={'X-Session-Id': self.session_id})
+        self.requests += 1
+        self.bytes += r.num_bytes_downloaded
+        done = [line for line in r.text.splitlines() if line.startswith('data:')][-1]
+        data = json.loads(done[5:])
+        seconds = LOCAL_FALLBACK_SECONDS.get(data.get('reason', ''))
+        if data.get('source') == 'fallback' and seconds:
+            self.local_until = now + seconds
+
+
+def report_requests(args):
+    port = _free_port()
+    env = {**os.environ, 'ANTHROPIC_API_KEY': ''}
+    env.pop('ANTHROPIC_BASE_URL', None)
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f'{base_url}/api/health', timeout=1.0)
+                break
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        with httpx.Client(base_url=base_url, timeout=30.0) as http:
+            for use_local in (False, True):
+                clients = [SimClient(http, f'sim-{i}', use_local) for i in range(args.sessions)]
+                start = time.perf_counter()
+                for i, client in enumerate(clients):
+                    if use_local:
+                        client.sync()
+                    for t in range(args.turns):
+                        client.turn(t * args.interval, PROMPTS[(i + t) % len(PROMPTS)],
+                                    MESSAGES[(i * 7 + t) % len(MESSAGES)])
+                elapsed = time.perf_counter() - start
+                requests = sum(c.requests for c in clients)
+                downloaded = sum(c.bytes for c in clients)
+                local = sum(c.local for c in clients)
+                label = 'local bank' if use_local else 'baseline'
+                print(
+                    f'  {label:<11} backend requests={requests:<6} '
+                    f'({requests / (args.sessions * args.turns):.2f}/turn)  '
+                    f'local replies={local:<6} downloaded={downloaded / 1024:8.1f}KiB  wall={elapsed:.1f}s'
+                )
+    finally:
+        backend.terminate()
+        backend.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='離線題庫快照 benchmark')
+    parser.add_argument('--scale', type=int, default=100, help='合成題庫放大倍數')
+    parser.add_argument('--edits', type=int, default=10, help='算差異時修改的紀錄數')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=30, help='每個 session 的輪數')
+    parser.add_argument('--interval', type=float, default=10.0, help='每輪間隔秒數（模擬時鐘）')
+    args = parser.parse_args()
+
+    print('snapshot sizes')
+    report_sizes(args.scale, args.edits)
+    print(f'request volume (offline backend, {args.sessions} sessions x {args.turns} turns, '
+          f'{args.interval:g}s apart)')
+    report_requests(args)
+
+
+if __name__ == '__main__':
+    main()
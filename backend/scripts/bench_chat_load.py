@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""backend 負載測試
+
+每個模式各啟動一次 backend（單一 worker），以固定並發數打 /api/chat，
+其中 --status-ratio 比例的請求改打 /api/status；回報各端點的吞吐量、
+p50 / p95 / p99 延遲、回覆來源分布（/metrics）與 backend 的常駐記憶體。
+
+模式：
+- offline：不設 API key，全部走題庫
+- api：env key 指向本機 stub Anthropic（scripts/stub_anthropic.py，固定延遲）
+- mixed：同 api，但 stub 依 --error-rate 回 500（SDK 重試後仍失敗的改走題庫，
+  錯誤率高時 breaker 跳開 / 恢復），API 與題庫回覆混合
+
+請求內容固定輪替幾組場景與訊息（面試 / 自由聊天 / 練習題 / 翻譯模式），
+同樣參數的結果可以前後對照；先跑 --warmup 秒不計入結果。
+
+加 --profile N 時，負載結束後再送 N 個帶 X-Profile: 1 的請求，
+印出每個 .prof 的前幾名函式（backend 以 PROFILING_ENABLED=true 啟動）。
+
+用法：
+  python scripts/bench_chat_load.py                          # 三個模式都跑
+  python scripts/bench_chat_load.py --modes offline --concurrency 200 --duration 20
+  python scripts/bench_chat_load.py --modes mixed --error-rate 0.3 --latency 0.2
+  python scripts/bench_chat_load.py --modes offline --profile 3
+  python scripts/bench_chat_load.py --backend-dir /tmp/baseline/backend   # 測舊版 (前後對照)
+
+舊版可用 git worktree 取出：
+  git worktree add /tmp/baseline <commit>
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import pstats
+import re
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+STUB_SCRIPT = Path(__file__).parent / 'stub_anthropic.py'
+MODES = ('offline', 'api', 'mixed')
+
+# (system_prompt, 使用者訊息)：涵蓋場景偵測、keyword / 語意匹配、練習題與翻譯模式
+PAYLOADS = [
+    ('You are an interviewer for a remote AI Red Teamer position.', 'Tell me about yourself.'),
+    ('You are an interviewer for a remote AI Red Teamer position.', 'What are your salary expectations?'),
+    ('Free chat: you are a friendly conversation partner.', 'I went hiking last weekend.'),
+    ('Free chat: you are a friendly conversation partner.', 'hello'),
+    ('You are a helpful English tutor.', 'Can we practice some grammar?'),
+    ('You are a helpful English tutor.\n---TRANSLATION_MODE---', 'Give me a vocabulary question.'),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{url} 未在 {timeout}s 內啟動')
+
+
+def _memory_mb(pid: int) -> tuple[float, float] | None:
+    """(目前 RSS, 峰值 RSS) MiB；非 Linux 回傳 None"""
+    try:
+        status = Path(f'/proc/{pid}/status').read_text()
+    except OSError:
+        return None
+    values = dict(re.findall(r'^(VmRSS|VmHWM):\s+(\d+) kB', status, re.MULTILINE))
+    return int(values['VmRSS']) / 1024, int(values['VmHWM']) / 1024
+
+
+async def _drive(base_url: str, concurrency: int, duration: float,
+                 status_ratio: float) -> dict[str, tuple[list[float], int]]:
+    """固定並發數持續送請求，回傳 {端點: (延遲列表, 錯誤數)}"""
+    results: dict[str, tuple[list[float], list[int]]] = {
+        'chat': ([], [0]), 'status': ([], [0]),
+    }
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # 每 status_every 個請求有一個打 /api/status（確定性的輪替，結果可重現）
+    status_every = round(1 / status_ratio) if status_ratio > 0 else 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        async def worker(worker_id: int):
+            i = worker_id
+            while time.monotonic() < deadline:
+                i += 1
+                if status_every and i % status_every == 0:
+                    endpoint = 'status'
+                    send = client.get('/api/status')
+                else:
+                    endpoint = 'chat'
+                    system_prompt, message = PAYLOADS[i % len(PAYLOADS)]
+                    send = client.post('/api/chat', json={
+                        'messages': [{'role': 'user', 'content': message}],
+                        'system_prompt': system_prompt,
+                    }, headers={'X-Session-Id': f'bench-{worker_id}'})
+                latencies, errors = results[endpoint]
+                start = time.perf_counter()
+                try:
+                    r = await send
+                    r.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors[0] += 1
+
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return {name: (lat, err[0]) for name, (lat, err) in results.items()}
+
+
+def _pct(latencies: list[float], p: float) -> float:
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+
+def _report(mode: str, results: dict[str, tuple[list[float], int]], duration: float):
+    for endpoint, (latencies, errors) in results.items():
+        label = f'{mode}/{endpoint}'
+        if not latencies:
+            print(f'  {label:<16} 無成功請求 (errors={errors})')
+            continue
+        latencies.sort()
+        print(
+            f'  {label:<16} requests={len(latencies):<7} errors={errors:<5} '
+            f'rps={len(latencies) / duration:8.1f}  p50={_pct(latencies, 0.5):8.1f}ms  '
+            f'p95={_pct(latencies, 0.95):8.1f}ms  p99={_pct(latencies, 0.99):8.1f}ms'
+        )
+
+
+def _reply_sources(base_url: str) -> str:
+    """從 /metrics 取回覆來源分布（舊版沒有 /metrics 時回傳空字串）"""
+    try:
+        r = httpx.get(f'{base_url}/metrics', timeout=5.0)
+    except httpx.HTTPError:
+        return ''
+    if r.status_code != 200:
+        return ''
+    sources = re.findall(r'tutor_chat_replies_total\{endpoint="chat",source="(\w+)"\} (\d+)', r.text)
+    reasons = re.findall(r'tutor_fallback_total\{reason="(\w+)"\} (\d+)', r.text)
+    text = ' '.join(f'{name}={count}' for name, count in sources)
+    if reasons:
+        text += '  fallback: ' + ' '.join(f'{name}={count}' for name, count in reasons)
+    return text
+
+
+def _profile(base_url: str, backend_dir: Path, count: int, top: int):
+    """送 count 個帶 X-Profile 的請求，印出各 .prof 中 backend 自己程式碼（main.py、services/）的前幾名函式"""
+    own_code = re.escape(str(backend_dir.resolve())) + r'/(main\.py|services/)'
+    with httpx.Client(base_url=base_url, timeout=120.0) as client:
+        for i in range(count):
+            system_prompt, message = PAYLOADS[i % len(PAYLOADS)]
+            r = client.post('/api/chat', json={
+                'messages': [{'role': 'user', 'content': message}],
+                'system_prompt': system_prompt,
+            }, headers={'X-Profile': '1', 'X-Admin-Token': os.environ.get('ADMIN_TOKEN', '')})
+            name = r.headers.get('X-Profile-File')
+            if not name:
+                print('  backend 沒有回傳 profile（舊版或 ADMIN_TOKEN 不符）')
+                return
+            # header 只有檔名；舊版回傳絕對路徑，Path 相接時以絕對路徑為準
+            path = backend_dir / os.environ.get('PROFILE_DIR', 'data/profiles') / name
+            out = io.StringIO()
+            pstats.Stats(str(path), stream=out).sort_stats('cumulative').print_stats(own_code, top)
+            print(f'  --- profile #{i + 1}: {message!r} ({path})')
+            print(out.getvalue())
+
+
+def run_mode(mode: str, args, stub_url: str):
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = {
+        **os.environ,
+        'ANTHROPIC_API_KEY': '' if mode == 'offline' else 'sk-ant-stub',
+        'ANTHROPIC_BASE_URL': stub_url,
+        'PROFILING_ENABLED': 'true' if args.profile else 'false',
+    }
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=args.backend_dir, env=env,
+    )
+    try:
+        _wait_ready(f'{base_url}/api/health')
+        idle = _memory_mb(backend.pid)
+        if args.warmup > 0:
+            asyncio.run(_drive(base_url, args.concurrency, args.warmup, args.status_ratio))
+        results = asyncio.run(_drive(base_url, args.concurrency, args.duration, args.status_ratio))
+        loaded = _memory_mb(backend.pid)
+
+        print(f'[{mode}]')
+        _report(mode, results, args.duration)
+        if idle and loaded:
+            print(f'  memory           idle={idle[0]:.1f}MiB  after={loaded[0]:.1f}MiB  peak={loaded[1]:.1f}MiB')
+        sources = _reply_sources(base_url)
+        if sources:
+            print(f'  replies          {sources}')
+        if args.profile:
+            _profile(base_url, args.backend_dir, args.profile, args.profile_top)
+    finally:
+        backend.terminate()
+        backend.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='backend 負載測試')
+    parser.add_argument('--modes', default=','.join(MODES), help=f'逗號分隔：{", ".join(MODES)}')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0, help='每個模式量測秒數')
+    parser.add_argument('--warmup', type=float, default=2.0, help='量測前暖機秒數')
+    parser.add_argument('--status-ratio', type=float, default=0.05, help='打 /api/status 的請求比例')
+    parser.add_argument('--latency', type=float, default=0.5, help='stub 上游延遲秒數')
+    parser.add_argument('--error-rate', type=float, default=0.5, help='mixed 模式 stub 回 500 的比例')
+    parser.add_argument('--profile', type=int, default=0, help='負載後 profile 幾個請求')
+    parser.add_argument('--profile-top', type=int, default=15, help='每個 profile 印出的函式數')
+    parser.add_argument('--backend-dir', type=Path, default=BACKEND_DIR)
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f'未知的模式: {", ".join(sorted(unknown))}')
+
+    print(
+        f'backend={args.backend_dir}  concurrency={args.concurrency}  duration={args.duration}s  '
+        f'stub_latency={args.latency}s  mixed_error_rate={args.error_rate}'
+    )
+    for mode in modes:
+        stub = None
+        stub_port = _free_port()
+        if mode != 'offline':
+            error_rate = args.error_rate if mode == 'mixed' else 0.0
+            stub = subprocess.Popen([
+                sys.executable, str(STUB_SCRIPT), '--port', str(stub_port),
+                '--latency', str(args.latency), '--error-rate', str(error_rate),
+            ])
+        try:
+            if stub:
+                _wait_ready(f'http://127.0.0.1:{stub_port}/docs')
+            run_mode(mode, args, f'http://127.0.0.1:{stub_port}')
+        finally:
+            if stub:
+                stub.terminate()
+                stub.wait()
+
+
+if __name__ == '__main__':
+    main()
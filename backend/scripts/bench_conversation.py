@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""長對話 benchmark：前端重送完整歷史 vs 伺服器端對話
+
+啟動 stub Anthropic（延遲隨 prompt 長度增加，模擬 prefill）與 backend，
+同一段對話連續送 N 輪，比較兩種模式每輪的請求大小與延遲：
+- full：每輪送完整 messages（舊行為）
+- server：帶 conversation_id，只送新訊息；後端超過 token 預算會壓成摘要
+
+用法：
+  python scripts/bench_conversation.py
+  python scripts/bench_conversation.py --turns 200 --latency-per-1k-tokens 0.05
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+SYSTEM_PROMPT = 'You are a friendly English tutor. Keep replies short and natural.'
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f'{url} 未在 {timeout}s 內啟動')
+
+
+def _user_message(turn: int) -> str:
+    return (f'Turn {turn}: yesterday I went to the market with my friend and we talked about '
+            f'our plans for the weekend, could you check if this sentence sounds natural?')
+
+
+def run_session(url: str, mode: str, turns: int) -> list[tuple[int, float]]:
+    """連續送 turns 輪，回傳每輪 (請求 bytes, 延遲秒數)"""
+    history: list[dict] = []
+    conv_id = str(uuid.uuid4())
+    results = []
+    with httpx.Client(timeout=120.0) as client:
+        for turn in range(1, turns + 1):
+            message = {'role': 'user', 'content': _user_message(turn)}
+            payload = {'system_prompt': SYSTEM_PROMPT}
+            if mode == 'server':
+                payload.update(messages=[message], conversation_id=conv_id, history_length=len(history))
+            else:
+                payload['messages'] = history + [message]
+            body = json.dumps(payload).encode('utf-8')
+
+            start = time.perf_counter()
+            r = client.post(url, content=body, headers={'Content-Type': 'application/json'})
+            r.raise_for_status()
+            results.append((len(body), time.perf_counter() - start))
+            history += [message, {'role': 'assistant', 'content': r.json()['reply']}]
+    return results
+
+
+def _report(mode: str, results: list[tuple[int, float]]):
+    n = len(results)
+    checkpoints = sorted({1, n // 4, n // 2, 3 * n // 4, n} - {0})
+    cells = '  '.join(
+        f'#{i}: {results[i - 1][0] / 1024:6.1f}KiB {results[i - 1][1] * 1000:6.0f}ms' for i in checkpoints
+    )
+    print(f'{mode:<7} {cells}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='長對話 benchmark')
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='stub 上游固定延遲秒數')
+    parser.add_argument('--latency-per-1k-tokens', type=float, default=0.03,
+                        help='stub 每 1k prompt token 額外延遲秒數')
+    parser.add_argument('--backend-dir', type=Path, default=BACKEND_DIR)
+    args = parser.parse_args()
+
+    stub_port = _free_port()
+    stub = subprocess.Popen([
+        sys.executable, str(Path(__file__).parent / 'stub_anthropic.py'), '--port', str(stub_port),
+        '--latency', str(args.latency), '--latency-per-1k-tokens', str(args.latency_per_1k_tokens),
+    ])
+    port = _free_port()
+    env = {
+        **os.environ,
+        'ANTHROPIC_API_KEY': 'sk-ant-stub',
+        'ANTHROPIC_BASE_URL': f'http://127.0.0.1:{stub_port}',
+    }
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=args.backend_dir, env=env,
+    )
+    print(f'turns={args.turns}  stub_latency={args.latency}s + {args.latency_per_1k_tokens}s/1k tokens')
+    try:
+        _wait_ready(f'http://127.0.0.1:{stub_port}/docs')
+        _wait_ready(f'http://127.0.0.1:{port}/api/health')
+        for mode in ('full', 'server'):
+            _report(mode, run_session(f'http://127.0.0.1:{port}/api/chat', mode, args.turns))
+        status = httpx.get(f'http://127.0.0.1:{port}/api/status').json()
+        print(f"conversations: {status['conversations']}")
+    finally:
+        backend.terminate()
+        backend.wait()
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
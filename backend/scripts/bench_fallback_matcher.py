@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""fallback keyword 匹配 microbenchmark
+
+在合成的大型預建回應庫上比較：
+- 舊版：逐筆 entry、逐個 keyword 做 `kw.lower() in msg`
+- 新版：load 時編譯的 Aho–Corasick 自動機（KeywordMatcher）
+
+並確認兩者回傳的 entry 完全一致。
+
+用法：
+  python scripts/bench_fallback_matcher.py
+  python scripts/bench_fallback_matcher.py --entries 50000 --queries 500
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.keyword_matcher import KeywordMatcher  # noqa: E402
+
+
+def _word(rng: random.Random) -> str:
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10)))
+
+
+def build_bank(entries: int, rng: random.Random) -> tuple[list[dict], list[str]]:
+    """合成題庫：每筆 2-5 個 keyword（1-2 個單字的片語）"""
+    vocab = [_word(rng) for _ in range(entries // 2 + 1000)]
+    bank = []
+    for i in range(entries):
+        keywords = [
+            ' '.join(rng.choices(vocab, k=rng.randint(1, 2)))
+            for _ in range(rng.randint(2, 5))
+        ]
+        bank.append({'id': f'synthetic_{i:06d}', 'keywords': keywords})
+    return bank, vocab
+
+
+def build_queries(bank: list[dict], vocab: list[str], count: int, rng: random.Random) -> list[str]:
+    """一半訊息含某個 keyword，一半是題庫外的單字（幾乎不命中，舊版需掃完整庫）"""
+    queries = []
+    for i in range(count):
+        n = rng.randint(6, 20)
+        if i % 2 == 0:
+            words = rng.choices(vocab, k=n)
+            entry = rng.choice(bank)
+            words.insert(rng.randint(0, n), rng.choice(entry['keywords']).upper())
+        else:
+            words = [_word(rng) for _ in range(n)]
+        queries.append(' '.join(words))
+    return queries
+
+
+def linear_find(bank: list[dict], message: str) -> dict | None:
+    """原本 _find_fallback_entry 的演算法"""
+    msg_lower = message.lower().strip()
+    for entry in bank:
+        if any(kw.lower() in msg_lower for kw in entry.get('keywords', [])):
+            return entry
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fallback keyword 匹配 microbenchmark')
+    parser.add_argument('--entries', type=int, default=50_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bank, vocab = build_bank(args.entries, rng)
+    queries = build_queries(bank, vocab, args.queries, rng)
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher([e['keywords'] for e in bank])
+    build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    expected = [linear_find(bank, q) for q in queries]
+    linear_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = []
+    for q in queries:
+        idx = matcher.find(q.lower().strip())
+        got.append(bank[idx] if idx >= 0 else None)
+    matcher_s = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, got) if a is not b)
+    hits = sum(1 for e in expected if e is not None)
+
+    print(f'entries={args.entries}  queries={args.queries}  hits={hits}  mismatches={mismatches}')
+    print(f'automaton build: {build_ms:.0f} ms')
+    print(f'linear scan:     {linear_s / args.queries * 1e6:10.1f} us/query')
+    print(f'aho-corasick:    {matcher_s / args.queries * 1e6:10.1f} us/query')
+    print(f'speedup:         {linear_s / matcher_s:10.1f}x')
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
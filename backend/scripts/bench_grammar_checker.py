@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""離線文法檢查 benchmark
+
+以一組學習者常見錯誤句（每句標註應抓到的片段）與正確句，量測 GrammarChecker：
+- 吞吐量（句 / 秒）與單句 p50 / p99（產生完整 ---GRAMMAR--- 區段）
+- 錯誤句的抓出率、正確句的誤報數
+
+--repeat 會把語料重複多次（可加 --long 把句子串成長段落，模擬一次貼上多句）。
+
+用法：
+  python scripts/bench_grammar_checker.py
+  python scripts/bench_grammar_checker.py --repeat 2000 --long 5
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.grammar_checker import grammar_checker  # noqa: E402
+
+# (句子, 應該被抓出的原文片段)
+ERRORS = [
+    ('He go to the office by bus every day.', 'He go'),
+    ('My manager have a lot of meetings on Monday.', None),  # 名詞主詞不在規則內，只量時間
+    ('She don\'t like working overtime.', "She don't"),
+    ('They goes to the gym after work.', 'They goes'),
+    ('I is a software engineer.', 'I is'),
+    ('You was right about the deadline.', 'You was'),
+    ('People is very friendly in this company.', 'People is'),
+    ('Everyone are excited about the launch.', 'Everyone are'),
+    ('There is many reasons to change jobs.', 'There is many'),
+    ('I can speaks three languages.', 'can speaks'),
+    ('I didn\'t went to the meeting yesterday.', "didn't went"),
+    ('Did you saw the email from HR?', 'Did you saw'),
+    ('If it will rain tomorrow, we will cancel the trip.', 'If it will rain'),
+    ('I ate a apple for breakfast.', 'a apple'),
+    ('It took an long time to finish.', 'an long'),
+    ('I waited for a hour.', 'a hour'),
+    ('She drew an unicorn for her daughter.', 'an unicorn'),
+    ('I am engineer at a startup.', 'I am engineer'),
+    ('She is married with a doctor.', 'married with'),
+    ('It depends of the situation.', 'depends of'),
+    ('I am interested about machine learning.', 'interested about'),
+    ('He is good in solving problems.', 'good in solving'),
+    ('We arrived to the airport late.', 'arrived to'),
+    ('Let\'s discuss about the budget.', 'discuss about'),
+    ('Can you explain me the process?', 'explain me'),
+    ('I listen music on my way to work.', 'listen music'),
+    ('I am responsible of the backend.', 'responsible of'),
+    ('She is afraid from public speaking.', 'afraid from'),
+    ('I usually exercise on the morning.', 'on the morning'),
+    ('I have worked here since 3 years.', 'since 3 years'),
+    ('I look forward to meet you.', 'look forward to meet'),
+    ('I am agree with your idea.', 'I am agree'),
+    ('This solution is more better.', 'more better'),
+    ('Can you give me some informations?', 'informations'),
+    ('I have 28 years old.', 'I have 28 years old'),
+    ('I do many mistakes when I speak.', 'do many mistakes'),
+    ('According to me, remote work is better.', 'According to me'),
+    ('I will return back next week.', 'return back'),
+    ('We reached to the office at nine.', 'reached to'),
+    ('I can able to work on weekends.', 'can able to'),
+    ('I very like this job.', 'very like'),
+]
+
+CORRECT = [
+    'He goes to the office by bus every day.',
+    'Does she like working overtime?',
+    'Let it go.',
+    'I want to help it grow.',
+    'If I were you, I would take the offer.',
+    'I have an hour before the interview.',
+    'She studied at a university in Taipei.',
+    'I bought a USB drive and an HDMI cable.',
+    'I have been here since 2020.',
+    'I look forward to meeting you.',
+    'I agree with you.',
+    'They were late, but I was on time.',
+    'We met on the morning of May 1.',
+    'I am an engineer and she is a designer.',
+    'Can you explain it to me?',
+    'I like it very much.',
+    'Everyone is here.',
+    'There are many reasons to stay.',
+    # 看起來像錯誤、其實正確（或應改成別的形式）的句子，不能給出錯誤的修正
+    'He go to school yesterday.',
+    'My sister and he go to the same gym.',
+    'Let me know if it will rain tomorrow.',
+    'I wonder if they will come to the party.',
+    'It is an unimportant detail.',
+    'He is a European citizen.',
+]
+
+
+def _pct(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='離線文法檢查 benchmark')
+    parser.add_argument('--repeat', type=int, default=500, help='語料重複次數')
+    parser.add_argument('--long', type=int, default=1, help='幾句串成一段輸入')
+    args = parser.parse_args()
+
+    sentences = [s for s, _ in ERRORS] + CORRECT
+    inputs = [
+        ' '.join(sentences[(i + j) % len(sentences)] for j in range(args.long))
+        for i in range(len(sentences))
+    ]
+
+    # 正確性：錯誤句要抓到標註的片段，正確句不能有任何修正
+    missed = [
+        s for s, expected in ERRORS
+        if expected and not any(c.original == expected for c in grammar_checker.check(s))
+    ]
+    false_positives = [(s, grammar_checker.check(s)) for s in CORRECT]
+    false_positives = [(s, c) for s, c in false_positives if c]
+    labelled = sum(1 for _, expected in ERRORS if expected)
+
+    samples: list[float] = []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in inputs:
+            t = time.perf_counter()
+            grammar_checker.notes(text)
+            samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    samples.sort()
+
+    print(f'inputs={len(inputs)}  sentences/input={args.long}  runs={len(samples)}')
+    print(f'throughput:  {len(samples) / elapsed:10.0f} inputs/s')
+    print(f'p50:         {_pct(samples, 0.5) * 1e6:10.1f} us')
+    print(f'p99:         {_pct(samples, 0.99) * 1e6:10.1f} us')
+    print(f'max:         {samples[-1] * 1e6:10.1f} us')
+    print(f'detected:    {labelled - len(missed)}/{labelled}')
+    print(f'false pos.:  {len(false_positives)}/{len(CORRECT)}')
+    for s in missed:
+        print(f'  missed: {s}')
+    for s, corrections in false_positives:
+        print(f'  false positive: {s} -> {[c.original for c in corrections]}')
+    if missed or false_positives:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""/api/chat 回應編碼 benchmark
+
+1. 編碼步驟（同一個行程內）：把一則回覆變成 HTTP body 的 CPU 時間與大小
+   - pydantic：原本的路徑（ChatResponse → FastAPI serialize_response 驗證 → JSONResponse）
+   - fast：services/json_response.py（orjson；fallback 回覆的 body 與壓縮結果有快取）
+   回覆內容取自題庫：fallback 為翻譯模式的練習題，API 為文法 + 翻譯模式的完整回覆（英文、文法說明、中文）
+2. 端對端：啟動 backend，依序送 --requests 個請求，回報 backend 行程每個請求的 CPU 時間
+   （/proc/<pid>/stat）、回應在線上的 body 大小與 p50 延遲
+   - offline：不設 API key，全部是題庫回覆
+   - api：env key 指向本機 stub（回上面那則 API 回覆）
+   每個模式各以 identity / gzip / br 的 Accept-Encoding 量一次
+
+用法：
+  python scripts/bench_json_response.py
+  python scripts/bench_json_response.py --requests 5000 --iterations 20000
+  python scripts/bench_json_response.py --backend-dir /tmp/baseline/backend   # 端對端量舊版 (前後對照)
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+STUB_SCRIPT = Path(__file__).parent / 'stub_anthropic.py'
+sys.path.insert(0, str(BACKEND_DIR))
+
+TRANSLATION_PROMPT = 'You are a helpful English tutor.\n---TRANSLATION_MODE---'
+GRAMMAR_PROMPT = TRANSLATION_PROMPT + '\n---GRAMMAR_MODE---'
+MESSAGES = ['Can we practice?', 'I goes to work by bus every day.', 'Give me another one.', 'next']
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _cpu_seconds(pid: int) -> float:
+    """行程累計的 user + system CPU 秒數"""
+    fields = Path(f'/proc/{pid}/stat').read_text().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def sample_replies() -> tuple[str, str]:
+    """(fallback 回覆, API 回覆)：都從題庫組，長度與結構接近實際回覆"""
+    from services.question_bank_service import QuestionBankService
+
+    bank = QuestionBankService()
+    bank.configure_retrieval('keyword', 0.3)
+    bank.load()
+    # 練習題是隨機抽的：各取一輪中最長的一則，前後兩次執行的內容才會相同
+    fallback = max((bank.get_fallback_reply(TRANSLATION_PROMPT, m, 'bench') for m in MESSAGES * 20), key=len)
+    api = max((bank.get_fallback_reply(GRAMMAR_PROMPT, m, 'bench') for m in MESSAGES * 20), key=len)
+    return fallback, api
+
+
+def bench_encode(fallback: str, api: str, iterations: int):
+    import main
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from services.json_response import json_responses
+
+    field = next(r for r in main.app.routes if getattr(r, 'path', '') == '/api/chat').response_field
+
+    async def pydantic_body(reply: str) -> bytes:
+        content = await serialize_response(field=field, response_content=main.ChatResponse(reply=reply))
+        return JSONResponse(content).body
+
+    def measure(encode) -> tuple[float, int]:
+        size = len(encode())
+        start = time.process_time()
+        for _ in range(iterations):
+            encode()
+        return (time.process_time() - start) / iterations * 1e6, size
+
+    loop = asyncio.new_event_loop()
+    print(f'encode step (in-process, {iterations} iterations)')
+    print(f'  {"reply":<9} {"path":<14} {"CPU µs":>8} {"bytes":>7}')
+    for label, reply in (('fallback', fallback), ('api', api)):
+        rows = [('pydantic', lambda: loop.run_until_complete(pydantic_body(reply)))]
+        for encoding in ENCODINGS:
+            if label == 'fallback':
+                rows.append((f'fast {encoding}', lambda e=encoding: json_responses.reply(reply, e).body))
+            else:
+                rows.append((f'fast {encoding}', lambda e=encoding: json_responses.render({'reply': reply}, e).body))
+        for path, encode in rows:
+            cpu_us, size = measure(encode)
+            print(f'  {label:<9} {path:<14} {cpu_us:8.1f} {size:7d}')
+    loop.close()
+
+
+def bench_end_to_end(mode: str, backend_dir: Path, stub_url: str, requests: int):
+    port = _free_port()
+    env = {
+        **os.environ,
+        'ANTHROPIC_API_KEY': '' if mode == 'offline' else 'sk-ant-stub',
+        'ANTHROPIC_BASE_URL': stub_url,
+        'METRICS_THREADPOOL_PROBE_SECONDS': '0',
+    }
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=backend_dir, env=env,
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        _wait_ready(f'{base_url}/api/health')
+        prompt = GRAMMAR_PROMPT if mode == 'api' else TRANSLATION_PROMPT
+        with httpx.Client(base_url=base_url, timeout=30.0) as http:
+            for encoding in ENCODINGS:
+                headers = {'Accept-Encoding': encoding, 'X-Session-Id': f'bench-{encoding}'}
+
+                def send(i: int) -> httpx.Response:
+                    return http.post('/api/chat', headers=headers, json={
+                        'messages': [{'role': 'user', 'content': MESSAGES[i % len(MESSAGES)]}],
+                        'system_prompt': prompt,
+                    })
+
+                for i in range(min(200, requests)):
+                    send(i)
+                cpu_before = _cpu_seconds(backend.pid)
+                latencies, wire, compressed = [], 0, 0
+                for i in range(requests):
+                    start = time.perf_counter()
+                    r = send(i)
+                    latencies.append(time.perf_counter() - start)
+                    wire += r.num_bytes_downloaded
+                    compressed += 'content-encoding' in r.headers
+                cpu = _cpu_seconds(backend.pid) - cpu_before
+                print(f'  {mode:<8} {encoding:<9} {cpu / requests * 1e6:8.0f} {wire / requests:9.0f} '
+                      f'{statistics.median(latencies) * 1000:8.2f} {compressed / requests:10.0%}')
+    finally:
+        backend.terminate()
+        backend.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='/api/chat 回應編碼 benchmark')
+    parser.add_argument('--iterations', type=int, default=5000, help='編碼步驟每種路徑的次數')
+    parser.add_argument('--requests', type=int, default=2000, help='端對端每種編碼的請求數')
+    parser.add_argument('--backend-dir', type=Path, default=BACKEND_DIR, help='端對端要量的 backend 目錄')
+    parser.add_argument('--skip-encode', action='store_true', help='只跑端對端')
+    args = parser.parse_args()
+
+    fallback, api = sample_replies()
+    print(f'fallback reply {len(fallback.encode())} bytes, api reply {len(api.encode())} bytes (UTF-8)')
+    if not args.skip_encode:
+        bench_encode(fallback, api, args.iterations)
+
+    print(f'end to end ({args.backend_dir}, {args.requests} sequential requests per row)')
+    print(f'  {"mode":<8} {"encoding":<9} {"CPU µs":>8} {"bytes":>9} {"p50 ms":>8} {"compressed":>10}')
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', encoding='utf-8', delete=False) as f:
+        f.write(api)
+    stub_port = _free_port()
+    stub = subprocess.Popen([sys.executable, str(STUB_SCRIPT), '--port', str(stub_port), '--reply-file', f.name])
+    try:
+        _wait_ready(f'http://127.0.0.1:{stub_port}/docs')
+        for mode in ('offline', 'api'):
+            bench_end_to_end(mode, args.backend_dir, f'http://127.0.0.1:{stub_port}', args.requests)
+    finally:
+        stub.terminate()
+        stub.wait()
+        os.unlink(f.name)
+
+
+if __name__ == '__main__':
+    main()
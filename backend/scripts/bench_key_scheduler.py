@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""per-key 公平排程 benchmark
+
+啟動本機 stub Anthropic（固定延遲）與 backend（上游並發固定為 --upstream 個），
+一把「吵」的 key 以 --noisy-concurrency 個連線不停打 /api/chat，
+另外 --quiet-keys 把 key 各以一個連線、每次間隔 --think 秒送請求，
+回報兩組各自的請求數、由 Claude（stub）回答的比例與 p50 / p95 延遲。
+
+回覆等於 stub 的固定回覆就算 API 回答，其他是題庫 fallback。
+
+用法：
+  python scripts/bench_key_scheduler.py
+  python scripts/bench_key_scheduler.py --key-rpm 0 --key-tpm 0           # 只看公平排隊，不限配額
+  python scripts/bench_key_scheduler.py --backend-dir /tmp/baseline/backend   # 測舊版 (前後對照)
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent.parent
+STUB_SCRIPT = Path(__file__).parent / 'stub_anthropic.py'
+STUB_REPLY = 'This is a stub reply.'
+MESSAGES = ['Hi, nice to meet you.', 'Can you tell me about the role?', 'I have five years of experience.']
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.api = 0
+
+    def summary(self) -> str:
+        n = len(self.latencies)
+        if not n:
+            return f'{0:6d}'
+        ordered = sorted(self.latencies)
+        p95 = ordered[min(n - 1, int(n * 0.95))]
+        return (f'{n:6d} {self.api / n:7.0%} {statistics.median(ordered) * 1000:8.0f} '
+                f'{p95 * 1000:8.0f}')
+
+
+async def client_loop(http: httpx.AsyncClient, api_key: str, stats: Stats, deadline: float, think: float):
+    i = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        r = await http.post('/api/chat', headers={'X-Api-Key': api_key}, json={
+            'messages': [{'role': 'user', 'content': MESSAGES[i % len(MESSAGES)]}],
+        })
+        stats.latencies.append(time.perf_counter() - start)
+        stats.api += r.json()['reply'] == STUB_REPLY
+        i += 1
+        if think:
+            await asyncio.sleep(think)
+
+
+async def run_load(base_url: str, args) -> tuple[Stats, Stats]:
+    noisy, quiet = Stats(), Stats()
+    limits = httpx.Limits(max_connections=args.noisy_concurrency + args.quiet_keys + 4)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as http:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            *(client_loop(http, 'sk-ant-noisy', noisy, deadline, 0) for _ in range(args.noisy_concurrency)),
+            *(client_loop(http, f'sk-ant-quiet-{k}', quiet, deadline, args.think) for k in range(args.quiet_keys)),
+        )
+    return noisy, quiet
+
+
+def main():
+    parser = argparse.ArgumentParser(description='per-key 公平排程 benchmark')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--latency', type=float, default=0.5, help='stub 每個請求的延遲秒數')
+    parser.add_argument('--upstream', type=int, default=8, help='backend 的上游並發上限（固定）')
+    parser.add_argument('--admission-wait', type=float, default=2.0, help='ADMISSION_WAIT_SECONDS')
+    parser.add_argument('--noisy-concurrency', type=int, default=32)
+    parser.add_argument('--quiet-keys', type=int, default=4)
+    parser.add_argument('--think', type=float, default=1.0, help='安靜的 key 兩次請求之間的間隔秒數')
+    parser.add_argument('--key-rpm', type=int, default=30, help='KEY_RPM_LIMIT（0 = 不限）')
+    parser.add_argument('--key-tpm', type=int, default=30000, help='KEY_TPM_LIMIT（0 = 不限）')
+    parser.add_argument('--backend-dir', type=Path, default=BACKEND_DIR)
+    args = parser.parse_args()
+
+    stub_port, port = _free_port(), _free_port()
+    stub = subprocess.Popen(
+        [sys.executable, str(STUB_SCRIPT), '--port', str(stub_port), '--latency', str(args.latency)],
+    )
+    env = {
+        **os.environ,
+        'ANTHROPIC_API_KEY': 'sk-ant-stub',
+        'ANTHROPIC_BASE_URL': f'http://127.0.0.1:{stub_port}',
+        'UPSTREAM_INITIAL_CONCURRENCY': str(args.upstream),
+        'UPSTREAM_MIN_CONCURRENCY': str(args.upstream),
+        'MAX_CONCURRENT_UPSTREAM': str(args.upstream),
+        'ADMISSION_WAIT_SECONDS': str(args.admission_wait),
+        'METRICS_THREADPOOL_PROBE_SECONDS': '0',
+        'KEY_RPM_LIMIT': str(args.key_rpm),
+        'KEY_TPM_LIMIT': str(args.key_tpm),
+    }
+    backend = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=args.backend_dir, env=env,
+    )
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        _wait_ready(f'http://127.0.0.1:{stub_port}/docs')
+        _wait_ready(f'{base_url}/api/health')
+        noisy, quiet = asyncio.run(run_load(base_url, args))
+        print(f'{args.backend_dir}：上游並發 {args.upstream}、stub 延遲 {args.latency}s、{args.duration:.0f}s')
+        print(f'  {"":<24} {"reqs":>6} {"API":>7} {"p50 ms":>8} {"p95 ms":>8}')
+        print(f'  {f"noisy key (x{args.noisy_concurrency})":<24} {noisy.summary()}')
+        print(f'  {f"quiet keys (x{args.quiet_keys})":<24} {quiet.summary()}')
+        keys = httpx.get(f'{base_url}/api/status').json().get('keys')
+        if keys:
+            for kid, state in keys['keys'].items():
+                print(f'  {kid}: admitted {state["admitted"]}, throttled {state["throttled"]}, '
+                      f'timed out {state["timed_out"]}, avg wait {state["avg_wait_ms"]} ms')
+    finally:
+        backend.terminate()
+        stub.terminate()
+        backend.wait()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
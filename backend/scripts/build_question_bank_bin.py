@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""把 JSON 題庫編譯成 mmap 用的 bank.bin
+
+用法：
+  python scripts/build_question_bank_bin.py                    # data/question_bank → data/question_bank/bank.bin
+  python scripts/build_question_bank_bin.py --data-dir /path/to/question_bank
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.bank_file import BANK_FILENAME, compile_bank  # noqa: E402
+from services.question_bank_service import DATA_DIR, load_json_bank  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='編譯題庫二進位檔')
+    parser.add_argument('--data-dir', type=Path, default=DATA_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    drills, responses = load_json_bank(args.data_dir)
+    out_path = args.data_dir / BANK_FILENAME
+    compile_bank(drills, responses, out_path)
+
+    print(
+        f'{out_path}: drills={sum(len(d) for d in drills.values())} '
+        f'fallback_responses={sum(len(r) for r in responses.values())} '
+        f'size={out_path.stat().st_size / 1024:.1f} KiB '
+        f'({time.perf_counter() - start:.2f}s)'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""題庫壓實：找出近似重複的題目並合併
+
+generate_question_bank.py 只在批次合併時做完全相同（正規化後）的去重；
+題庫越生越大之後，不同批次常出現只差幾個字的 sentence / prompt / situation。
+這個步驟以 MinHash + LSH 找近似重複，整個流程串流處理，記憶體不隨題庫大小暴增：
+
+1. 逐檔串流讀 JSON 陣列，每題取主要欄位（與生成器去重相同）正規化後切字元 5-gram，
+   算 MinHash 簽章寫到暫存檔；每個 LSH band 的 (bucket key, 題目序號) 依 key 分散寫到數個分區檔
+2. 一次讀一個分區，同一 bucket 的題目以簽章估計 Jaccard，超過門檻就用 union-find 併成一群
+   （根固定是序號最小的，也就是最早出現的那題）
+3. 重複的預建回應把 keywords 併到保留的那題
+4. 再串流一次寫出保留的題目：id 改為 `<題型或場景>_<正規化文字 hash>`，內容不變 id 就不變；
+   最後更新 metadata.json 的題數
+
+同一個題型 / 場景檔案內才互相比對。常駐記憶體只有每題 4 bytes 的 union-find 陣列、
+一個分區的 bucket 與重複回應的 keywords；簽章與 bucket 都在暫存目錄。
+
+用法：
+  python scripts/compact_question_bank.py                  # 就地壓實 data/question_bank
+  python scripts/compact_question_bank.py --dry-run        # 只回報會合併哪些題目
+  python scripts/compact_question_bank.py --threshold 0.8 --out-dir /tmp/compact_bank
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import tempfile
+import textwrap
+import time
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.question_bank_service import DATA_DIR, DRILL_TYPES  # noqa: E402
+
+# 與 generate_question_bank.py 去重時的主要文字欄位相同
+DEDUPE_FIELDS = {
+    'grammar_fill': 'sentence',
+    'vocabulary': 'prompt',
+    'situational': 'situation',
+    'pronunciation': 'word',
+    'responses': 'user_example',
+}
+
+SHINGLE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+PARTITIONS = 64
+BATCH = 4096
+CHUNK_SIZE = 1 << 20
+
+# 排列以 multiply-shift 雜湊模擬：(a * x + b) mod 2^64 取高 32 位（a 為奇數）
+_rng = np.random.default_rng(20260301)  # 固定種子：同一份題庫每次結果相同
+_PERM_A = (_rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) << np.uint64(1) | np.uint64(1))[:, None]
+_PERM_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)[:, None]
+_BUCKET_DTYPE = np.dtype([('key', '<u8'), ('seq', '<u4')])
+
+
+def iter_json_array(path: Path) -> Iterator:
+    """逐一產出 JSON 陣列的元素，不把整個檔案讀進記憶體
+
+    舊格式 {"questions": [...]} / {"responses": [...]} 只在小檔出現，整檔解析。
+    """
+    decoder = json.JSONDecoder()
+    with path.open(encoding='utf-8') as f:
+        buf, pos, opened = '', 0, False
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or (opened and buf[pos] == ',')):
+                pos += 1
+            if pos == len(buf):
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    raise ValueError(f'{path.name}: JSON 陣列不完整')
+                buf, pos = chunk, 0
+                continue
+            if not opened:
+                if buf[pos] == '{':
+                    data = json.loads(buf[pos:] + f.read())
+                    yield from data.get('questions', data.get('responses', []))
+                    return
+                if buf[pos] != '[':
+                    raise ValueError(f'{path.name}: 不是 JSON 陣列')
+                opened, pos = True, pos + 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 元素跨過 chunk 邊界：補讀後從元素開頭重解
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+            if pos > CHUNK_SIZE:
+                buf, pos = buf[pos:], 0
+
+
+class ArrayWriter:
+    """以與 json.dumps(items, indent=2) 相同的格式逐題寫出 JSON 陣列（先寫暫存檔再 rename）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp = path.with_name(f'.{path.name}.tmp')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = self.tmp.open('w', encoding='utf-8')
+        self.count = 0
+
+    def write(self, item: dict):
+        self.f.write(',\n' if self.count else '[\n')
+        self.f.write(textwrap.indent(json.dumps(item, ensure_ascii=False, indent=2), '  '))
+        self.count += 1
+
+    def close(self):
+        self.f.write('\n]' if self.count else '[]')
+        self.f.close()
+        self.tmp.replace(self.path)
+
+
+def normalize(text: str) -> str:
+    return re.sub(r'[^\w]+', ' ', str(text).lower()).strip()
+
+
+def fingerprint_text(item, field: str) -> str:
+    """比對用文字：主要欄位，沒有時用整題內容"""
+    if not isinstance(item, dict):
+        return normalize(json.dumps(item, ensure_ascii=False, sort_keys=True))
+    return normalize(item.get(field) or item.get('response') or json.dumps(item, ensure_ascii=False, sort_keys=True))
+
+
+def minhash(text: str) -> np.ndarray:
+    """字元 5-gram 的 MinHash 簽章（NUM_PERM 個 uint32）"""
+    data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+    if len(data) < SHINGLE:
+        data = np.concatenate([data, np.zeros(SHINGLE - len(data), dtype=np.uint64)])
+    h = np.zeros(len(data) - SHINGLE + 1, dtype=np.uint64)
+    for k in range(SHINGLE):
+        h = h * np.uint64(257) + data[k:len(data) - SHINGLE + 1 + k]
+    shingles = np.unique((h * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32))
+    return ((_PERM_A * shingles + _PERM_B) >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def band_keys(sigs: np.ndarray, group: int) -> np.ndarray:
+    """每題每個 band 的 bucket key（group 區分檔案，不同檔案的題目不會同 bucket）；shape (n, BANDS)"""
+    keys = np.empty((len(sigs), BANDS), dtype=np.uint64)
+    for band in range(BANDS):
+        k = np.full(len(sigs), np.uint64(group * 1_000_003 + band) * np.uint64(0x100000001B3))
+        for col in sigs[:, band * ROWS:(band + 1) * ROWS].T:
+            k = (k ^ col.astype(np.uint64)) * np.uint64(0x100000001B3)
+        keys[:, band] = k
+    return keys
+
+
+class BankFiles:
+    """題庫中要壓實的檔案：(類別, 名稱, 路徑, 比對欄位)"""
+
+    def __init__(self, data_dir: Path):
+        self.entries: list[tuple[str, str, Path, str]] = []
+        for drill_type in DRILL_TYPES:
+            f = data_dir / 'drills' / f'{drill_type}.json'
+            if f.exists():
+                self.entries.append(('drills', drill_type, f, DEDUPE_FIELDS[drill_type]))
+        responses_dir = data_dir / 'fallback_responses'
+        if responses_dir.exists():
+            for f in sorted(responses_dir.glob('*.json')):
+                self.entries.append(('fallback_responses', f.stem, f, DEDUPE_FIELDS['responses']))
+
+
+class Compactor:
+    def __init__(self, files: BankFiles, work_dir: Path, threshold: float):
+        self.files = files
+        self.work_dir = work_dir
+        self.threshold = threshold
+        self.sig_path = work_dir / 'signatures.u32'
+        self.ranges: list[tuple[int, int]] = []  # 每個檔案的題目序號區間
+        self.total = 0
+        self.parent: np.ndarray | None = None
+
+    # 1. 簽章與 LSH bucket
+    def fingerprint(self):
+        partitions = [(self.work_dir / f'bucket_{p:02d}').open('wb') for p in range(PARTITIONS)]
+        try:
+            with self.sig_path.open('wb') as sig_file:
+                for group, (_, _, path, field) in enumerate(self.files.entries):
+                    start = self.total
+                    batch: list[np.ndarray] = []
+                    for item in iter_json_array(path):
+                        batch.append(minhash(fingerprint_text(item, field)))
+                        if len(batch) == BATCH:
+                            self._flush(batch, group, sig_file, partitions)
+                            batch = []
+                    if batch:
+                        self._flush(batch, group, sig_file, partitions)
+                    self.ranges.append((start, self.total))
+        finally:
+            for f in partitions:
+                f.close()
+
+    def _flush(self, batch: list[np.ndarray], group: int, sig_file, partitions):
+        sigs = np.stack(batch)
+        sigs.tofile(sig_file)
+        keys = band_keys(sigs, group)
+        records = np.empty(keys.size, dtype=_BUCKET_DTYPE)
+        records['key'] = keys.ravel()
+        records['seq'] = np.repeat(np.arange(self.total, self.total + len(sigs), dtype=np.uint32), BANDS)
+        part = records['key'] % np.uint64(PARTITIONS)
+        order = np.argsort(part, kind='stable')
+        bounds = np.searchsorted(part[order], np.arange(PARTITIONS + 1))
+        for p in range(PARTITIONS):
+            if bounds[p] < bounds[p + 1]:
+                records[order[bounds[p]:bounds[p + 1]]].tofile(partitions[p])
+        self.total += len(sigs)
+
+    # 2. 候選配對與 union-find
+    def _find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = int(parent[x])
+        return x
+
+    def cluster(self) -> int:
+        """回傳確認為近似重複的配對數"""
+        self.parent = np.arange(self.total, dtype=np.uint32)
+        if not self.total:
+            return 0
+        sigs = np.memmap(self.sig_path, dtype=np.uint32, mode='r', shape=(self.total, NUM_PERM))
+        pairs = 0
+        for p in range(PARTITIONS):
+            records = np.fromfile(self.work_dir / f'bucket_{p:02d}', dtype=_BUCKET_DTYPE)
+            if len(records) < 2:
+                continue
+            records = records[np.lexsort((records['seq'], records['key']))]
+            keys, seqs = records['key'], records['seq']
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            ends = np.r_[starts[1:], len(keys)]
+            for s, e in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+                first, members = int(seqs[s]), seqs[s + 1:e]
+                similar = (sigs[members] == sigs[first]).mean(axis=1) >= self.threshold
+                for m in members[similar]:
+                    a, b = self._find(first), self._find(int(m))
+                    if a != b:
+                        self.parent[max(a, b)] = min(a, b)
+                        pairs += 1
+        # 壓平成每題直接指向根（序號最小的那題）
+        while True:
+            grand = self.parent[self.parent]
+            if np.array_equal(grand, self.parent):
+                break
+            self.parent = grand
+        return pairs
+
+    # 3. 合併預建回應的 keywords
+    def merged_keywords(self) -> dict[int, list[str]]:
+        """保留題目序號 → 群組內其他題目的 keywords（依出現順序）"""
+        merged: dict[int, list[str]] = {}
+        for (kind, _, path, _), (start, end) in zip(self.files.entries, self.ranges):
+            if kind != 'fallback_responses' or np.all(self.parent[start:end] == np.arange(start, end)):
+                continue
+            for seq, item in enumerate(iter_json_array(path), start):
+                root = int(self.parent[seq])
+                if root != seq and isinstance(item, dict):
+                    merged.setdefault(root, []).extend(k for k in item.get('keywords', []) if isinstance(k, str))
+        return merged
+
+    # 4. 寫出
+    def write(self, out_dir: Path, data_dir: Path, merged: dict[int, list[str]]) -> dict[tuple[str, str], int]:
+        counts: dict[tuple[str, str], int] = {}
+        for (kind, name, path, field), (start, _) in zip(self.files.entries, self.ranges):
+            writer = ArrayWriter(out_dir / path.relative_to(data_dir))
+            for seq, item in enumerate(iter_json_array(path), start):
+                if self.parent[seq] != seq or not isinstance(item, dict):
+                    continue
+                digest = hashlib.blake2b(fingerprint_text(item, field).encode('utf-8'), digest_size=8).hexdigest()
+                item['id'] = f'{name}_{digest}'
+                if seq in merged:
+                    keywords = item.get('keywords', [])
+                    item['keywords'] = list(dict.fromkeys(
+                        k.strip().lower() for k in [*keywords, *merged[seq]] if k.strip()
+                    ))
+                writer.write(item)
+            writer.close()
+            counts[(kind, name)] = writer.count
+        return counts
+
+    def report(self, limit: int):
+        """列出前幾個被併掉的題目與保留的題目（--dry-run）"""
+        seqs = np.arange(self.total, dtype=np.uint32)
+        dupes = np.flatnonzero(self.parent != seqs)[:limit]
+        wanted = {int(s): None for s in np.concatenate([dupes, self.parent[dupes]])}
+        for (_, name, path, field), (start, end) in zip(self.files.entries, self.ranges):
+            if any(start <= s < end for s in wanted):
+                for seq, item in enumerate(iter_json_array(path), start):
+                    if seq in wanted:
+                        wanted[seq] = f'{name}: {fingerprint_text(item, field)[:70]}'
+        for seq in dupes:
+            print(f'  - {wanted[int(seq)]}\n    ≈ {wanted[int(self.parent[seq])]}')
+
+
+def update_metadata(out_dir: Path, data_dir: Path, counts: dict[tuple[str, str], int], removed: int, threshold: float):
+    """更新 metadata.json 的題數（保留其他欄位）"""
+    src = data_dir / 'metadata.json'
+    metadata = json.loads(src.read_text(encoding='utf-8')) if src.exists() else {}
+    stats = metadata.setdefault('stats', {})
+    stats['drills'] = sum(c for (kind, _), c in counts.items() if kind == 'drills')
+    response_key = 'responses' if 'responses' in stats else 'fallback_responses'
+    stats[response_key] = sum(c for (kind, _), c in counts.items() if kind == 'fallback_responses')
+    for kind, entries in metadata.get('files', {}).items():
+        for entry in entries if isinstance(entries, list) else []:
+            if isinstance(entry, dict) and 'file' in entry:
+                count = counts.get((kind, Path(entry['file']).stem))
+                if count is not None:
+                    entry['count'] = count
+    metadata['compaction'] = {
+        'compacted_at': datetime.now().isoformat(timespec='seconds'),
+        'threshold': threshold,
+        'removed': removed,
+    }
+    dst = out_dir / 'metadata.json'
+    dst.write_text(json.dumps(metadata, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='題庫近似重複壓實')
+    parser.add_argument('--data-dir', type=Path, default=DATA_DIR)
+    parser.add_argument('--out-dir', type=Path, help='輸出目錄（預設就地覆寫）')
+    parser.add_argument('--threshold', type=float, default=0.7, help='估計 Jaccard 達到多少視為重複 (預設: 0.7)')
+    parser.add_argument('--dry-run', action='store_true', help='只回報，不寫檔')
+    parser.add_argument('--work-dir', type=Path, help='暫存目錄（簽章與 bucket，約每題 450 bytes）')
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    out_dir = args.out_dir or data_dir
+    files = BankFiles(data_dir)
+    if not files.entries:
+        print(f'{data_dir} 沒有題庫檔案')
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=args.work_dir) as work:
+        compactor = Compactor(files, Path(work), args.threshold)
+        compactor.fingerprint()
+        t_fp = time.perf_counter()
+        pairs = compactor.cluster()
+        t_cluster = time.perf_counter()
+        keep = compactor.parent == np.arange(compactor.total, dtype=np.uint32)
+        removed = int(compactor.total - keep.sum())
+
+        print(f'{compactor.total} 題，近似重複 {removed} 題（{pairs} 組配對）'
+              f'  簽章 {t_fp - start:.1f}s / 分群 {t_cluster - t_fp:.1f}s')
+        for (_, name, _, _), (s, e) in zip(files.entries, compactor.ranges):
+            print(f'  {name}: {e - s} → {int(keep[s:e].sum())}')
+        if args.dry_run:
+            compactor.report(limit=20)
+            return
+
+        counts = compactor.write(out_dir, data_dir, compactor.merged_keywords())
+        update_metadata(out_dir, data_dir, counts, removed, args.threshold)
+
+    print(f'已寫入 {out_dir}（{time.perf_counter() - start:.1f}s）')
+    if (out_dir / 'bank.bin').exists():
+        print('bank.bin 已過期，請重跑 scripts/build_question_bank_bin.py')
+
+
+if __name__ == '__main__':
+    main()
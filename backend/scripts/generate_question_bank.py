@@ -3,29 +3,49 @@
 
 用 Claude API 批次生成練習題和預建回應。
 
+每個題型 / 場景切成小批（預設每批 10 題）並行生成：
+- semaphore 限制同時請求數；遇到 429 依 retry-after 讓所有 worker 一起暫停
+- 失敗的批次以指數退避重試
+- 每完成一批就寫 checkpoint，中斷後重跑會從未完成的批次繼續
+- 合併時跨批次去重，再重新編 id
+
+--batch 模式改用 Message Batches API：所有批次一次送出，輪詢到完成後串流讀取結果，
+每讀到一批就寫 checkpoint，某個題型 / 場景的批次到齊就立刻寫出 JSON。
+不需要即時回應的大量重建用這個模式，成本較低、也不受每分鐘請求數限制。
+
 用法：
   python scripts/generate_question_bank.py              # 生成全部
   python scripts/generate_question_bank.py --mode drills       # 只生成練習題
   python scripts/generate_question_bank.py --mode responses    # 只生成預建回應
+  python scripts/generate_question_bank.py --concurrency 8 --batch-size 10
+  python scripts/generate_question_bank.py --force             # 已存在的檔案也重新生成
+  python scripts/generate_question_bank.py --batch --force     # 以 Message Batches API 全部重建
+  python scripts/compact_question_bank.py                      # 生成後：合併近似重複的題目
+  ANTHROPIC_BASE_URL=http://127.0.0.1:9000 python scripts/generate_question_bank.py   # 對本機假伺服器測試
 """
 
 import argparse
+import asyncio
 import json
 import os
+import random
+import re
 import sys
 import time
 from pathlib import Path
 
 from dotenv import load_dotenv
-from anthropic import Anthropic
+import anthropic
+from anthropic import AsyncAnthropic
 
 # 載入環境變數
 env_path = Path(__file__).parent.parent / '.env'
 if env_path.exists():
     load_dotenv(env_path)
 
-client = Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'))
 DATA_DIR = Path(__file__).parent.parent / 'data' / 'question_bank'
+CHECKPOINT_DIR = DATA_DIR / '.checkpoints'
+MODEL = 'claude-sonnet-4-20250514'
 
 DRILL_TYPES = [
     ('grammar_fill', 30, 'grammar fill-in-the-blank'),
@@ -39,11 +59,30 @@ SCENARIOS = [
     ('free-chat', 20, 'casual free conversation'),
 ]
 
+# 每批輪流指定一個主題，讓並行的批次不要生出同樣的題目
+TOPIC_HINTS = [
+    'professional communication', 'daily life', 'academic', 'technology',
+    'travel', 'health and wellbeing', 'shopping and services', 'culture and media',
+]
 
-def generate_drills(drill_type: str, count: int, desc: str) -> list[dict]:
-    """生成練習題"""
-    if drill_type == 'grammar_fill':
-        format_spec = '''[
+# 去重用的主要文字欄位
+DEDUPE_FIELDS = {
+    'grammar_fill': 'sentence',
+    'vocabulary': 'prompt',
+    'situational': 'situation',
+    'pronunciation': 'word',
+    'responses': 'user_example',
+}
+
+MAX_RETRIES = 5
+# --batch 模式：送出的 batch id 記在這裡，中斷後重跑會接著輪詢同一個 batch
+BATCH_STATE_FILE = CHECKPOINT_DIR / 'message_batch.json'
+POLL_INITIAL_SECONDS = 5
+POLL_MAX_SECONDS = 120
+TOKENS_PER_ITEM = {'drills': 400, 'responses': 300}
+
+DRILL_FORMAT_SPECS = {
+    'grammar_fill': '''[
   {
     "id": "grammar_fill_001",
     "sentence": "She _____ to the store if she had known it was closed.",
@@ -51,9 +90,8 @@ def generate_drills(drill_type: str, count: int, desc: str) -> list[dict]:
     "answer": "wouldn't have gone",
     "response": "Let's practice grammar! Fill in the blank:\\n\\nShe _____ to the store if she had known it was closed.\\n\\n1. wouldn't have gone\\n2. won't go\\n3. didn't go\\n4. hasn't gone\\n\\n(The correct answer is: wouldn't have gone - This is the third conditional, used for unreal past situations.)"
   }
-]'''
-    elif drill_type == 'vocabulary':
-        format_spec = '''[
+]''',
+    'vocabulary': '''[
   {
     "id": "vocabulary_001",
     "prompt": "Choose the word that best completes the sentence: The scientist's findings were _____ by multiple independent studies.",
@@ -61,74 +99,50 @@ def generate_drills(drill_type: str, count: int, desc: str) -> list[dict]:
     "answer": "corroborated",
     "response": "Vocabulary check!\\n\\nChoose the word that best completes the sentence: The scientist's findings were _____ by multiple independent studies.\\n\\n1. corroborated\\n2. fabricated\\n3. diminished\\n4. extricated\\n\\n(The correct answer is: corroborated - meaning to confirm or support with evidence.)"
   }
-]'''
-    elif drill_type == 'situational':
-        format_spec = '''[
+]''',
+    'situational': '''[
   {
     "id": "situational_001",
     "situation": "Your colleague just gave a presentation and asks for your feedback. You think it was good but the pacing was too fast.",
     "example_response": "Great job on the presentation! The content was really solid. One thing I'd suggest is slowing down a bit - some of the key points went by quickly, and I think the audience would benefit from having a moment to absorb them.",
     "response": "Situational response practice:\\n\\nSituation: Your colleague just gave a presentation and asks for your feedback. You think it was good but the pacing was too fast.\\n\\nHow would you respond?\\n\\nExample answer: Great job on the presentation! The content was really solid. One thing I'd suggest is slowing down a bit - some of the key points went by quickly, and I think the audience would benefit from having a moment to absorb them."
   }
-]'''
-    elif drill_type == 'pronunciation':
-        format_spec = '''[
+]''',
+    'pronunciation': '''[
   {
     "id": "pronunciation_001",
     "word": "thoroughly /THUR-oh-lee/",
     "tip": "The 'th' is voiced (like 'the'), not voiceless (like 'think'). The 'ough' sounds like 'uh'. Stress is on the first syllable.",
     "response": "Pronunciation practice:\\n\\nWord: thoroughly /THUR-oh-lee/\\n\\nTip: The 'th' is voiced (like 'the'), not voiceless (like 'think'). The 'ough' sounds like 'uh'. Stress is on the first syllable."
   }
-]'''
-    else:
-        return []
+]''',
+}
 
-    prompt = f"""Generate {count} {desc} exercises for an English learner.
+
+def build_drill_prompt(drill_type: str, count: int, desc: str, start: int = 1, topic: str = '') -> str:
+    """練習題 prompt（start 為這批的第一個 id 編號）"""
+    format_spec = DRILL_FORMAT_SPECS[drill_type]
+    end = start + count - 1
+    focus = f'\nFocus this batch on: {topic}.' if topic else ''
+    return f"""Generate {count} {desc} exercises for an English learner.
 Level: intermediate to advanced (B2-C1).
-Topics: professional communication, daily life, academic, technology.
+Topics: professional communication, daily life, academic, technology.{focus}
 
 Format as JSON array (no markdown code block):
 
 {format_spec}
 
-Generate exactly {count} items. IDs should be {drill_type}_001 through {drill_type}_{count:03d}.
+Generate exactly {count} items. IDs should be {drill_type}_{start:03d} through {drill_type}_{end:03d}.
 Each "response" field should be a complete, self-contained reply text that includes the exercise AND the answer.
+Also give every item a CEFR "level" (e.g. "B2") and a short lowercase "topic" (e.g. "conditionals").
 Vary difficulty and topics across the {count} items."""
 
-    response = client.messages.create(
-        model='claude-sonnet-4-20250514',
-        max_tokens=4096 * 3,
-        system='You are an English language exercise generator. Output only valid JSON, no other text.',
-        messages=[{'role': 'user', 'content': prompt}],
-    )
-
-    text = response.content[0].text.strip()
-    if text.startswith('```'):
-        text = text.split('\n', 1)[1]
-        if text.endswith('```'):
-            text = text[:-3]
-        text = text.strip()
-
-    try:
-        questions = json.loads(text)
-        print(f'  {drill_type}: {len(questions)} 題')
-        return questions
-    except json.JSONDecodeError:
-        try:
-            start = text.index('[')
-            end = text.rindex(']') + 1
-            questions = json.loads(text[start:end])
-            print(f'  {drill_type}: 修復後取得 {len(questions)} 題')
-            return questions
-        except (ValueError, json.JSONDecodeError):
-            print(f'  {drill_type}: JSON 解析失敗，跳過')
-            return []
-
 
-def generate_fallback_responses(scenario: str, count: int, desc: str) -> list[dict]:
-    """生成預建回應"""
-    prompt = f"""Generate {count} Q&A pairs for an English tutoring chatbot in the following scenario:
-{desc}
+def build_response_prompt(scenario: str, count: int, desc: str, start: int = 1, topic: str = '') -> str:
+    """預建回應 prompt"""
+    focus = f'\nFocus this batch on: {topic}.' if topic else ''
+    return f"""Generate {count} Q&A pairs for an English tutoring chatbot in the following scenario:
+{desc}{focus}
 
 Each pair should have:
 1. A list of keywords that would trigger this response
@@ -138,7 +152,7 @@ Format as JSON array (no markdown code block):
 
 [
   {{
-    "id": "{scenario}_001",
+    "id": "{scenario}_{start:03d}",
     "keywords": ["tell me about", "what is", "describe"],
     "user_example": "Can you tell me about the role?",
     "response": "This role involves working closely with the team to tackle key challenges in our domain. You'd be collaborating across functions and contributing to impactful projects. It's a great fit for someone who enjoys problem-solving and continuous learning!"
@@ -149,14 +163,37 @@ Generate exactly {count} items covering common questions and conversation starte
 Keywords should be lowercase phrases that commonly appear in user messages.
 Responses should sound natural, friendly, and conversational (2-3 sentences)."""
 
-    response = client.messages.create(
-        model='claude-sonnet-4-20250514',
-        max_tokens=4096 * 2,
-        system='You are an English tutoring response generator. Output only valid JSON, no other text.',
-        messages=[{'role': 'user', 'content': prompt}],
-    )
 
-    text = response.content[0].text.strip()
+DRILL_SYSTEM = 'You are an English language exercise generator. Output only valid JSON, no other text.'
+RESPONSE_SYSTEM = 'You are an English tutoring response generator. Output only valid JSON, no other text.'
+
+
+def batch_request(kind: str, name: str, desc: str, count: int, batch_size: int, b: int) -> dict:
+    """第 b 批的 Messages API 參數（即時模式與 --batch 模式共用）"""
+    start = b * batch_size + 1
+    n = min(batch_size, count - b * batch_size)
+    topic = TOPIC_HINTS[b % len(TOPIC_HINTS)]
+    if kind == 'drills':
+        prompt = build_drill_prompt(name, n, desc, start, topic)
+        system = DRILL_SYSTEM
+    else:
+        prompt = build_response_prompt(name, n, desc, start, topic)
+        system = RESPONSE_SYSTEM
+    return {
+        'model': MODEL,
+        'max_tokens': TOKENS_PER_ITEM[kind] * n + 512,
+        'system': system,
+        'messages': [{'role': 'user', 'content': prompt}],
+    }
+
+
+def batch_count(count: int, batch_size: int) -> int:
+    return (count + batch_size - 1) // batch_size
+
+
+def parse_items(text: str) -> list[dict] | None:
+    """解析模型輸出的 JSON 陣列：去掉 code fence，失敗時取第一個 [ 到最後一個 ] 修復"""
+    text = text.strip()
     if text.startswith('```'):
         text = text.split('\n', 1)[1]
         if text.endswith('```'):
@@ -164,92 +201,326 @@ Responses should sound natural, friendly, and conversational (2-3 sentences)."""
         text = text.strip()
 
     try:
-        responses = json.loads(text)
-        print(f'  {scenario}: {len(responses)} 組')
-        return responses
+        items = json.loads(text)
     except json.JSONDecodeError:
         try:
             start = text.index('[')
             end = text.rindex(']') + 1
-            responses = json.loads(text[start:end])
-            print(f'  {scenario}: 修復後取得 {len(responses)} 組')
-            return responses
+            items = json.loads(text[start:end])
         except (ValueError, json.JSONDecodeError):
-            print(f'  {scenario}: JSON 解析失敗，跳過')
-            return []
+            return None
+    return items if isinstance(items, list) else None
 
 
-def run_drills():
-    """生成所有練習題"""
-    drills_dir = DATA_DIR / 'drills'
-    drills_dir.mkdir(parents=True, exist_ok=True)
+def _normalize(text: str) -> str:
+    return re.sub(r'[^\w]+', ' ', str(text).lower()).strip()
 
-    total = 0
-    for drill_type, count, desc in DRILL_TYPES:
-        out_file = drills_dir / f'{drill_type}.json'
 
-        if out_file.exists():
-            existing = json.loads(out_file.read_text(encoding='utf-8'))
-            c = len(existing) if isinstance(existing, list) else 0
-            print(f'  {drill_type}: 已存在 ({c} 題)，跳過')
-            total += c
+def dedupe_items(items: list[dict], field: str, prefix: str) -> list[dict]:
+    """跨批次去重（主要欄位正規化後相同視為重複），並重新編 id"""
+    seen: set[str] = set()
+    unique = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        key = _normalize(item.get(field, ''))
+        if not key or key in seen:
             continue
+        seen.add(key)
+        unique.append(item)
+    for i, item in enumerate(unique, 1):
+        item['id'] = f'{prefix}_{i:03d}'
+    return unique
 
-        print(f'  生成 {desc} ({drill_type})...')
-        questions = generate_drills(drill_type, count, desc)
-        if questions:
-            out_file.write_text(
-                json.dumps(questions, ensure_ascii=False, indent=2),
-                encoding='utf-8',
-            )
-            total += len(questions)
 
-        time.sleep(1)
+class RateGate:
+    """所有 worker 共用：限制並發數，遇到 429 時全部暫停到 retry-after 之後"""
 
-    print(f'練習題完成: {total} 題')
-    return total
+    def __init__(self, concurrency: int):
+        self._slots = asyncio.Semaphore(concurrency)
+        self._resume_at = 0.0
 
+    async def __aenter__(self):
+        await self._slots.acquire()
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
 
-def run_responses():
-    """生成預建回應"""
-    resp_dir = DATA_DIR / 'fallback_responses'
-    resp_dir.mkdir(parents=True, exist_ok=True)
+    async def __aexit__(self, *exc):
+        self._slots.release()
 
-    total = 0
-    for scenario, count, desc in SCENARIOS:
-        out_file = resp_dir / f'{scenario}.json'
+    def pause(self, seconds: float):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
 
-        if out_file.exists():
+
+def _retry_after(e: anthropic.APIStatusError) -> float | None:
+    try:
+        return float(e.response.headers.get('retry-after', ''))
+    except ValueError:
+        return None
+
+
+class Checkpoint:
+    """每個輸出檔一個 checkpoint：已完成批次的原始結果"""
+
+    def __init__(self, name: str):
+        self.path = CHECKPOINT_DIR / f'{name}.json'
+        self.batches: dict[str, list[dict]] = {}
+        if self.path.exists():
+            self.batches = json.loads(self.path.read_text(encoding='utf-8'))
+
+    def save(self, batch: int, items: list[dict]):
+        self.batches[str(batch)] = items
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.batches, ensure_ascii=False), encoding='utf-8')
+        tmp.replace(self.path)
+
+    def items(self) -> list[dict]:
+        return [item for key in sorted(self.batches, key=int) for item in self.batches[key]]
+
+    def merged(self, kind: str, name: str) -> list[dict]:
+        """合併所有批次：去重並重新編 id"""
+        raw = self.items()
+        field = DEDUPE_FIELDS[name if kind == 'drills' else 'responses']
+        items = dedupe_items(raw, field, name)
+        print(f'  {name}: {len(items)} 題（去重前 {len(raw)}）')
+        return items
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class Generator:
+    def __init__(self, client: AsyncAnthropic, concurrency: int, batch_size: int):
+        self.client = client
+        self.gate = RateGate(concurrency)
+        self.batch_size = batch_size
+
+    async def _complete(self, label: str, params: dict) -> list[dict]:
+        """呼叫 API 並解析；可重試的錯誤以指數退避（含 jitter）重試"""
+        for attempt in range(MAX_RETRIES):
+            try:
+                async with self.gate:
+                    response = await self.client.messages.create(**params)
+                items = parse_items(response.content[0].text)
+                if items is not None:
+                    return items
+                print(f'  {label}: JSON 解析失敗，重試')
+            except anthropic.RateLimitError as e:
+                wait = _retry_after(e) or 2 ** attempt
+                self.gate.pause(wait)
+                print(f'  {label}: 429，全部暫停 {wait:.0f}s')
+                continue
+            except (anthropic.APIConnectionError, anthropic.InternalServerError) as e:
+                print(f'  {label}: {type(e).__name__}，重試')
+            except anthropic.APIStatusError as e:
+                if e.status_code < 500 and e.status_code != 408:
+                    raise
+                print(f'  {label}: HTTP {e.status_code}，重試')
+            await asyncio.sleep(2 ** attempt + random.random())
+        raise RuntimeError(f'{label}: 重試 {MAX_RETRIES} 次仍失敗')
+
+    async def generate(self, kind: str, name: str, count: int, desc: str) -> list[dict]:
+        """生成一個題型 / 場景：切批並行，完成的批次寫 checkpoint"""
+        checkpoint = Checkpoint(f'{kind}_{name}')
+        batches = range(batch_count(count, self.batch_size))
+        pending = [b for b in batches if str(b) not in checkpoint.batches]
+        if len(pending) < len(batches):
+            print(f'  {name}: 從 checkpoint 續跑（剩 {len(pending)}/{len(batches)} 批）')
+
+        async def run_batch(b: int):
+            params = batch_request(kind, name, desc, count, self.batch_size, b)
+            items = await self._complete(f'{name}#{b}', params)
+            checkpoint.save(b, items)
+
+        results = await asyncio.gather(*(run_batch(b) for b in pending), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception)]
+        for e in failed:
+            print(f'  {e}')
+        if failed:
+            # 已完成的批次留在 checkpoint，下次重跑只補失敗的
+            raise RuntimeError(f'{name}: {len(failed)} 批失敗，重跑即可續傳')
+
+        return checkpoint.merged(kind, name)
+
+
+def output_file(kind: str, name: str) -> Path:
+    subdir = 'drills' if kind == 'drills' else 'fallback_responses'
+    return DATA_DIR / subdir / f'{name}.json'
+
+
+def write_output(kind: str, name: str, items: list[dict]):
+    """寫出題型 / 場景的 JSON，並清掉對應的 checkpoint"""
+    out_file = output_file(kind, name)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    out_file.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding='utf-8')
+    Checkpoint(f'{kind}_{name}').clear()
+
+
+def select_targets(kind: str, targets: list[tuple[str, int, str]], force: bool) -> tuple[list, int]:
+    """挑出需要生成的檔案；回傳 (待生成清單, 已存在的題數)"""
+    existing_total = 0
+    jobs = []
+    for name, count, desc in targets:
+        out_file = output_file(kind, name)
+        if out_file.exists() and not force:
             existing = json.loads(out_file.read_text(encoding='utf-8'))
             c = len(existing) if isinstance(existing, list) else 0
-            print(f'  {scenario}: 已存在 ({c} 組)，跳過')
-            total += c
+            print(f'  {name}: 已存在 ({c})，跳過（--force 重新生成）')
+            existing_total += c
             continue
+        jobs.append((name, count, desc))
+    return jobs, existing_total
+
 
-        print(f'  生成 {desc} ({scenario})...')
-        responses = generate_fallback_responses(scenario, count, desc)
-        if responses:
-            out_file.write_text(
-                json.dumps(responses, ensure_ascii=False, indent=2),
-                encoding='utf-8',
-            )
-            total += len(responses)
+async def run_kind(gen: Generator, kind: str, targets: list[tuple[str, int, str]], force: bool) -> int:
+    """生成一類（drills / responses）的所有檔案，各檔案之間也並行"""
+    jobs, total = select_targets(kind, targets, force)
 
-        time.sleep(1)
+    async def job(name: str, count: int, desc: str) -> int:
+        items = await gen.generate(kind, name, count, desc)
+        write_output(kind, name, items)
+        return len(items)
 
-    print(f'預建回應完成: {total} 組')
+    results = await asyncio.gather(*(job(*j) for j in jobs), return_exceptions=True)
+    for r in results:
+        if isinstance(r, Exception):
+            print(f'  {r}')
+        else:
+            total += r
     return total
 
 
+class BatchRun:
+    """--batch 模式：所有待生成的批次包成一個 Message Batch"""
+
+    def __init__(self, client: AsyncAnthropic, batch_size: int):
+        self.client = client
+        self.batch_size = batch_size
+        # (kind, name) -> (總批數, checkpoint)
+        self.targets: dict[tuple[str, str], tuple[int, Checkpoint]] = {}
+        # custom_id -> (kind, name, 批次編號)
+        self.custom_ids: dict[str, tuple[str, str, int]] = {}
+
+    def add(self, kind: str, name: str, count: int, desc: str) -> list[tuple[str, dict]]:
+        """登記一個題型 / 場景，回傳尚未完成的批次 (custom_id, params)"""
+        checkpoint = Checkpoint(f'{kind}_{name}')
+        total = batch_count(count, self.batch_size)
+        self.targets[(kind, name)] = (total, checkpoint)
+        return [
+            (f'{kind}-{name}-{b}', batch_request(kind, name, desc, count, self.batch_size, b))
+            for b in range(total) if str(b) not in checkpoint.batches
+        ]
+
+    async def submit(self, requests: list[tuple[str, dict]]) -> str:
+        """送出 batch；若上次已送出且還在處理就沿用（重跑不會重複計費）"""
+        if BATCH_STATE_FILE.exists():
+            state = json.loads(BATCH_STATE_FILE.read_text(encoding='utf-8'))
+            print(f'  沿用先前送出的 batch {state["id"]}')
+            self.custom_ids = {cid: tuple(v) for cid, v in state['requests'].items()}
+            return state['id']
+
+        for cid, _ in requests:
+            kind, rest = cid.split('-', 1)
+            name, b = rest.rsplit('-', 1)
+            self.custom_ids[cid] = (kind, name, int(b))
+        batch = await self.client.messages.batches.create(
+            requests=[{'custom_id': cid, 'params': params} for cid, params in requests],
+        )
+        BATCH_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        BATCH_STATE_FILE.write_text(
+            json.dumps({'id': batch.id, 'requests': self.custom_ids}), encoding='utf-8',
+        )
+        print(f'  已送出 batch {batch.id}（{len(requests)} 個請求）')
+        return batch.id
+
+    async def wait(self, batch_id: str):
+        """輪詢直到 batch 結束，間隔逐步拉長"""
+        delay = POLL_INITIAL_SECONDS
+        while True:
+            batch = await self.client.messages.batches.retrieve(batch_id)
+            if batch.processing_status == 'ended':
+                counts = batch.request_counts
+                print(f'  batch 結束：成功 {counts.succeeded}、失敗 {counts.errored}、'
+                      f'過期 {counts.expired}、取消 {counts.canceled}')
+                return
+            counts = batch.request_counts
+            print(f'  處理中（剩 {counts.processing}），{delay:.0f}s 後再查')
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, POLL_MAX_SECONDS)
+
+    async def collect(self, batch_id: str) -> dict[str, int]:
+        """串流讀取結果檔，每讀一筆就寫 checkpoint；某個檔案的批次到齊就直接寫出"""
+        failed = 0
+        written: dict[str, int] = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            target = self.custom_ids.get(entry.custom_id)
+            if target is None or target[:2] not in self.targets:
+                continue
+            kind, name, b = target
+            items = None
+            if entry.result.type == 'succeeded':
+                items = parse_items(entry.result.message.content[0].text)
+            if items is None:
+                failed += 1
+                print(f'  {name}#{b}: {entry.result.type}，留待重跑')
+                continue
+
+            total, checkpoint = self.targets[(kind, name)]
+            checkpoint.save(b, items)
+            if len(checkpoint.batches) == total:
+                merged = checkpoint.merged(kind, name)
+                write_output(kind, name, merged)
+                written[kind] = written.get(kind, 0) + len(merged)
+
+        BATCH_STATE_FILE.unlink(missing_ok=True)
+        if failed:
+            print(f'  {failed} 個請求失敗，重跑 --batch 只會補送這些批次')
+        return written
+
+
+async def run_batch_mode(args) -> dict:
+    client = AsyncAnthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'), max_retries=5)
+    run = BatchRun(client, args.batch_size)
+    kinds = [k for k in ('drills', 'responses') if args.mode in (k, 'all')]
+    stats = {}
+    requests = []
+    try:
+        for kind in kinds:
+            jobs, stats[kind] = select_targets(kind, DRILL_TYPES if kind == 'drills' else SCENARIOS, args.force)
+            for name, count, desc in jobs:
+                pending = run.add(kind, name, count, desc)
+                if not pending:
+                    # 上次 batch 已全部寫進 checkpoint，只差合併
+                    items = run.targets[(kind, name)][1].merged(kind, name)
+                    write_output(kind, name, items)
+                    stats[kind] += len(items)
+                requests.extend(pending)
+
+        if requests or BATCH_STATE_FILE.exists():
+            batch_id = await run.submit(requests)
+            await run.wait(batch_id)
+            for kind, count in (await run.collect(batch_id)).items():
+                stats[kind] = stats.get(kind, 0) + count
+    finally:
+        await client.close()
+    return stats
+
+
 def save_metadata(stats: dict):
-    """儲存統計資訊"""
+    """儲存統計資訊（保留其他欄位：files 是 /api/drills 題型描述的來源，不能被覆蓋掉）"""
     from datetime import datetime
-    metadata = {
-        'generated_at': datetime.now().isoformat(),
-        'model': 'claude-sonnet-4-20250514',
-        'stats': stats,
-    }
     meta_file = DATA_DIR / 'metadata.json'
+    metadata = {}
+    if meta_file.exists():
+        try:
+            metadata = json.loads(meta_file.read_text(encoding='utf-8'))
+        except json.JSONDecodeError as e:
+            print(f'警告：{meta_file} 無法解析（{e}），只寫入這次的統計')
+    metadata['generated_at'] = datetime.now().isoformat()
+    metadata['model'] = MODEL
+    metadata.setdefault('stats', {}).update(stats)
     meta_file.write_text(
         json.dumps(metadata, ensure_ascii=False, indent=2),
         encoding='utf-8',
@@ -257,6 +528,26 @@ def save_metadata(stats: dict):
     print(f'metadata 已寫入: {meta_file}')
 
 
+async def run(args) -> dict:
+    # SDK 內建重試關掉，統一由 Generator 處理（才能共用 429 暫停）
+    client = AsyncAnthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'), max_retries=0)
+    gen = Generator(client, args.concurrency, args.batch_size)
+    stats = {}
+    try:
+        if args.mode in ('drills', 'all'):
+            print('[練習題] 生成練習題...')
+            stats['drills'] = await run_kind(gen, 'drills', DRILL_TYPES, args.force)
+            print(f'練習題完成: {stats["drills"]} 題\n')
+
+        if args.mode in ('responses', 'all'):
+            print('[預建回應] 生成預建回應...')
+            stats['responses'] = await run_kind(gen, 'responses', SCENARIOS, args.force)
+            print(f'預建回應完成: {stats["responses"]} 組\n')
+    finally:
+        await client.close()
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(description='AI English Tutor 題庫生成器')
     parser.add_argument(
@@ -265,6 +556,10 @@ def main():
         default='all',
         help='生成模式 (預設: all)',
     )
+    parser.add_argument('--concurrency', type=int, default=4, help='同時進行的 API 請求數 (預設: 4)')
+    parser.add_argument('--batch-size', type=int, default=10, help='每次請求生成的題數 (預設: 10)')
+    parser.add_argument('--force', action='store_true', help='已存在的檔案也重新生成')
+    parser.add_argument('--batch', action='store_true', help='改用 Message Batches API（非即時，成本較低）')
     args = parser.parse_args()
 
     if not os.environ.get('ANTHROPIC_API_KEY'):
@@ -272,20 +567,9 @@ def main():
         sys.exit(1)
 
     DATA_DIR.mkdir(parents=True, exist_ok=True)
-    stats = {}
 
     print('=== AI English Tutor 題庫生成器 ===\n')
-
-    if args.mode in ('drills', 'all'):
-        print('[練習題] 生成練習題...')
-        stats['drills'] = run_drills()
-        print()
-
-    if args.mode in ('responses', 'all'):
-        print('[預建回應] 生成預建回應...')
-        stats['responses'] = run_responses()
-        print()
-
+    stats = asyncio.run(run_batch_mode(args) if args.batch else run(args))
     save_metadata(stats)
     print('\n完成!')
 
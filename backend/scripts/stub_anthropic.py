@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""本機 stub Anthropic Messages API（benchmark / 生成器測試用）
+
+- 可設定延遲、錯誤率（500）與 429 比例；延遲可隨 prompt 長度增加（模擬 prefill）
+- --slow-rate 比例的請求額外延遲 --slow-latency 秒（模擬尾端延遲，測 hedge 用）
+- 題庫生成器的 prompt（system 要求輸出 JSON）會回傳對應題數的合成題目
+- 其他請求回固定文字（或 --reply-file 的內容，量測較長回覆用）
+- 支援串流（stream=true 回 SSE）與 prompt caching 的 usage 模擬
+  （cache_control 標記的前綴第一次出現算 cache write，之後算 cache read）
+- 支援 Message Batches（建立 / 查詢 / 串流結果），batch 在 --batch-latency 秒後結束
+
+用法：
+  python scripts/stub_anthropic.py --port 9000 --latency 0.5 --error-rate 0.05
+  ANTHROPIC_BASE_URL=http://127.0.0.1:9000 ANTHROPIC_API_KEY=stub python scripts/generate_question_bank.py
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_REPLY = 'This is a stub reply.'
+
+# 已寫入快取的 prompt 前綴（內容 hash）
+_cached_prefixes: set[int] = set()
+
+
+def _fake_items(prompt: str) -> list[dict]:
+    """依生成器 prompt 中的題數與 id 範圍產生合成題目"""
+    count = int(re.search(r'Generate (?:exactly )?(\d+)', prompt).group(1))
+    start_match = re.search(r'"id": "([\w-]+?)_(\d{3})"', prompt)
+    ids = re.search(r'IDs should be ([\w-]+?)_(\d+) through', prompt)
+    prefix, start = (ids.group(1), int(ids.group(2))) if ids else (start_match.group(1), int(start_match.group(2)))
+    items = []
+    for i in range(start, start + count):
+        text = f'{prefix} synthetic item {i} {random.randrange(10**9)}'
+        items.append({
+            'id': f'{prefix}_{i:03d}',
+            'sentence': text, 'prompt': text, 'situation': text, 'word': text,
+            'keywords': [f'keyword {i}'], 'user_example': text,
+            'options': ['a', 'b', 'c', 'd'], 'answer': 'a',
+            'response': f'Response for {text}',
+        })
+    return items
+
+
+def _blocks(content) -> list[dict]:
+    if isinstance(content, str):
+        return [{'type': 'text', 'text': content}]
+    return content
+
+
+def _usage(body: dict, output_text: str) -> dict:
+    """依 cache_control breakpoint 模擬 cache 讀寫 token 數（約 4 字元 = 1 token）"""
+    blocks = _blocks(body.get('system') or '')
+    for message in body.get('messages', []):
+        blocks = blocks + _blocks(message['content'])
+
+    total = 0
+    prefix = 0
+    breakpoints = []
+    for block in blocks:
+        text = block.get('text', '')
+        total += len(text) // 4
+        prefix = hash((prefix, text))
+        if block.get('cache_control'):
+            breakpoints.append((prefix, total))
+
+    read = max((tokens for key, tokens in breakpoints if key in _cached_prefixes), default=0)
+    write = 0
+    if breakpoints and breakpoints[-1][0] not in _cached_prefixes:
+        write = breakpoints[-1][1] - read
+    _cached_prefixes.update(key for key, _ in breakpoints)
+    return {
+        'input_tokens': total - read - write,
+        'cache_read_input_tokens': read,
+        'cache_creation_input_tokens': write,
+        'output_tokens': len(output_text) // 4,
+    }
+
+
+def message_body(body: dict, reply_text: str = STUB_REPLY) -> dict:
+    """依請求內容組出 Messages API 回應"""
+    system = body.get('system') or ''
+    if isinstance(system, list):
+        system = ' '.join(block.get('text', '') for block in system)
+    prompt = body['messages'][-1]['content'] if body.get('messages') else ''
+    if isinstance(prompt, list):
+        prompt = ' '.join(block.get('text', '') for block in prompt)
+
+    if 'Output only valid JSON' in system:
+        text = json.dumps(_fake_items(prompt))
+    else:
+        text = reply_text
+    return {
+        'id': f'msg_stub_{random.randrange(10**9)}',
+        'type': 'message',
+        'role': 'assistant',
+        'model': body.get('model', 'stub'),
+        'content': [{'type': 'text', 'text': text}],
+        'stop_reason': 'end_turn',
+        'stop_sequence': None,
+        'usage': _usage(body, text),
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def stream_events(message: dict, chunk_size: int = 16):
+    """把完整 message 拆成 Messages API 的串流事件"""
+    text = message['content'][0]['text']
+    usage = message['usage']
+    yield _sse('message_start', {'type': 'message_start', 'message': {
+        **message, 'content': [], 'stop_reason': None,
+        'usage': {**usage, 'output_tokens': 1},
+    }})
+    yield _sse('content_block_start', {
+        'type': 'content_block_start', 'index': 0, 'content_block': {'type': 'text', 'text': ''},
+    })
+    for i in range(0, len(text), chunk_size):
+        yield _sse('content_block_delta', {
+            'type': 'content_block_delta', 'index': 0,
+            'delta': {'type': 'text_delta', 'text': text[i:i + chunk_size]},
+        })
+        await asyncio.sleep(0)
+    yield _sse('content_block_stop', {'type': 'content_block_stop', 'index': 0})
+    yield _sse('message_delta', {
+        'type': 'message_delta',
+        'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+        'usage': {'output_tokens': usage['output_tokens']},
+    })
+    yield _sse('message_stop', {'type': 'message_stop'})
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+def create_app(
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    batch_latency: float = 3.0,
+    latency_per_1k_tokens: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_latency: float = 0.0,
+    reply_text: str = STUB_REPLY,
+) -> FastAPI:
+    app = FastAPI()
+    # batch id -> {'created': 建立時間, 'requests': 原始請求}
+    batches: dict[str, dict] = {}
+
+    def batch_body(batch_id: str, request: Request) -> dict:
+        batch = batches[batch_id]
+        ended = time.time() - batch['created'] >= batch_latency
+        total = len(batch['requests'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': {
+                'processing': 0 if ended else total,
+                'succeeded': total if ended else 0,
+                'errored': 0, 'canceled': 0, 'expired': 0,
+            },
+            'created_at': _iso(batch['created']),
+            'expires_at': _iso(batch['created'] + 86400),
+            'ended_at': _iso(time.time()) if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': None,
+            'results_url': str(request.url_for('batch_results', batch_id=batch_id)) if ended else None,
+        }
+
+    @app.post('/v1/messages')
+    async def messages(body: dict):
+        message = message_body(body, reply_text)
+        usage = message['usage']
+        prompt_tokens = (usage['input_tokens'] + usage['cache_read_input_tokens']
+                         + usage['cache_creation_input_tokens'])
+        delay = latency + latency_per_1k_tokens * prompt_tokens / 1000
+        if random.random() < slow_rate:
+            delay += slow_latency
+        await asyncio.sleep(delay)
+        roll = random.random()
+        if roll < rate_limit_rate:
+            return JSONResponse(
+                {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'stub 429'}},
+                status_code=429, headers={'retry-after': '1'},
+            )
+        if roll < rate_limit_rate + error_rate:
+            return JSONResponse(
+                {'type': 'error', 'error': {'type': 'api_error', 'message': 'stub 500'}},
+                status_code=500,
+            )
+        if body.get('stream'):
+            return StreamingResponse(stream_events(message), media_type='text/event-stream')
+        return message
+
+    @app.post('/v1/messages/batches')
+    async def create_batch(body: dict, request: Request):
+        batch_id = f'msgbatch_stub_{random.randrange(10**9)}'
+        batches[batch_id] = {'created': time.time(), 'requests': body['requests']}
+        return batch_body(batch_id, request)
+
+    @app.get('/v1/messages/batches/{batch_id}')
+    async def retrieve_batch(batch_id: str, request: Request):
+        if batch_id not in batches:
+            raise HTTPException(404)
+        return batch_body(batch_id, request)
+
+    @app.get('/v1/messages/batches/{batch_id}/results', name='batch_results')
+    async def batch_results(batch_id: str):
+        if batch_id not in batches:
+            raise HTTPException(404)
+
+        def lines():
+            # 結果順序不保證與請求相同
+            requests = list(batches[batch_id]['requests'])
+            random.shuffle(requests)
+            for req in requests:
+                if random.random() < error_rate:
+                    result = {'type': 'errored', 'error': {
+                        'type': 'error', 'error': {'type': 'api_error', 'message': 'stub error'},
+                    }}
+                else:
+                    result = {'type': 'succeeded', 'message': message_body(req['params'], reply_text)}
+                yield json.dumps({'custom_id': req['custom_id'], 'result': result}) + '\n'
+
+        return StreamingResponse(lines(), media_type='application/binary')
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='本機 stub Anthropic API')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0, help='每個請求的延遲秒數')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='回 500 的比例')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='回 429 的比例')
+    parser.add_argument('--latency-per-1k-tokens', type=float, default=0.0, help='每 1k prompt token 額外延遲秒數')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='額外變慢的請求比例')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='變慢請求的額外延遲秒數')
+    parser.add_argument('--batch-latency', type=float, default=3.0, help='Message Batch 完成所需秒數')
+    parser.add_argument('--reply-file', type=Path, help='聊天回覆改用這個檔案的內容')
+    args = parser.parse_args()
+    reply_text = args.reply_file.read_text(encoding='utf-8') if args.reply_file else STUB_REPLY
+
+    uvicorn.run(
+        create_app(args.latency, args.error_rate, args.rate_limit_rate, args.batch_latency,
+                   args.latency_per_1k_tokens, args.slow_rate, args.slow_latency, reply_text),
+        host='127.0.0.1', port=args.port, log_level='warning',
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""多 worker 啟動器（prefork）
+
+uvicorn --workers 以 spawn 建 worker，每個 worker 各自 import、各自解析整份題庫，
+breaker 狀態也各自一份。這裡改為：
+- 主 process 先 import app、載入題庫（含 keyword 自動機與語意索引），
+  gc.freeze() 後再 fork；worker 以 copy-on-write 共用這些頁面，不必各自重建
+- 所有 worker 共用同一個 listen socket
+- breaker 狀態放在共用檔案（BREAKER_STATE_FILE，未設定時用 data/breaker.state，每次啟動重設）
+- worker 意外結束時自動補一個；收到 SIGINT / SIGTERM 時通知所有 worker 優雅結束
+
+其他狀態仍是每個 worker 各自一份：admission 上限（MAX_CONCURRENT_UPSTREAM 為單一 worker 的上限）、
+回覆快取、出題輪替；伺服器端對話請設 CONVERSATION_STORE=sqlite 讓 worker 共用。
+題庫熱更新（QUESTION_BANK_WATCH_SECONDS）在 worker 內重建，會失去共用。
+
+用法：
+  python serve.py --workers 4 --port 8004
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+DEFAULT_STATE_FILE = 'data/breaker.state'
+
+logger = logging.getLogger('serve')
+
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    # 主 process 的 signal handler 不能留給 worker，交給 uvicorn 重新安裝
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # fork 前凍結的物件留在 permanent generation，之後新建的物件照常回收
+    gc.enable()
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多 worker 啟動器')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8004)
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(name)s %(message)s')
+
+    # 必須在 import main（讀取設定）之前決定共用檔案；舊狀態不沿用
+    state_file = os.environ.setdefault('BREAKER_STATE_FILE', DEFAULT_STATE_FILE)
+    (BACKEND_DIR / state_file).unlink(missing_ok=True)
+
+    # 依 gc.freeze 文件的建議：preload 期間關掉 GC，fork 前凍結，worker 內再打開；
+    # 避免 GC 在 preload 期間釋放物件留下空洞，fork 後再配置時寫到共用頁面
+    gc.disable()
+    start = time.perf_counter()
+    sys.path.insert(0, str(BACKEND_DIR))
+    import main as backend
+
+    if backend.settings.conversation_store == 'memory' and args.workers > 1:
+        logger.warning('CONVERSATION_STORE=memory：各 worker 的對話紀錄不共用，換 worker 時前端會重送完整歷史')
+
+    backend.load_question_bank()
+    # 凍結後 worker 的 GC 不再掃描（也不寫入）這些物件的 header，頁面維持共用
+    gc.freeze()
+    logger.info('preload 完成 (%.0f ms)，凍結 %d 個物件', (time.perf_counter() - start) * 1000,
+                gc.get_freeze_count())
+
+    sock = _bind(args.host, args.port, args.backlog)
+    children: set[int] = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(backend.app, sock, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(args.workers):
+        spawn()
+    logger.info('%d 個 worker 在 http://%s:%d', args.workers, args.host, args.port)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning('worker %d 結束 (status %d)，重新啟動', pid, status)
+            time.sleep(1)  # 啟動就失敗時不要空轉
+            spawn()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""上游 admission control（AIMD 自適應並發上限）
+
+上游變慢時，固定大小的 semaphore 仍會讓請求排隊等到 timeout 再 fallback，
+尾端延遲跟著上游一起爆掉。這裡改為依即時觀測調整同時進行的 Claude 呼叫數：
+- 每次呼叫完成回報延遲與成否。短期延遲（約 2 秒的時間加權 EWMA）超過長期基準
+  （約 60 秒）的 tolerance 倍，或發生 429 / 5xx / 連線錯誤，視為壅塞 → 上限乘以 0.75
+  （每個來回最多降一次：降完之後一個延遲時間內回來的樣本反映的還是舊上限）
+- EWMA 依樣本間隔加權而非依樣本數，流量大小不影響反應速度；
+  Claude 的延遲本來就隨輸出長度變動，用平均而不是單一樣本判斷
+- 沒有壅塞且上限有被用到 → 上限加 1/limit（約每輪加 1）
+- 超過上限的請求最多等 admission_wait 秒，等不到就直接走題庫 fallback
+- 排隊中的請求依 priority 由小到大取得名額（未指定時依到達順序）；
+  per-key 公平排程（services/key_scheduler.py）以 WFQ 的 finish tag 當 priority
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+
+import anthropic
+
+_DECREASE_FACTOR = 0.75
+_SHORT_TAU = 2.0
+_LONG_TAU = 60.0
+_WINDOW_SIZE = 200
+
+
+class AdmissionRejected(Exception):
+    """超過並發上限且等待逾時，改走 fallback（不算上游失敗）"""
+
+
+def is_congestion_error(e: BaseException) -> bool:
+    """會讓上限下降的錯誤：429、5xx、逾時與連線錯誤（401 等用戶端錯誤不算）"""
+    if isinstance(e, (anthropic.APIConnectionError, anthropic.RateLimitError, asyncio.TimeoutError)):
+        return True
+    return isinstance(e, anthropic.APIStatusError) and e.status_code >= 500
+
+
+class Permit:
+    """一個已取得的上游名額；observe() 回報延遲樣本，release() 歸還名額"""
+
+    __slots__ = ('_limiter', '_start', '_observed', '_released')
+
+    def __init__(self, limiter: 'AdaptiveLimiter'):
+        self._limiter = limiter
+        self._start = time.monotonic()
+        self._observed = False
+        self._released = False
+
+    def observe(self, ok: bool = True):
+        """回報一次樣本（只記第一次；串流在收到第一個 token 時回報）"""
+        if not self._observed:
+            self._observed = True
+            self._limiter._on_sample(time.monotonic() - self._start, ok)
+
+    def release(self, error: BaseException | None = None):
+        if self._released:
+            return
+        if isinstance(error, asyncio.CancelledError):
+            # 被取消（hedge 的輸家、client 斷線）：經過的時間不代表上游延遲，不記樣本
+            self._observed = True
+        elif error is not None:
+            self.observe(not is_congestion_error(error))
+        else:
+            self.observe(True)
+        self._released = True
+        self._limiter._on_release()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release(exc)
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int = 16, min_limit: int = 2, max_limit: int = 64,
+                 tolerance: float = 1.5):
+        self._limit = float(initial)
+        self._min = min_limit
+        self._max = max_limit
+        self._tolerance = tolerance
+        self._inflight = 0
+        # (priority, 到達序號, future) 的 heap
+        self._waiters: list[tuple[float, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._short = 0.0
+        self._baseline = 0.0
+        self._last_sample = 0.0
+        self._hold_until = 0.0
+        # (延遲, 是否成功)
+        self._window: deque[tuple[float, bool]] = deque(maxlen=_WINDOW_SIZE)
+        self._admitted = 0
+        self._queued = 0
+        self._rejected = 0
+        self._decreases = 0
+
+    def configure(self, initial: int, min_limit: int, max_limit: int, tolerance: float):
+        self._min = min_limit
+        self._max = max_limit
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._tolerance = tolerance
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    async def acquire(self, wait: float, priority: float = 0.0) -> Permit:
+        """取得名額；超過上限時最多等 wait 秒，逾時丟 AdmissionRejected
+
+        排隊時 priority 小的先拿到名額，相同時依到達順序。
+        """
+        if self._inflight < self.limit and not self._waiters:
+            self._inflight += 1
+            self._admitted += 1
+            return Permit(self)
+
+        if wait <= 0:
+            self._rejected += 1
+            raise AdmissionRejected()
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._arrivals), future)
+        heapq.heappush(self._waiters, entry)
+        self._queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), wait)
+        except asyncio.TimeoutError:
+            # 逾時的同時剛好被交接到名額，就照常使用
+            if not future.done():
+                future.cancel()
+                self._remove_waiter(entry)
+                self._rejected += 1
+                raise AdmissionRejected() from None
+        except asyncio.CancelledError:
+            if future.done():
+                self._on_release()
+            else:
+                future.cancel()
+                self._remove_waiter(entry)
+            raise
+        self._admitted += 1
+        return Permit(self)
+
+    def _remove_waiter(self, entry: tuple[float, int, asyncio.Future]):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+
+    def _on_release(self):
+        self._inflight -= 1
+        self._wake()
+
+    def _wake(self):
+        """名額交給排隊中的請求（交接時 inflight 不減，避免被插隊）"""
+        while self._waiters and self._inflight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._inflight += 1
+                future.set_result(True)
+
+    def _on_sample(self, latency: float, ok: bool):
+        self._window.append((latency, ok))
+        now = time.monotonic()
+        if ok:
+            if self._baseline == 0:
+                self._short = self._baseline = latency
+            else:
+                dt = now - self._last_sample
+                self._short += (1 - math.exp(-dt / _SHORT_TAU)) * (latency - self._short)
+                self._baseline += (1 - math.exp(-dt / _LONG_TAU)) * (latency - self._baseline)
+            self._last_sample = now
+        # 短期平均與這個樣本都偏慢才算壅塞：上游恢復後立刻停止往下調
+        threshold = self._baseline * self._tolerance
+        congested = not ok or (self._short > threshold and latency > threshold)
+
+        if congested:
+            if now >= self._hold_until:
+                self._hold_until = now + latency
+                self._limit = max(self._min, self._limit * _DECREASE_FACTOR)
+                self._decreases += 1
+        elif self._inflight * 2 >= self._limit:
+            self._limit = min(self._max, self._limit + 1 / self._limit)
+            self._wake()
+
+    def get_status(self) -> dict:
+        latencies = sorted(lat for lat, _ in self._window)
+        errors = sum(1 for _, ok in self._window if not ok)
+
+        def pct(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        return {
+            'limit': self.limit,
+            'min_limit': self._min,
+            'max_limit': self._max,
+            'inflight': self._inflight,
+            'waiting': len(self._waiters),
+            'short_ms': round(self._short * 1000, 1),
+            'baseline_ms': round(self._baseline * 1000, 1),
+            'window_p50_ms': pct(0.5) if latencies else 0.0,
+            'window_p95_ms': pct(0.95) if latencies else 0.0,
+            'window_error_rate': round(errors / len(self._window), 3) if self._window else 0.0,
+            'admitted': self._admitted,
+            'queued': self._queued,
+            'rejected': self._rejected,
+            'decreases': self._decreases,
+        }
+
+
+# 全域單例
+upstream_limiter = AdaptiveLimiter()
@@ -1,60 +1,348 @@
-"""API 可用性偵測服務
+"""API 可用性偵測服務（circuit breaker）
 
-lazy check + 60 秒冷卻機制。
-不做啟動時 health check（省 token）。
+closed → open → half-open 三態：
+- closed：正常呼叫；以滾動時間窗統計錯誤率，請求數夠多且錯誤率超過門檻才跳開
+  （單一次暫時性錯誤不會讓整個服務改走 fallback）
+- open：一律走 fallback，冷卻時間以指數成長（含 jitter），連續跳開越多次等越久
+- half-open：冷卻結束後只放行 N 個 probe 請求，全部成功才回到 closed，
+  任一失敗就再次 open；不會在冷卻結束的瞬間讓所有請求一起衝向上游
+不做啟動時 health check（省 token）。所有狀態以 lock 保護，可從多個 thread 存取。
+
+多 worker：設定 state_file 後，breaker 狀態（狀態、冷卻、probe、時間窗、計數）
+放在 mmap 的小檔案裡，以 flock 保護，同一台機器上的所有 worker 共用；
+一個 worker 偵測到上游掛掉，其他 worker 下一個請求就會直接走 fallback。
+狀態轉換紀錄只保留在觸發的 worker 內。
 """
 
+import mmap
+import os
+import random
+import struct
+import threading
 import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows：沒有 flock，只能用單一 process 模式
+    fcntl = None
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+_STATES = (CLOSED, OPEN, HALF_OPEN)
+
+# 保留的狀態轉換紀錄筆數
+_TRANSITION_LOG = 20
+_COUNTER_NAMES = ('successes', 'failures', 'short_circuited', 'trips', 'probes', 'probe_timeouts')
+
+
+class _BreakerState:
+    """breaker 的可變狀態（單一 process 時直接放在記憶體，多 worker 時與共用檔案同步）"""
+
+    __slots__ = ('state', 'open_until', 'cooldown', 'consecutive_trips',
+                 'probes', 'probe_successes', 'buckets', 'counters')
+
+    def __init__(self):
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.cooldown = 0.0
+        self.consecutive_trips = 0
+        # half-open：進行中 probe 的開始時間、已成功的 probe 數
+        self.probes: list[float] = []
+        self.probe_successes = 0
+        # 滾動時間窗：每個 bucket 為 [開始時間, 成功數, 失敗數]
+        self.buckets: deque[list] = deque()
+        self.counters = dict.fromkeys(_COUNTER_NAMES, 0)
+
+
+class _SharedStateFile:
+    """mmap 的 breaker 狀態檔（固定長度的 struct，改之前先拿 flock）
+
+    時間欄位是 time.monotonic()（Linux 上全機共用同一個時鐘）；檔案另外記下
+    wall clock 與 monotonic 的差，重開機後差值不同，舊狀態視為無效。
+    """
+
+    _MAGIC = 0x42524B31  # 'BRK1'
+    _MAX_PROBES = 16
+    _MAX_BUCKETS = 12
+    # magic, state, consecutive_trips, probe_successes, probe 數, bucket 數,
+    # clock offset, open_until, cooldown, probes, buckets (開始, 成功, 失敗), 計數
+    _FORMAT = (
+        f'<6i3d{_MAX_PROBES}d'
+        + 'dqq' * _MAX_BUCKETS
+        + f'{len(_COUNTER_NAMES)}q'
+    )
+    _SIZE = struct.calcsize(_FORMAT)
+
+    def __init__(self, path: Path):
+        if fcntl is None:
+            raise RuntimeError('共用 breaker 狀態需要 fcntl（不支援 Windows）')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._path = path
+        self._open()
+
+    def _open(self):
+        # flock 鎖在 open file description 上：fork 前開的 fd 所有 worker 共用同一個，
+        # 互相鎖不住，所以每個 process 要自己開一次
+        self._pid = os.getpid()
+        self._fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < self._SIZE:
+            os.ftruncate(self._fd, self._SIZE)
+        self._mm = mmap.mmap(self._fd, self._SIZE)
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def locked(self):
+        if self._pid != os.getpid():
+            # fork 出來的 worker：繼承的 fd / mmap 是父 process 的，換成自己的
+            self.close()
+            self._open()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _clock_offset() -> float:
+        return time.time() - time.monotonic()
+
+    def load(self) -> _BreakerState:
+        """讀出狀態；檔案是新的或來自上一次開機時回傳初始狀態"""
+        values = struct.unpack_from(self._FORMAT, self._mm)
+        state = _BreakerState()
+        magic, state_idx, trips, probe_successes, n_probes, n_buckets = values[:6]
+        offset, open_until, cooldown = values[6:9]
+        if magic != self._MAGIC or abs(offset - self._clock_offset()) > 1.0:
+            return state
+        state.state = _STATES[state_idx]
+        state.consecutive_trips = trips
+        state.probe_successes = probe_successes
+        state.open_until = open_until
+        state.cooldown = cooldown
+        pos = 9
+        state.probes = list(values[pos:pos + n_probes])
+        pos += self._MAX_PROBES
+        for i in range(n_buckets):
+            state.buckets.append(list(values[pos + i * 3:pos + i * 3 + 3]))
+        pos += self._MAX_BUCKETS * 3
+        state.counters = dict(zip(_COUNTER_NAMES, values[pos:]))
+        return state
+
+    def store(self, state: _BreakerState):
+        probes = state.probes[-self._MAX_PROBES:]
+        buckets = list(state.buckets)[-self._MAX_BUCKETS:]
+        flat_buckets = [v for bucket in buckets for v in bucket]
+        struct.pack_into(
+            self._FORMAT, self._mm, 0,
+            self._MAGIC, _STATES.index(state.state), state.consecutive_trips,
+            state.probe_successes, len(probes), len(buckets),
+            self._clock_offset(), state.open_until, state.cooldown,
+            *probes, *[0.0] * (self._MAX_PROBES - len(probes)),
+            *flat_buckets, *[0] * ((self._MAX_BUCKETS - len(buckets)) * 3),
+            *(state.counters[name] for name in _COUNTER_NAMES),
+        )
 
 
 class APIHealthChecker:
     """追蹤 Claude API 可用性狀態"""
 
-    def __init__(self, cooldown_seconds: int = 60):
-        self._cooldown = cooldown_seconds
-        self._last_failure_time: float = 0
-        self._is_available: bool = True
-        self._has_api_key: bool = False
+    def __init__(
+        self,
+        error_threshold: float = 0.5,
+        min_requests: int = 5,
+        window_seconds: float = 30,
+        cooldown_seconds: float = 15,
+        max_cooldown_seconds: float = 300,
+        half_open_probes: int = 2,
+        probe_timeout_seconds: float = 60,
+    ):
+        self._lock = threading.Lock()
+        self._has_api_key = False
+        self._shared: _SharedStateFile | None = None
+        self.configure(
+            error_threshold, min_requests, window_seconds, cooldown_seconds,
+            max_cooldown_seconds, half_open_probes, probe_timeout_seconds,
+        )
+        self._s = _BreakerState()
+        self._transitions: deque[dict] = deque(maxlen=_TRANSITION_LOG)
+
+    def configure(
+        self,
+        error_threshold: float,
+        min_requests: int,
+        window_seconds: float,
+        cooldown_seconds: float,
+        max_cooldown_seconds: float,
+        half_open_probes: int,
+        probe_timeout_seconds: float = 60,
+        state_file: str | Path = '',
+    ):
+        with self._lock:
+            self._error_threshold = error_threshold
+            self._min_requests = min_requests
+            self._window = window_seconds
+            self._bucket_seconds = window_seconds / 10
+            self._base_cooldown = cooldown_seconds
+            self._max_cooldown = max_cooldown_seconds
+            self._half_open_probes = half_open_probes
+            self._probe_timeout = probe_timeout_seconds
+            if self._shared is not None:
+                self._shared.close()
+            self._shared = _SharedStateFile(Path(state_file)) if state_file else None
+
+    @contextmanager
+    def _guard(self):
+        """取得狀態的獨佔存取；共用模式下先從檔案讀入，結束時寫回"""
+        with self._lock:
+            if self._shared is None:
+                yield self._s
+                return
+            with self._shared.locked():
+                self._s = self._shared.load()
+                yield self._s
+                self._shared.store(self._s)
 
     def set_has_api_key(self, has_key: bool):
         """設定是否有 API key"""
         self._has_api_key = has_key
 
-    @property
-    def should_try_api(self) -> bool:
-        """判斷是否該嘗試呼叫 API"""
+    def allow_request(self) -> bool:
+        """判斷這個請求是否該呼叫 API；half-open 時會佔用一個 probe 名額"""
         if not self._has_api_key:
             return False
-        if self._is_available:
+        with self._guard() as s:
+            now = time.monotonic()
+            if s.state == OPEN:
+                if now < s.open_until:
+                    s.counters['short_circuited'] += 1
+                    return False
+                self._transition(s, HALF_OPEN, 'cooldown elapsed')
+
+            if s.state == HALF_OPEN:
+                # 沒有回報結果（斷線等）的 probe 逾時後釋放名額
+                live = [t for t in s.probes if now - t < self._probe_timeout]
+                s.counters['probe_timeouts'] += len(s.probes) - len(live)
+                s.probes = live
+                if len(s.probes) + s.probe_successes >= self._half_open_probes:
+                    s.counters['short_circuited'] += 1
+                    return False
+                s.probes.append(now)
+                s.counters['probes'] += 1
             return True
-        return (time.time() - self._last_failure_time) >= self._cooldown
+
+    @property
+    def should_try_api(self) -> bool:
+        """相容舊介面：等同 allow_request()"""
+        return self.allow_request()
 
     @property
     def is_available(self) -> bool:
-        return self._is_available and self._has_api_key
+        return self.state == CLOSED and self._has_api_key
+
+    @property
+    def state(self) -> str:
+        with self._guard() as s:
+            return s.state
 
     def mark_success(self):
         """API 呼叫成功"""
-        self._is_available = True
-        self._last_failure_time = 0
+        with self._guard() as s:
+            s.counters['successes'] += 1
+            self._record(s, ok=True)
+            if s.state == HALF_OPEN:
+                if s.probes:
+                    s.probes.pop(0)
+                s.probe_successes += 1
+                if s.probe_successes >= self._half_open_probes:
+                    s.consecutive_trips = 0
+                    s.buckets.clear()
+                    self._transition(s, CLOSED, f'{s.probe_successes} probes succeeded')
 
     def mark_failure(self):
         """API 呼叫失敗"""
-        self._is_available = False
-        self._last_failure_time = time.time()
+        with self._guard() as s:
+            s.counters['failures'] += 1
+            self._record(s, ok=False)
+            if s.state == HALF_OPEN:
+                self._trip(s, 'probe failed')
+            elif s.state == CLOSED:
+                total, failures = self._window_counts(s)
+                if total >= self._min_requests and failures / total >= self._error_threshold:
+                    self._trip(s, f'error rate {failures}/{total}')
+
+    def mark_skipped(self):
+        """請求最後沒有打到上游（例如被 admission control 擋下）：釋放 half-open 的 probe 名額"""
+        with self._guard() as s:
+            if s.state == HALF_OPEN and s.probes:
+                s.probes.pop(0)
+
+    def _record(self, s: _BreakerState, ok: bool):
+        now = time.monotonic()
+        while s.buckets and now - s.buckets[0][0] >= self._window:
+            s.buckets.popleft()
+        if not s.buckets or now - s.buckets[-1][0] >= self._bucket_seconds:
+            s.buckets.append([now, 0, 0])
+        s.buckets[-1][1 if ok else 2] += 1
+
+    def _window_counts(self, s: _BreakerState) -> tuple[int, int]:
+        now = time.monotonic()
+        successes = failures = 0
+        for start, ok, failed in s.buckets:
+            if now - start < self._window:
+                successes += ok
+                failures += failed
+        return successes + failures, failures
+
+    def _trip(self, s: _BreakerState, reason: str):
+        """跳開：冷卻時間 = 基本冷卻 × 2^(連續跳開次數)，上限 max_cooldown，再乘 0.8~1.2 的 jitter"""
+        s.consecutive_trips += 1
+        s.counters['trips'] += 1
+        cooldown = min(self._base_cooldown * 2 ** (s.consecutive_trips - 1), self._max_cooldown)
+        s.cooldown = cooldown * random.uniform(0.8, 1.2)
+        s.open_until = time.monotonic() + s.cooldown
+        self._transition(s, OPEN, reason)
+
+    def _transition(self, s: _BreakerState, state: str, reason: str):
+        self._transitions.append({
+            'from': s.state,
+            'to': state,
+            'reason': reason,
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+        })
+        s.state = state
+        s.probes = []
+        s.probe_successes = 0
 
     def get_status(self) -> dict:
         """回傳目前狀態"""
-        cooldown_remaining = 0
-        if not self._is_available and self._last_failure_time > 0:
-            elapsed = time.time() - self._last_failure_time
-            cooldown_remaining = max(0, self._cooldown - elapsed)
-
-        return {
-            'has_api_key': self._has_api_key,
-            'api_available': self._is_available,
-            'cooldown_remaining_seconds': round(cooldown_remaining),
-        }
+        with self._guard() as s:
+            total, failures = self._window_counts(s)
+            cooldown_remaining = 0.0
+            if s.state == OPEN:
+                cooldown_remaining = max(0.0, s.open_until - time.monotonic())
+            return {
+                'has_api_key': self._has_api_key,
+                'api_available': s.state == CLOSED,
+                'state': s.state,
+                'shared': self._shared is not None,
+                'cooldown_remaining_seconds': round(cooldown_remaining),
+                'current_cooldown_seconds': round(s.cooldown, 1),
+                'consecutive_trips': s.consecutive_trips,
+                'window_requests': total,
+                'window_error_rate': round(failures / total, 3) if total else 0.0,
+                'half_open_probes_inflight': len(s.probes),
+                **s.counters,
+                'transitions': list(self._transitions),
+            }
 
 
 # 全域單例
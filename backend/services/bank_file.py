@@ -0,0 +1,235 @@
+"""題庫二進位格式（mmap + 延遲解碼）
+
+把 data/question_bank 下的 JSON 編譯成單一 bank.bin：
+
+    [magic 8B][header_pos u64][header_len u64]
+    [record blob ...]          每筆題目 / 回應為一段 compact JSON (UTF-8)
+    [index blob ...]           fallback 回應的 keywords + user_example、練習題的 tag（建索引用）
+    [reply text ...]           預先組好的英文 / 雙語回覆（UTF-8 純文字，version 2 起）
+                               （練習題的 tag 自 version 3 起只含題目自己的欄位）
+    [offset table ...]         每個區段 count + 1 個 u64，指向 blob 起訖
+    [header JSON]              各區段的筆數與 offset table 位置
+
+讀取時整個檔案以 mmap 唯讀對映，多個 worker 透過 OS page cache 共用同一份頁面；
+只有被選中的題目才會 json.loads，長的 response / response_zh 不會預先載入；
+出題與預建回應直接取預組的回覆文字，連 json.loads 都不用。
+"""
+
+import json
+import mmap
+import struct
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+
+from services.drill_index import drill_tags
+from services.drill_text import render_drill, render_pair
+
+MAGIC = b'AIETQB\x00\x01'
+_PREAMBLE = struct.Struct('<8sQQ')
+_OFFSET = struct.Struct('<Q')
+_OFFSET_PAIR = struct.Struct('<QQ')
+
+BANK_FILENAME = 'bank.bin'
+# fallback 回應建索引只需要的欄位
+INDEX_FIELDS = ('id', 'keywords', 'user_example')
+
+
+def _encode(obj: dict) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class _Writer:
+    def __init__(self, fh):
+        self._fh = fh
+        self._fh.write(_PREAMBLE.pack(MAGIC, 0, 0))
+
+    def blobs(self, items: Iterable[bytes]) -> list[int]:
+        """依序寫入 blob，回傳 count + 1 個 offset"""
+        offsets = [self._fh.tell()]
+        for blob in items:
+            self._fh.write(blob)
+            offsets.append(self._fh.tell())
+        return offsets
+
+    def table(self, offsets: list[int]) -> int:
+        """寫入 8-byte 對齊的 offset table，回傳其位置"""
+        pad = -self._fh.tell() % 8
+        self._fh.write(b'\x00' * pad)
+        pos = self._fh.tell()
+        self._fh.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+        return pos
+
+    def finish(self, header: dict):
+        pos = self._fh.tell()
+        data = _encode(header)
+        self._fh.write(data)
+        self._fh.seek(0)
+        self._fh.write(_PREAMBLE.pack(MAGIC, pos, len(data)))
+
+
+def compile_bank(
+    drills: dict[str, list[dict]],
+    fallback_responses: dict[str, list[dict]],
+    out_path: Path,
+):
+    """把已解析的題庫寫成 bank.bin（先寫暫存檔再 rename，讀取端不會看到半個檔案）"""
+    tmp_path = out_path.with_suffix('.tmp')
+    header: dict = {'version': 3, 'drills': {}, 'fallback_responses': {}}
+
+    with open(tmp_path, 'wb') as fh:
+        w = _Writer(fh)
+        for drill_type, questions in drills.items():
+            offsets = w.blobs(_encode(q) for q in questions)
+            tags = w.blobs(_encode(drill_tags(q)) for q in questions)
+            pairs = [render_pair(render_drill(q, drill_type), q) for q in questions]
+            header['drills'][drill_type] = {
+                'count': len(questions),
+                'records': w.table(offsets),
+                'index': w.table(tags),
+                **_write_replies(w, pairs),
+            }
+        for scenario, responses in fallback_responses.items():
+            records = w.blobs(_encode(e) for e in responses)
+            index = w.blobs(
+                _encode({k: e[k] for k in INDEX_FIELDS if k in e}) for e in responses
+            )
+            pairs = [render_pair(e.get('response', ''), e) for e in responses]
+            header['fallback_responses'][scenario] = {
+                'count': len(responses),
+                'records': w.table(records),
+                'index': w.table(index),
+                **_write_replies(w, pairs),
+            }
+        w.finish(header)
+
+    tmp_path.replace(out_path)
+
+
+def _write_replies(w: _Writer, pairs: list[tuple[str, str]]) -> dict:
+    """寫入英文 / 雙語回覆兩個文字區段，回傳 header 欄位"""
+    replies = w.blobs(en.encode('utf-8') for en, _ in pairs)
+    replies_pos = w.table(replies)
+    bilingual = w.blobs(bi.encode('utf-8') for _, bi in pairs)
+    return {'replies': replies_pos, 'bilingual': w.table(bilingual)}
+
+
+class TextRecords(Sequence):
+    """mmap 上的純文字區段（預組好的回覆），取值只做 UTF-8 decode"""
+
+    def __init__(self, mm: mmap.mmap, count: int, table_pos: int):
+        self._mm = mm
+        self._count = count
+        self._table_pos = table_pos
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        start, end = _OFFSET_PAIR.unpack_from(self._mm, self._table_pos + 8 * i)
+        return self._mm[start:end].decode('utf-8')
+
+
+class LazyRecords(Sequence):
+    """mmap 上的一個區段；取值時才解碼該筆 JSON"""
+
+    def __init__(self, mm: mmap.mmap, count: int, records_pos: int, index_pos: int | None = None):
+        self._mm = mm
+        self._count = count
+        self._records_pos = records_pos
+        self._index_pos = index_pos
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _blob(self, table_pos: int, i: int) -> bytes:
+        start, end = _OFFSET_PAIR.unpack_from(self._mm, table_pos + 8 * i)
+        return self._mm[start:end]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        return json.loads(self._blob(self._records_pos, i))
+
+    def index_entries(self) -> list[dict]:
+        """只解碼建索引用的輕量欄位（回應的 keywords / user_example、練習題的 tag）
+
+        沒有可用的 index 區段（舊版檔案）時退回解碼完整紀錄。
+        """
+        if self._index_pos is None:
+            return list(self)
+        return [json.loads(self._blob(self._index_pos, i)) for i in range(self._count)]
+
+    @property
+    def nbytes(self) -> int:
+        """此區段 record blob 佔用的檔案大小"""
+        (start,) = _OFFSET.unpack_from(self._mm, self._records_pos)
+        (end,) = _OFFSET.unpack_from(self._mm, self._records_pos + 8 * self._count)
+        return end - start
+
+
+class BankFile:
+    """唯讀開啟 bank.bin"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, pos, length = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f'{path.name} 不是題庫二進位檔')
+        self._header = json.loads(self._mm[pos:pos + length])
+
+    def drills(self) -> dict[str, LazyRecords]:
+        # version 2 以前的 tag 混入了檔案層級的主題，不採用，改由完整紀錄重算
+        tagged = self._header.get('version', 1) >= 3
+        return {
+            drill_type: LazyRecords(
+                self._mm, sec['count'], sec['records'], sec.get('index') if tagged else None,
+            )
+            for drill_type, sec in self._header['drills'].items()
+        }
+
+    def fallback_responses(self) -> dict[str, LazyRecords]:
+        return {
+            scenario: LazyRecords(self._mm, sec['count'], sec['records'], sec['index'])
+            for scenario, sec in self._header['fallback_responses'].items()
+        }
+
+    def _replies(self, kind: str) -> dict[str, tuple[TextRecords, TextRecords]] | None:
+        sections = self._header[kind]
+        if any('replies' not in sec for sec in sections.values()):
+            return None  # version 1：沒有預組文字
+        return {
+            name: (TextRecords(self._mm, sec['count'], sec['replies']),
+                   TextRecords(self._mm, sec['count'], sec['bilingual']))
+            for name, sec in sections.items()
+        }
+
+    def drill_replies(self) -> dict[str, tuple[TextRecords, TextRecords]] | None:
+        """各題型預組的 (英文, 雙語) 回覆；舊版檔案回傳 None"""
+        return self._replies('drills')
+
+    def response_replies(self) -> dict[str, tuple[TextRecords, TextRecords]] | None:
+        """各場景預建回應的 (英文, 雙語) 回覆；舊版檔案回傳 None"""
+        return self._replies('fallback_responses')
+
+    def close(self):
+        self._mm.close()
+
+
+def index_view(responses: Sequence[dict]) -> Sequence[dict]:
+    """建 keyword / 語意索引用的 entry 視圖：二進位題庫只解碼輕量欄位"""
+    if isinstance(responses, LazyRecords):
+        return responses.index_entries()
+    return responses
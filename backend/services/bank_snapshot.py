@@ -0,0 +1,160 @@
+"""題庫快照與差異同步（離線前端用）
+
+前端把題庫（預組好的回覆 + 預建回應的 keyword）快取在 IndexedDB，
+確定 backend 只會回題庫時（沒有 API key、breaker 跳開、連不上）直接在瀏覽器出題，
+不必每一輪都打 backend。
+
+- 快照以內容 hash 定版本；題庫 generation 變了才重建，同一版本只建一次，
+  並預先壓好 gzip / brotli，請求時只挑一個送出
+- 保留最近幾個版本每筆紀錄的 digest，舊版用戶端只需下載差異（upserts + deletes）
+- 差異依 (from, to) 快取；太舊的版本回完整快照
+
+快照格式：{"format": 1, "version": ..., "records": {key: record}, "order": {場景: [key, ...]}}
+差異格式：{"format": 1, "version": ..., "base": 舊版本, "upserts": {key: record}, "deletes": [key, ...],
+          "order": {有變動的場景: [key, ...]}}
+
+order 是各場景預建回應的 keyword 匹配優先順序；與紀錄分開存，
+中間插入或刪除一筆時不會讓後面每一筆都變成差異。
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import NamedTuple
+
+from services.http_cache import Precompressed
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+class SnapshotPayload(NamedTuple):
+    version: str
+    kind: str  # snapshot / delta / not_modified
+    body: Precompressed | None
+
+
+def _canonical(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class BankSnapshotService:
+    """依題庫 generation 建快照、保留版本歷史、產生差異"""
+
+    def __init__(self, history: int = 8, max_deltas: int = 64):
+        self._history_size = history
+        self._max_deltas = max_deltas
+        self._current_generation: Callable[[], int] = lambda: 0
+        self._export: Callable[[], tuple[int, dict[str, dict]]] = lambda: (0, {})
+        self._lock = threading.Lock()
+        self._generation: int | None = None
+        self._version = ''
+        self._snapshot: Precompressed | None = None
+        self._records: dict[str, dict] = {}
+        # version → ({key: 紀錄 digest}, order)；只用來算差異，不保留舊紀錄本身
+        self._history: OrderedDict[str, tuple[dict[str, bytes], dict[str, list[str]]]] = OrderedDict()
+        self._deltas: OrderedDict[tuple[str, str], Precompressed] = OrderedDict()
+        self._build_ms = 0.0
+        self._served = {'snapshot': 0, 'delta': 0, 'not_modified': 0}
+
+    def configure(
+        self,
+        generation: Callable[[], int],
+        export: Callable[[], tuple[int, dict[str, dict]]],
+        history: int | None = None,
+    ):
+        """generation 回傳題庫目前的 generation；export 回傳 (generation, 紀錄)，只在 generation 變了才呼叫"""
+        self._current_generation = generation
+        self._export = export
+        if history is not None:
+            self._history_size = max(1, history)
+
+    def _refresh(self):
+        """題庫 generation 變了才重建（呼叫端持有 lock）"""
+        if self._current_generation() == self._generation and self._snapshot is not None:
+            return
+        generation, records = self._export()
+        start = time.perf_counter()
+        digests = {key: hashlib.sha256(_canonical(r)).digest()[:16] for key, r in records.items()}
+        order: dict[str, list[str]] = {}
+        for key, record in records.items():
+            if 'scenario' in record:
+                order.setdefault(record['scenario'], []).append(key)
+        h = hashlib.sha256(_canonical(order))
+        for key in sorted(digests):
+            h.update(key.encode('utf-8'))
+            h.update(digests[key])
+        version = h.hexdigest()[:16]
+
+        self._generation = generation
+        if version != self._version:
+            self._version = version
+            self._records = records
+            self._snapshot = Precompressed(_canonical({
+                'format': SNAPSHOT_FORMAT, 'version': version, 'records': records, 'order': order,
+            }))
+            self._history[version] = (digests, order)
+            self._history.move_to_end(version)
+            while len(self._history) > self._history_size:
+                self._history.popitem(last=False)
+            self._build_ms = (time.perf_counter() - start) * 1000
+            logger.info('題庫快照 %s：%d 筆，%s bytes（%.0f ms）',
+                        version, len(records), self._snapshot.sizes(), self._build_ms)
+
+    def _delta(self, base: str) -> Precompressed:
+        """base → 目前版本的差異（呼叫端持有 lock，且 base 在歷史中）"""
+        key = (base, self._version)
+        delta = self._deltas.get(key)
+        if delta is not None:
+            self._deltas.move_to_end(key)
+            return delta
+        (old, old_order), (new, new_order) = self._history[base], self._history[self._version]
+        order = {s: keys for s, keys in new_order.items() if old_order.get(s) != keys}
+        order.update({s: [] for s in old_order if s not in new_order})
+        delta = Precompressed(_canonical({
+            'format': SNAPSHOT_FORMAT,
+            'version': self._version,
+            'base': base,
+            'upserts': {k: self._records[k] for k, d in new.items() if old.get(k) != d},
+            'deletes': sorted(k for k in old if k not in new),
+            'order': order,
+        }))
+        self._deltas[key] = delta
+        while len(self._deltas) > self._max_deltas:
+            self._deltas.popitem(last=False)
+        return delta
+
+    def get(self, since: str | None = None) -> SnapshotPayload:
+        """since 為用戶端目前的版本：相同回 not_modified，在歷史中回差異，否則回完整快照"""
+        with self._lock:
+            self._refresh()
+            version = self._version
+            if since == version:
+                kind, body = 'not_modified', None
+            elif since and since in self._history:
+                kind, body = 'delta', self._delta(since)
+            else:
+                kind, body = 'snapshot', self._snapshot
+            self._served[kind] += 1
+        return SnapshotPayload(version, kind, body)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'version': self._version or None,
+                'records': len(self._records),
+                'sizes': self._snapshot.sizes() if self._snapshot else {},
+                'build_ms': round(self._build_ms, 1),
+                'history': list(self._history),
+                'cached_deltas': len(self._deltas),
+                'served': dict(self._served),
+            }
+
+
+# 全域單例
+bank_snapshots = BankSnapshotService()
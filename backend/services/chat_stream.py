@@ -0,0 +1,88 @@
+"""SSE 串流輔助
+
+把 Claude 的 token delta（或題庫 fallback 文字）切成帶標籤的事件：
+- reply: 主要對話內容
+- grammar: ---GRAMMAR--- 之後的文法說明
+- translation: ---TRANSLATION--- 之後的中文翻譯
+
+分隔符號可能跨越兩個 delta，SectionSplitter 會保留可能是分隔符號開頭的尾巴，
+確保分隔符號本身不會被送給前端。
+"""
+
+import json
+
+SECTION_MARKERS = {
+    '---GRAMMAR---': 'grammar',
+    '---TRANSLATION---': 'translation',
+}
+_MAX_MARKER_LEN = max(len(m) for m in SECTION_MARKERS)
+
+# fallback 回覆每個事件的字元數
+FALLBACK_CHUNK_SIZE = 48
+
+
+def sse_event(event: str, data: dict) -> str:
+    """格式化一個 SSE 事件（data 用 JSON，保留換行）"""
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+class SectionSplitter:
+    """增量切分回覆區段"""
+
+    def __init__(self):
+        self.section = 'reply'
+        self._buffer = ''
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        """餵入一段 delta，回傳可安全送出的 (section, text) 列表"""
+        self._buffer += text
+        out: list[tuple[str, str]] = []
+
+        while True:
+            idx, marker = self._find_marker()
+            if marker is None:
+                break
+            if idx > 0:
+                out.append((self.section, self._buffer[:idx]))
+            self.section = SECTION_MARKERS[marker]
+            self._buffer = self._buffer[idx + len(marker):]
+
+        hold = self._partial_marker_len()
+        ready = self._buffer[:len(self._buffer) - hold]
+        if ready:
+            out.append((self.section, ready))
+        self._buffer = self._buffer[len(self._buffer) - hold:]
+        return out
+
+    def flush(self) -> list[tuple[str, str]]:
+        """串流結束時送出剩餘內容"""
+        rest, self._buffer = self._buffer, ''
+        return [(self.section, rest)] if rest else []
+
+    def _find_marker(self) -> tuple[int, str | None]:
+        best_idx, best_marker = -1, None
+        for marker in SECTION_MARKERS:
+            idx = self._buffer.find(marker)
+            if idx != -1 and (best_marker is None or idx < best_idx):
+                best_idx, best_marker = idx, marker
+        return best_idx, best_marker
+
+    def _partial_marker_len(self) -> int:
+        """buffer 尾端有多少字元可能是分隔符號的開頭"""
+        for k in range(min(len(self._buffer), _MAX_MARKER_LEN - 1), 0, -1):
+            tail = self._buffer[-k:]
+            if any(m.startswith(tail) for m in SECTION_MARKERS):
+                return k
+        return 0
+
+
+def reply_section(text: str) -> str:
+    """完整回覆中的對話部分（去掉文法 / 翻譯區段）"""
+    splitter = SectionSplitter()
+    pairs = splitter.feed(text) + splitter.flush()
+    return ''.join(t for section, t in pairs if section == 'reply').strip()
+
+
+def chunk_text(text: str, size: int = FALLBACK_CHUNK_SIZE) -> list[str]:
+    """把完整回覆切成固定長度的片段（fallback 串流用）"""
+    return [text[i:i + size] for i in range(0, len(text), size)]
@@ -0,0 +1,205 @@
+"""Anthropic client 池
+
+- env key 的 AsyncAnthropic client 全程共用
+- X-Api-Key 的 client 依 key hash 放進 LRU + idle TTL 快取，
+  重複使用者沿用已暖機的 keep-alive 連線；淘汰時關閉連線池
+- 請求以 lease() 持有 client：被淘汰時若還有進行中的請求，等最後一個 lease 歸還才關閉
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+
+import anthropic
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_key(api_key: str) -> str:
+    """API key 只以 hash 當快取 key，不在記憶體中留明文索引"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class ClientLease:
+    """持有一個 client 直到 release()（可重複呼叫，只歸還一次）"""
+
+    __slots__ = ('client', '_pool', '_released')
+
+    def __init__(self, pool: 'AnthropicClientPool', client: anthropic.AsyncAnthropic | None):
+        self.client = client
+        self._pool = pool
+        self._released = client is None
+        if client is not None:
+            pool._inflight[client] = pool._inflight.get(client, 0) + 1
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool._release(self.client)
+
+    def __enter__(self) -> anthropic.AsyncAnthropic | None:
+        return self.client
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def iterate(self, events: AsyncIterator) -> AsyncIterator:
+        """串流回應：產生器結束或被關閉時歸還"""
+        try:
+            async for event in events:
+                yield event
+        finally:
+            self.release()
+
+
+class AnthropicClientPool:
+    """管理共用的 AsyncAnthropic client"""
+
+    def __init__(self, max_clients: int = 256, idle_ttl_seconds: float = 600):
+        self._max_clients = max_clients
+        self._idle_ttl = idle_ttl_seconds
+        # 單一 HTTP 請求的 timeout（None = SDK 預設的數分鐘）
+        self._timeout: float | None = None
+        self._default_client: anthropic.AsyncAnthropic | None = None
+        # key hash -> (client, 最後使用時間)；順序即 LRU 順序（最舊在前）
+        self._clients: OrderedDict[str, tuple[anthropic.AsyncAnthropic, float]] = OrderedDict()
+        self._closing: set[asyncio.Task] = set()
+        # client -> 進行中的 lease 數；已淘汰但還有 lease 的 client 等歸還後才關閉
+        self._inflight: dict[anthropic.AsyncAnthropic, int] = {}
+        self._draining: set[anthropic.AsyncAnthropic] = set()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def configure(
+        self,
+        default_api_key: str,
+        max_clients: int | None = None,
+        idle_ttl_seconds: float | None = None,
+        timeout_seconds: float | None = None,
+    ):
+        """設定 env key 與 per-key client 快取參數"""
+        if max_clients is not None:
+            self._max_clients = max_clients
+        if idle_ttl_seconds is not None:
+            self._idle_ttl = idle_ttl_seconds
+        if timeout_seconds is not None:
+            self._timeout = timeout_seconds
+        self._default_client = self._create(default_api_key) if default_api_key else None
+
+    def _create(self, api_key: str) -> anthropic.AsyncAnthropic:
+        if self._timeout is None:
+            return anthropic.AsyncAnthropic(api_key=api_key)
+        return anthropic.AsyncAnthropic(api_key=api_key, timeout=self._timeout)
+
+    @property
+    def has_default(self) -> bool:
+        return self._default_client is not None
+
+    def get(self, request_api_key: str | None) -> anthropic.AsyncAnthropic | None:
+        """取得 client：request key > env key > None"""
+        if not request_api_key:
+            return self._default_client
+
+        now = time.monotonic()
+        self._expire_idle(now)
+
+        key = _hash_key(request_api_key)
+        cached = self._clients.get(key)
+        if cached is not None:
+            self._hits += 1
+            self._clients[key] = (cached[0], now)
+            self._clients.move_to_end(key)
+            return cached[0]
+
+        self._misses += 1
+        client = self._create(request_api_key)
+        self._clients[key] = (client, now)
+        while len(self._clients) > self._max_clients:
+            _, (evicted, _) = self._clients.popitem(last=False)
+            self._evictions += 1
+            self._close_when_idle(evicted)
+        return client
+
+    def lease(self, request_api_key: str | None) -> ClientLease:
+        """取得並持有 client（與 get() 相同的選擇順序）；請求結束時要 release()"""
+        return ClientLease(self, self.get(request_api_key))
+
+    def retain(self, client: anthropic.AsyncAnthropic | None) -> ClientLease:
+        """對已取得的 client 再持有一份（例如交給背景 task）"""
+        return ClientLease(self, client)
+
+    def _release(self, client: anthropic.AsyncAnthropic):
+        count = self._inflight.pop(client) - 1
+        if count:
+            self._inflight[client] = count
+        elif client in self._draining:
+            self._draining.discard(client)
+            self._schedule_close(client)
+
+    def _expire_idle(self, now: float):
+        """淘汰閒置超過 TTL 的 client（LRU 順序，遇到未過期即停）"""
+        while self._clients:
+            key, (client, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self._idle_ttl:
+                break
+            del self._clients[key]
+            self._expirations += 1
+            self._close_when_idle(client)
+
+    def _close_when_idle(self, client: anthropic.AsyncAnthropic):
+        """淘汰的 client：沒有進行中的請求就關閉，否則等最後一個 lease 歸還"""
+        if self._inflight.get(client):
+            self._draining.add(client)
+        else:
+            self._schedule_close(client)
+
+    def _schedule_close(self, client: anthropic.AsyncAnthropic):
+        """被淘汰的 client 在背景關閉連線池"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(client.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def aclose(self):
+        """關閉所有 client（lifespan 結束時呼叫）"""
+        clients = [client for client, _ in self._clients.values()]
+        clients.extend(self._draining)
+        if self._default_client is not None:
+            clients.append(self._default_client)
+        self._clients.clear()
+        self._draining.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning('關閉 Anthropic client 失敗: %s', e)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def get_status(self) -> dict:
+        """回傳 per-key client 快取狀態"""
+        lookups = self._hits + self._misses
+        return {
+            'cached_clients': len(self._clients),
+            'draining_clients': len(self._draining),
+            'max_clients': self._max_clients,
+            'idle_ttl_seconds': self._idle_ttl,
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'expirations': self._expirations,
+            'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# 全域單例
+client_pool = AnthropicClientPool()
@@ -0,0 +1,322 @@
+"""伺服器端對話紀錄
+
+前端每輪只送 conversation_id + 新訊息，歷史由後端保存：
+- memory：LRU + idle TTL 的 OrderedDict（單 process）
+- sqlite：存到檔案，重啟後仍在，多個 worker 可共用（WAL 模式）
+
+歷史超過 token 預算時，把較舊的訊息壓成一段滾動摘要（running summary），
+送往 Claude 的只有 system prompt + 摘要 + 最近幾輪，請求大小不隨對話長度成長。
+摘要在回覆送出後於背景產生：有 client 時請 Claude 摘要，失敗或離線則退回擷取式摘要。
+sqlite 的讀寫是同步 I/O：async 的呼叫端經 offload() 放到 threadpool，不佔住 event loop。
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+STORE_BACKENDS = ('memory', 'sqlite')
+
+SUMMARY_SYSTEM = (
+    'You maintain a running summary of an English tutoring conversation. '
+    'Merge the previous summary and the new messages into one concise summary (under 150 words). '
+    "Keep the learner's name, goals, level, recurring mistakes and any open questions. "
+    'Output only the summary.'
+)
+# 擷取式摘要每則訊息保留的字數
+_EXTRACT_CHARS = 160
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 token 數（英文約 4 字元 = 1 token）"""
+    return len(text) // 4 + 1
+
+
+def _messages_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(m['content']) + 4 for m in messages)
+
+
+class ConversationOutOfSync(Exception):
+    """前端認為的歷史長度與後端不同（後端重啟、被淘汰或重複送出），需重送完整歷史"""
+
+
+class Conversation:
+    """一段對話的狀態；total 為累計訊息數（含已壓進摘要的），pending 為這一輪新增、尚未寫入的訊息數"""
+
+    __slots__ = ('summary', 'messages', 'total', 'updated_at', 'pending')
+
+    def __init__(self, summary: str = '', messages: list[dict] | None = None, total: int = 0,
+                 updated_at: float = 0.0, pending: int = 0):
+        self.summary = summary
+        self.messages = messages or []
+        self.total = total
+        self.updated_at = updated_at
+        self.pending = pending
+
+
+class MemoryConversationStore:
+    def __init__(self, max_sessions: int, idle_ttl_seconds: float):
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl_seconds
+        self._items: OrderedDict[str, Conversation] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, conv_id: str) -> Conversation | None:
+        with self._lock:
+            conv = self._items.get(conv_id)
+            if conv is None:
+                return None
+            if time.time() - conv.updated_at >= self._idle_ttl:
+                del self._items[conv_id]
+                self.evictions += 1
+                return None
+            self._items.move_to_end(conv_id)
+            return conv
+
+    def put(self, conv_id: str, conv: Conversation):
+        with self._lock:
+            self._items[conv_id] = conv
+            self._items.move_to_end(conv_id)
+            while self._items:
+                oldest = next(iter(self._items.values()))
+                if (time.time() - oldest.updated_at < self._idle_ttl
+                        and len(self._items) <= self._max_sessions):
+                    break
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def close(self):
+        pass
+
+
+class SqliteConversationStore:
+    """每段對話一列；messages 以 JSON 存。淘汰依 updated_at，最多每分鐘清一次"""
+
+    _PURGE_INTERVAL = 60
+
+    def __init__(self, path: Path, max_sessions: int, idle_ttl_seconds: float):
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl_seconds
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS conversations ('
+            ' id TEXT PRIMARY KEY, summary TEXT NOT NULL, messages TEXT NOT NULL,'
+            ' total INTEGER NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated_at)')
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.evictions = 0
+
+    def get(self, conv_id: str) -> Conversation | None:
+        with self._lock:
+            row = self._db.execute(
+                'SELECT summary, messages, total, updated_at FROM conversations WHERE id = ?',
+                (conv_id,),
+            ).fetchone()
+        if row is None or time.time() - row[3] >= self._idle_ttl:
+            return None
+        return Conversation(row[0], json.loads(row[1]), row[2], row[3])
+
+    def put(self, conv_id: str, conv: Conversation):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO conversations VALUES (?, ?, ?, ?, ?)',
+                (conv_id, conv.summary, json.dumps(conv.messages, ensure_ascii=False),
+                 conv.total, conv.updated_at),
+            )
+            if conv.updated_at - self._last_purge >= self._PURGE_INTERVAL:
+                self._last_purge = conv.updated_at
+                self._purge(conv.updated_at)
+
+    def _purge(self, now: float):
+        expired = self._db.execute(
+            'DELETE FROM conversations WHERE updated_at < ?', (now - self._idle_ttl,),
+        ).rowcount
+        overflow = self._db.execute(
+            'DELETE FROM conversations WHERE id IN ('
+            ' SELECT id FROM conversations ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+            (self._max_sessions,),
+        ).rowcount
+        self.evictions += expired + overflow
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM conversations').fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+
+def _extractive_summary(previous: str, messages: list[dict], max_chars: int) -> str:
+    """離線摘要：每則訊息取開頭一段，超過上限時丟掉最舊的部分"""
+    lines = [previous] if previous else []
+    for m in messages:
+        text = ' '.join(m['content'].split())
+        if len(text) > _EXTRACT_CHARS:
+            text = text[:_EXTRACT_CHARS] + '…'
+        lines.append(f"{m['role'].capitalize()}: {text}")
+    summary = '\n'.join(lines)
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:].partition('\n')[2]
+    return summary
+
+
+class ConversationService:
+    """對話歷史 + 滾動摘要"""
+
+    def __init__(self):
+        self._store: MemoryConversationStore | SqliteConversationStore = MemoryConversationStore(10000, 3600)
+        self._backend = 'memory'
+        self._token_budget = 2000
+        self._keep_recent = 6
+        self._compactions = 0
+        self._summary_failures = 0
+        # commit 與套用摘要都是「讀出 → 合併 → 寫回」，可能在不同 thread 同時執行，需整段互斥
+        self._update_lock = threading.Lock()
+
+    def configure(
+        self,
+        backend: str = 'memory',
+        sqlite_path: Path | None = None,
+        max_sessions: int = 10000,
+        idle_ttl_seconds: float = 3600,
+        token_budget: int = 2000,
+        keep_recent: int = 6,
+    ):
+        if backend not in STORE_BACKENDS:
+            raise ValueError(f'未知的對話儲存方式: {backend}')
+        self._store.close()
+        if backend == 'sqlite':
+            self._store = SqliteConversationStore(sqlite_path, max_sessions, idle_ttl_seconds)
+        else:
+            self._store = MemoryConversationStore(max_sessions, idle_ttl_seconds)
+        self._backend = backend
+        self._token_budget = token_budget
+        self._keep_recent = keep_recent
+
+    def close(self):
+        self._store.close()
+
+    async def offload(self, fn: Callable, *args):
+        """在 async 呼叫端執行會碰到儲存的同步方法：sqlite 放到 threadpool，memory 直接呼叫"""
+        if self._backend == 'sqlite':
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    def prepare(self, conv_id: str, history_length: int, new_messages: list[dict]) -> Conversation:
+        """組出這一輪要送出的對話（尚未寫入）
+
+        history_length 為前端認為後端已有的訊息數；0 表示從頭開始（或重送完整歷史）。
+        """
+        pending = len(new_messages)
+        if history_length == 0:
+            return Conversation(messages=list(new_messages), total=pending, pending=pending)
+        conv = self._store.get(conv_id)
+        if conv is None or conv.total != history_length:
+            raise ConversationOutOfSync(conv_id)
+        return Conversation(conv.summary, conv.messages + new_messages, conv.total + pending, pending=pending)
+
+    def commit(self, conv_id: str, turn: Conversation, reply: str) -> bool:
+        """回覆完成後寫入；回傳是否超過 token 預算（需要壓縮）"""
+        new_messages = turn.messages[len(turn.messages) - turn.pending:]
+        new_messages.append({'role': 'assistant', 'content': reply})
+        base = turn.total - turn.pending
+
+        # 等上游回覆期間背景摘要可能已壓縮過歷史，接在最新的狀態後面，不要蓋掉摘要
+        with self._update_lock:
+            current = self._store.get(conv_id) if base else None
+            if current is not None and current.total == base:
+                conv = Conversation(current.summary, current.messages + new_messages, base + len(new_messages))
+            else:
+                conv = Conversation(turn.summary, turn.messages[:-turn.pending or None] + new_messages,
+                                    base + len(new_messages))
+            conv.updated_at = time.time()
+            self._store.put(conv_id, conv)
+        return _messages_tokens(conv.messages) > self._token_budget
+
+    def _split_point(self, messages: list[dict]) -> int:
+        """要壓進摘要的訊息數：保留的部分壓到預算一半以下，至少留 keep_recent 則，且從 user 開始"""
+        keep_tokens = self._token_budget // 2
+        cut = len(messages) - self._keep_recent
+        while cut > 0 and _messages_tokens(messages[cut - 1:]) <= keep_tokens:
+            cut -= 1
+        while 0 < cut < len(messages) and messages[cut]['role'] != 'user':
+            cut += 1
+        if cut <= 0 or len(messages) - cut < 2:
+            return 0
+        return cut
+
+    async def compact(self, conv_id: str, summarize: Callable[[dict], Awaitable[str]] | None = None):
+        """把較舊的訊息壓進摘要（回覆送出後在背景執行）
+
+        summarize 收到不含 model 的 Claude 參數，回傳摘要文字；回傳空字串（不能呼叫上游）
+        或丟出例外時改用擷取式摘要。
+        """
+        conv = await self.offload(self._store.get, conv_id)
+        if conv is None:
+            return
+        cut = self._split_point(conv.messages)
+        if cut == 0:
+            return
+        old = conv.messages[:cut]
+        max_chars = self._token_budget * 2  # 摘要最多佔預算一半
+
+        summary = ''
+        if summarize is not None:
+            try:
+                transcript = '\n'.join(f"{m['role'].capitalize()}: {m['content']}" for m in old)
+                summary = await summarize({
+                    'max_tokens': 300,
+                    'system': SUMMARY_SYSTEM,
+                    'messages': [{'role': 'user', 'content': (
+                        f'Previous summary:\n{conv.summary or "(none)"}\n\nNew messages:\n{transcript}'
+                    )}],
+                })
+                summary = summary.strip()[:max_chars]
+            except Exception as e:
+                logger.warning('對話摘要失敗，改用擷取式摘要: %s', e)
+                self._summary_failures += 1
+        if not summary:
+            summary = _extractive_summary(conv.summary, old, max_chars)
+
+        # 摘要期間若有新的一輪寫入，只要前面的訊息沒變就能套用
+        if await self.offload(self._apply_summary, conv_id, cut, old, summary):
+            self._compactions += 1
+
+    def _apply_summary(self, conv_id: str, cut: int, old: list[dict], summary: str) -> bool:
+        with self._update_lock:
+            latest = self._store.get(conv_id)
+            if latest is None or latest.messages[:cut] != old:
+                return False
+            self._store.put(conv_id, Conversation(summary, latest.messages[cut:], latest.total, latest.updated_at))
+            return True
+
+    def get_status(self) -> dict:
+        return {
+            'backend': self._backend,
+            'conversations': len(self._store),
+            'evictions': self._store.evictions,
+            'token_budget': self._token_budget,
+            'compactions': self._compactions,
+            'summary_failures': self._summary_failures,
+        }
+
+
+# 全域單例
+conversations = ConversationService()
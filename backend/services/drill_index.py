@@ -0,0 +1,202 @@
+"""練習題索引（題型 / 程度 / 主題）
+
+載入題庫時為每題建 tag，並建立排序好的 posting list（元素為攤平後的 drill index，
+與出題輪替用的 index 相同）：
+- 題型：攤平 index 本來就依題型連續排列，直接用 range
+- 程度：CEFR（A1–C2），"B2-C1" 這種範圍會展開到每個等級
+- 主題：小寫字串
+
+程度與主題的 tag 只取題目本身的 level / topic / topics 欄位。metadata.json 對整個檔案的
+描述（列出檔案內涵蓋的所有程度與主題）不是每一題的 tag，只作為題型的粗略說明放在 facets，
+不進 posting list，否則每題都會掛上整個檔案的主題，篩選形同沒有作用。
+
+查詢時題型條件以二分搜尋切出區間，再從最短的 posting list 出發、以二分搜尋過濾其餘；
+同一組條件的結果會記住，分頁與抽樣只是在結果上 bisect / sample。
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CEFR_LEVELS = ('A1', 'A2', 'B1', 'B2', 'C1', 'C2')
+METADATA_FILENAME = 'metadata.json'
+
+# 記住多少組不同條件的查詢結果
+_MATCH_CACHE_CAPACITY = 512
+_EMPTY = array('I')
+
+
+def load_drill_metadata(data_dir: Path) -> dict[str, dict]:
+    """metadata.json 中各題型檔案的描述：drill_type -> {'level': ..., 'topics': [...]}"""
+    path = data_dir / METADATA_FILENAME
+    try:
+        data = json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, OSError) as e:
+        logger.error('載入 %s 失敗: %s', path.name, e)
+        return {}
+    files = data.get('files', {}).get('drills', []) if isinstance(data, dict) else []
+    return {Path(f['file']).stem: f for f in files if isinstance(f, dict) and 'file' in f}
+
+
+def parse_levels(level) -> list[str]:
+    """'B2-C1' → ['B2', 'C1']；也接受 list；無法辨識的值略過"""
+    if isinstance(level, list):
+        return [lv for item in level for lv in parse_levels(item)]
+    if not isinstance(level, str):
+        return []
+    parts = [p.strip().upper() for p in level.split('-')]
+    if not all(p in CEFR_LEVELS for p in parts):
+        return []
+    lo, hi = CEFR_LEVELS.index(parts[0]), CEFR_LEVELS.index(parts[-1])
+    return list(CEFR_LEVELS[min(lo, hi):max(lo, hi) + 1])
+
+
+def _topics(value) -> list[str]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return []
+    return sorted({t.strip().lower() for t in value if isinstance(t, str) and t.strip()})
+
+
+def drill_tags(question: dict) -> dict:
+    """一題的 tag：{'id', 'levels', 'topics'}；只看題目自己的欄位"""
+    return {
+        'id': question.get('id', ''),
+        'levels': parse_levels(question.get('levels') or question.get('level')),
+        'topics': _topics(question.get('topics') or question.get('topic')),
+    }
+
+
+def describe_type(file_meta: dict) -> dict:
+    """metadata.json 對一個題型檔案的描述：{'levels', 'topics'}（整個檔案涵蓋的範圍）"""
+    return {
+        'levels': parse_levels(file_meta.get('level')),
+        'topics': _topics(file_meta.get('topics')),
+    }
+
+
+def _contains(postings: Sequence[int], idx: int) -> bool:
+    pos = bisect.bisect_left(postings, idx)
+    return pos < len(postings) and postings[pos] == idx
+
+
+class DrillIndex:
+    """攤平 drill index 上的 posting list；建好後不再修改（查詢結果快取除外）"""
+
+    def __init__(
+        self, tags: dict[str, Sequence[dict]], version: str = '',
+        descriptions: dict[str, dict] | None = None,
+    ):
+        self.version = version
+        # 題型 → describe_type() 的結果（只顯示在 facets，不參與篩選）
+        self._descriptions = descriptions or {}
+        self._types: dict[str, range] = {}
+        self._starts: list[int] = []
+        self._start_types: list[str] = []
+        self._ids: list[str] = []
+        levels: dict[str, array] = {}
+        topics: dict[str, array] = {}
+
+        total = 0
+        for drill_type, entries in tags.items():
+            if not entries:
+                continue
+            self._types[drill_type] = range(total, total + len(entries))
+            self._starts.append(total)
+            self._start_types.append(drill_type)
+            for i, entry in enumerate(entries, start=total):
+                self._ids.append(entry.get('id', ''))
+                for level in entry.get('levels', ()):
+                    levels.setdefault(level, array('I')).append(i)
+                for topic in entry.get('topics', ()):
+                    topics.setdefault(topic, array('I')).append(i)
+            total += len(entries)
+        self.total = total
+        # index 依序遞增加入，posting list 天生有序
+        self._levels = levels
+        self._topics = topics
+        self._match_cache: dict[tuple, Sequence[int]] = {}
+
+    def locate(self, idx: int) -> tuple[str, int]:
+        """攤平 index → (題型, 該題型內的 index)"""
+        pos = bisect.bisect_right(self._starts, idx) - 1
+        return self._start_types[pos], idx - self._starts[pos]
+
+    def drill_id(self, idx: int) -> str:
+        return self._ids[idx]
+
+    def match(
+        self, drill_type: str | None = None, level: str | None = None, topic: str | None = None,
+    ) -> Sequence[int]:
+        """符合全部條件的攤平 index（遞增排序）"""
+        key = (drill_type, level, topic)
+        result = self._match_cache.get(key)
+        if result is not None:
+            return result
+
+        postings: list[Sequence[int]] = []
+        if level is not None:
+            postings.append(self._levels.get(level, _EMPTY))
+        if topic is not None:
+            postings.append(self._topics.get(topic, _EMPTY))
+        if drill_type is not None:
+            # 題型是連續區間：其他 posting list 只要二分搜尋切出這一段
+            span = self._types.get(drill_type, range(0))
+            if not postings:
+                postings.append(span)
+            postings = [
+                p[bisect.bisect_left(p, span.start):bisect.bisect_left(p, span.stop)]
+                if not isinstance(p, range) else p
+                for p in postings
+            ]
+
+        if not postings:
+            result = range(self.total)
+        elif len(postings) == 1:
+            result = postings[0]
+        else:
+            postings.sort(key=len)
+            first, rest = postings[0], postings[1:]
+            result = array('I', (i for i in first if all(_contains(p, i) for p in rest)))
+
+        if len(self._match_cache) >= _MATCH_CACHE_CAPACITY:
+            self._match_cache.clear()
+        self._match_cache[key] = result
+        return result
+
+    def facets(self) -> dict:
+        """各題型 / 程度 / 主題的題數；題型另附 metadata.json 的檔案描述"""
+        return {
+            'types': {
+                t: {'count': len(r), **self._descriptions.get(t, {'levels': [], 'topics': []})}
+                for t, r in self._types.items()
+            },
+            'levels': {lv: len(self._levels[lv]) for lv in CEFR_LEVELS if lv in self._levels},
+            'topics': {t: len(p) for t, p in sorted(self._topics.items())},
+        }
+
+    def get_status(self) -> dict:
+        return {
+            'version': self.version,
+            'levels': len(self._levels),
+            'topics': len(self._topics),
+            'cached_queries': len(self._match_cache),
+        }
+
+
+def index_version(content_keys: dict[str, str], metadata: dict[str, dict]) -> str:
+    """題庫內容版本（ETag / cursor 用）：練習題檔案的內容 key 加上 metadata 描述"""
+    h = hashlib.sha256()
+    for name in sorted(content_keys):
+        h.update(f'{name}={content_keys[name]}\n'.encode())
+    h.update(json.dumps(metadata, sort_keys=True).encode())
+    return h.hexdigest()[:16]
@@ -0,0 +1,129 @@
+"""練習題輪替（per-session）
+
+每個 session 各自一副「洗好的牌」：一輪內不重複出題，出完再換一副。
+牌序不存成 list，而是用隨機 key 的 Feistel 網路產生 [0, n) 的排列：
+- 在 [0, 4^h)（≥ n 的最小 4 的次方）上做 4 輪平衡 Feistel，是 key 決定的雙射；
+  依序加密 0, 1, 2, ...，超出 n 的值直接跳過（cycle-walking），一輪內每題剛好一次
+- 不像 2 的次方模數的 LCG 有低位元交替、固定步長等肉眼可見的規律
+- 每個 session 只存 4 個整數，題庫再大也一樣
+- 每次抽牌 O(1)（期望不到 4 步），不配置新物件
+- 閒置 session 依 LRU + TTL 淘汰，總數有上限
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+_ROUNDS = 4
+_MASK64 = (1 << 64) - 1
+
+
+class _Deck:
+    """一個 session 的出題狀態：Feistel 的 key 與下一個要加密的序號"""
+
+    __slots__ = ('key', 'index', 'drawn', 'last_used')
+
+    def __init__(self):
+        self.key = self.index = self.drawn = 0
+        self.last_used = 0.0
+
+
+def _round(value: int, key: int) -> int:
+    """Feistel 的輪函數（splitmix64 的 finalizer）
+
+    結果只取低位元，所以每一步都要把高位元混回來；單純乘法的低位元只取決於輸入的低位元，
+    排列會留下規律。
+    """
+    value = (value + key) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+def permute(index: int, key: int, half_bits: int) -> int:
+    """以 key 將 [0, 4^half_bits) 內的 index 映射到同範圍（雙射）"""
+    mask = (1 << half_bits) - 1
+    left, right = index >> half_bits, index & mask
+    for r in range(_ROUNDS):
+        left, right = right, left ^ (_round(right, key >> (16 * r)) & mask)
+    return (left << half_bits) | right
+
+
+class DrillRotation:
+    """依 session 輪替抽題，回傳題目在 drill pool 中的 index"""
+
+    def __init__(self, max_sessions: int = 10000, idle_ttl_seconds: float = 1800):
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl_seconds
+        self._size = 0
+        self._half_bits = 0
+        self._sessions: OrderedDict[str, _Deck] = OrderedDict()
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._evictions = 0
+
+    def configure(self, max_sessions: int, idle_ttl_seconds: float):
+        self._max_sessions = max_sessions
+        self._idle_ttl = idle_ttl_seconds
+
+    def reset(self, size: int):
+        """題庫重新載入時呼叫：設定題數並清空所有 session"""
+        with self._lock:
+            self._size = size
+            self._half_bits = 0
+            while 1 << (2 * self._half_bits) < size:
+                self._half_bits += 1
+            self._sessions.clear()
+
+    def _shuffle(self, deck: _Deck):
+        """換一副新牌：新的 Feistel key，從序號 0 開始"""
+        deck.key = self._rng.getrandbits(16 * _ROUNDS + 48)
+        deck.index = 0
+        deck.drawn = 0
+
+    def draw(self, session_id: str) -> int:
+        """抽下一題（題庫為空時回傳 -1）"""
+        now = time.monotonic()
+        with self._lock:
+            if self._size == 0:
+                return -1
+
+            deck = self._sessions.get(session_id)
+            if deck is None:
+                deck = self._new_deck(now)
+                self._sessions[session_id] = deck
+            else:
+                self._sessions.move_to_end(session_id)
+
+            if deck.drawn >= self._size:
+                self._shuffle(deck)
+            deck.last_used = now
+            deck.drawn += 1
+
+            while True:
+                x = permute(deck.index, deck.key, self._half_bits)
+                deck.index += 1
+                if x < self._size:
+                    return x
+
+    def _new_deck(self, now: float) -> _Deck:
+        """建立新 session；先淘汰過期與超量的 session（LRU 順序）"""
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used < self._idle_ttl and len(self._sessions) < self._max_sessions:
+                break
+            self._sessions.popitem(last=False)
+            self._evictions += 1
+
+        deck = _Deck()
+        self._shuffle(deck)
+        return deck
+
+    def get_status(self) -> dict:
+        return {
+            'sessions': len(self._sessions),
+            'max_sessions': self._max_sessions,
+            'evictions': self._evictions,
+        }
@@ -0,0 +1,92 @@
+"""題庫回覆文字的組裝
+
+練習題與預建回應的最終回覆（英文、英文 + ---TRANSLATION--- 中文）在載入 JSON 題庫
+或編譯 bank.bin 時就組好，請求中只需依 index 取字串。
+"""
+
+from collections.abc import Callable, Sequence
+
+GRAMMAR_SEPARATOR = '---GRAMMAR---'
+TRANSLATION_SEPARATOR = '---TRANSLATION---'
+
+OFFLINE_NO_DRILLS = (
+    "I'm currently in offline mode and don't have practice exercises available. "
+    "Please try again later when the AI service is back online."
+)
+
+
+def render_drill(question: dict, drill_type: str) -> str:
+    """練習題的英文回覆：有 response 直接用，沒有就依題型格式化"""
+    if 'response' in question:
+        return question['response']
+    if drill_type == 'grammar_fill':
+        sentence = question.get('sentence', '')
+        options = question.get('options', [])
+        answer = question.get('answer', '')
+        opts_text = '\n'.join(f'{i+1}. {o}' for i, o in enumerate(options))
+        return (
+            f"Let's practice grammar! Fill in the blank:\n\n"
+            f"{sentence}\n\n{opts_text}\n\n"
+            f"(The correct answer is: {answer})"
+        )
+    elif drill_type == 'vocabulary':
+        prompt_text = question.get('prompt', '')
+        options = question.get('options', [])
+        answer = question.get('answer', '')
+        opts_text = '\n'.join(f'{i+1}. {o}' for i, o in enumerate(options))
+        return (
+            f"Vocabulary check!\n\n{prompt_text}\n\n{opts_text}\n\n"
+            f"(The correct answer is: {answer})"
+        )
+    elif drill_type == 'situational':
+        situation = question.get('situation', '')
+        example = question.get('example_response', '')
+        return (
+            f"Situational response practice:\n\n"
+            f"Situation: {situation}\n\n"
+            f"How would you respond?\n\n"
+            f"Example answer: {example}"
+        )
+    elif drill_type == 'pronunciation':
+        word = question.get('word', '')
+        tip = question.get('tip', '')
+        return (
+            f"Pronunciation practice:\n\n"
+            f"Word: {word}\n\n"
+            f"Tip: {tip}"
+        )
+    return 'Practice question not available.'
+
+
+def with_translation(reply: str, translation: str | None) -> str:
+    """如有翻譯則附加 ---TRANSLATION--- 區塊"""
+    if translation:
+        return f'{reply}\n\n{TRANSLATION_SEPARATOR}\n\n{translation}'
+    return reply
+
+
+def split_translation(reply: str, bilingual: str) -> str | None:
+    """with_translation 的反向：從雙語回覆取出翻譯，沒有翻譯時回傳 None"""
+    prefix = f'{reply}\n\n{TRANSLATION_SEPARATOR}\n\n'
+    return bilingual[len(prefix):] if bilingual.startswith(prefix) else None
+
+
+def render_pair(reply: str, entry: dict) -> tuple[str, str]:
+    """(英文回覆, 雙語回覆)"""
+    return reply, with_translation(reply, entry.get('response_zh'))
+
+
+class RenderedView(Sequence):
+    """對沒有預組文字的來源（舊版 bank.bin）在取值時才組字串"""
+
+    def __init__(self, records: Sequence[dict], render: Callable[[dict], str]):
+        self._records = records
+        self._render = render
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._render(self._records[i])
@@ -0,0 +1,377 @@
+"""離線文法檢查（規則式）
+
+GRAMMAR_MODE 下走題庫 fallback 時，原本完全沒有文法說明。這裡以預先編譯的規則
+抓學習者常見錯誤，產生 ---GRAMMAR--- 區段（繁中說明）：
+- 主詞動詞一致：he go / they goes / I is / people is
+- 助動詞後接原形：can speaks / didn't went
+- if 條件句用 will：if it will rain
+- 冠詞：a apple / an book / I am engineer
+- 介系詞搭配、不可數名詞複數等固定錯誤（查表）
+只涵蓋常見錯誤，不是完整的文法分析；一句話通常在數十微秒內檢查完。
+"""
+
+import re
+from collections.abc import Callable
+from typing import NamedTuple
+
+# 不會跟過去式混淆的常用動詞原形（put / read / let 等過去式同形的不列入）
+_VERBS = (
+    'go', 'do', 'have', 'want', 'like', 'need', 'work', 'live', 'think', 'know', 'make',
+    'take', 'say', 'get', 'come', 'see', 'look', 'use', 'find', 'give', 'tell', 'try',
+    'feel', 'play', 'study', 'watch', 'teach', 'fix', 'wash', 'love', 'hate', 'enjoy',
+    'prefer', 'speak', 'talk', 'walk', 'run', 'write', 'eat', 'drink', 'buy', 'pay',
+    'leave', 'meet', 'help', 'start', 'finish', 'call', 'ask', 'answer', 'believe',
+    'understand', 'remember', 'forget', 'seem', 'become', 'mean', 'keep', 'sleep',
+    'wake', 'drive', 'travel', 'visit', 'plan', 'hope', 'agree', 'stay', 'move', 'miss',
+)
+# 不規則過去式 → 原形
+_PAST_IRREGULAR = {
+    'went': 'go', 'did': 'do', 'had': 'have', 'made': 'make', 'took': 'take', 'said': 'say',
+    'got': 'get', 'came': 'come', 'saw': 'see', 'found': 'find', 'gave': 'give', 'told': 'tell',
+    'felt': 'feel', 'taught': 'teach', 'spoke': 'speak', 'ran': 'run', 'wrote': 'write',
+    'ate': 'eat', 'drank': 'drink', 'bought': 'buy', 'paid': 'pay', 'left': 'leave',
+    'met': 'meet', 'thought': 'think', 'knew': 'know', 'understood': 'understand',
+    'became': 'become', 'kept': 'keep', 'slept': 'sleep', 'woke': 'wake', 'drove': 'drive',
+}
+# 規則變化的過去式 → 原形（只收常見字，避免拆錯字尾）
+_PAST_REGULAR = {
+    'worked': 'work', 'wanted': 'want', 'liked': 'like', 'needed': 'need', 'played': 'play',
+    'studied': 'study', 'tried': 'try', 'finished': 'finish', 'started': 'start',
+    'watched': 'watch', 'visited': 'visit', 'lived': 'live', 'used': 'use', 'helped': 'help',
+    'asked': 'ask', 'answered': 'answer', 'called': 'call', 'talked': 'talk', 'walked': 'walk',
+    'stayed': 'stay', 'traveled': 'travel', 'travelled': 'travel', 'moved': 'move',
+    'decided': 'decide', 'changed': 'change', 'enjoyed': 'enjoy', 'loved': 'love',
+}
+_JOBS = (
+    'engineer', 'teacher', 'student', 'doctor', 'nurse', 'developer', 'designer', 'manager',
+    'programmer', 'accountant', 'lawyer', 'researcher', 'analyst', 'consultant', 'scientist',
+    'writer', 'artist', 'architect', 'intern', 'editor', 'translator', 'tester', 'freelancer',
+)
+# 主詞前一個字是這些時，後面的原形動詞是正確的，不做主詞動詞一致的修正：
+# - 助動詞（does he go / can it work）
+# - be 動詞與 have 倒裝的疑問句（is it like this? / what is it like?，like 是介系詞）
+# - 感官與使役動詞的受詞（let it go / I saw it go / have you seen it work）
+_BASE_FORM_CONTEXT = frozenset((
+    'do', 'does', 'did', 'can', 'could', 'will', 'would', 'should', 'shall', 'may', 'might',
+    'must', 'to', "don't", "doesn't", "didn't", "won't", "can't", "couldn't", "wouldn't",
+    "shouldn't", 'that',
+    'is', 'was', 'are', 'were', 'am', "isn't", "wasn't", 'has', 'have', 'had',
+    'let', 'lets', 'make', 'makes', 'made', 'help', 'helps', 'helped', 'see', 'sees', 'saw',
+    'seen', 'watch', 'watches', 'watched', 'hear', 'hears', 'heard', 'feel', 'feels', 'felt',
+    'notice', 'noticed',
+))
+# 以母音字母開頭但發子音的字（a university）與不發音的 h（an hour）；
+# un- 開頭的只列發 /ju/ 的字根，unimportant / uninterested 仍是母音
+_CONSONANT_SOUND_VOWELS = (
+    'univers', 'uniform', 'unique', 'unit', 'union', 'unicorn', 'unif', 'use', 'usu', 'usa',
+    'uti', 'ura', 'uro', 'eu', 'one', 'once', 'ubi',
+)
+_SILENT_H = ('hour', 'honest', 'honor', 'honour', 'heir')
+# 句中有這些過去時間詞時，he go 應該是 went 而不是 goes，不做主詞動詞一致的修正
+_PAST_TIME = re.compile(
+    r'\b(?:yesterday|ago|last\s+(?:night|week|weekend|month|year|time|semester|summer|winter|'
+    r'monday|tuesday|wednesday|thursday|friday|saturday|sunday)|the other day)\b',
+    re.IGNORECASE,
+)
+# 主詞前一個字是 and 時是複合主詞（my sister and he go），動詞用複數
+_COORDINATORS = frozenset(('and',))
+# if 子句由這些字帶出時是名詞子句（let me know if it will rain / I asked him if he will come），
+# will 是對的；中間可以隔一個受詞（代名詞或 the / my… + 名詞）
+_EMBEDDED_IF_CONTEXT = frozenset((
+    'know', 'knows', 'knew', 'ask', 'asks', 'asked', 'asking', 'wonder', 'wonders', 'wondered',
+    'wondering', 'see', 'check', 'tell', 'tells', 'told', 'telling', 'sure', 'unsure', 'idea',
+))
+_OBJECT_PRONOUNS = frozenset(('me', 'you', 'him', 'her', 'us', 'them'))
+_DETERMINERS = frozenset(('the', 'a', 'an', 'my', 'your', 'his', 'her', 'our', 'their'))
+# married with 後面是人時才是錯誤（married with children 是正確用法）
+_SPOUSES = (
+    'husband', 'wife', 'partner', 'boyfriend', 'girlfriend', 'fiance', 'fiancee', 'man', 'woman',
+    'guy', 'girl',
+) + _JOBS
+
+_NUMBERS = r'\d+|one|two|three|four|five|six|seven|eight|nine|ten|a few|several'
+
+
+class Correction(NamedTuple):
+    original: str
+    corrected: str
+    explanation: str
+
+
+def third_person(verb: str) -> str:
+    """原形 → 第三人稱單數現在式"""
+    irregular = {'have': 'has', 'do': 'does', 'go': 'goes', "don't": "doesn't"}
+    if verb in irregular:
+        return irregular[verb]
+    if verb.endswith(('s', 'sh', 'ch', 'x', 'z', 'o')):
+        return verb + 'es'
+    if verb.endswith('y') and verb[-2:-1] not in 'aeiou':
+        return verb[:-1] + 'ies'
+    return verb + 's'
+
+
+# 第三人稱單數 / 過去式 → 原形
+_BASE_FORMS = {third_person(v): v for v in _VERBS}
+_BASE_FORMS.update(_PAST_IRREGULAR)
+_BASE_FORMS.update(_PAST_REGULAR)
+
+
+def _alt(words) -> str:
+    return '|'.join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+
+
+def _previous_word(text: str, pos: int) -> str:
+    match = re.search(r"([\w']+)\W*$", text[:pos])
+    return match.group(1).lower() if match else ''
+
+
+def _previous_words(text: str, pos: int, count: int) -> list[str]:
+    """pos 之前、同一個子句內的最多 count 個字（由近到遠）"""
+    clause = re.split(r'[.,;:!?]', text[:pos])[-1]
+    return [w.lower() for w in re.findall(r"[\w']+", clause)[-count:]][::-1]
+
+
+def _vowel_sound(word: str) -> bool:
+    """字首是否發母音（決定用 a 或 an）"""
+    lower = word.lower()
+    if lower.startswith(_SILENT_H):
+        return True
+    if lower.startswith(_CONSONANT_SOUND_VOWELS):
+        return False
+    return lower[:1] in ('a', 'e', 'i', 'o', 'u')
+
+
+def _keep_case(original: str, corrected: str) -> str:
+    if original[:1].isupper() and corrected[:1].islower():
+        return corrected[:1].upper() + corrected[1:]
+    return corrected
+
+
+# 規則：(pattern, 產生修正的函式（回傳 None 表示不算錯誤）, 說明)
+_Fix = Callable[[re.Match, str], 'str | None']
+
+
+def _he_base_verb(m: re.Match, text: str) -> str | None:
+    previous = _previous_word(text, m.start())
+    if previous in _BASE_FORM_CONTEXT or previous in _COORDINATORS or _PAST_TIME.search(text):
+        return None
+    return f'{m.group(1)} {third_person(m.group(2).lower())}'
+
+
+def _he_are(m: re.Match, text: str) -> str | None:
+    verb = m.group(2).lower()
+    if verb == 'were' and _previous_word(text, m.start()) in ('if', 'wish', 'though'):
+        return None  # 假設語氣 if he were
+    return f"{m.group(1)} {'is' if verb == 'are' else 'was'}"
+
+
+def _plural_subject_verb(m: re.Match, text: str) -> str | None:
+    subject, verb = m.group(1), m.group(2).lower()
+    if verb == 'was':
+        if subject.lower() == 'i' or _previous_word(text, m.start()) in ('if', 'wish'):
+            return None
+        return f'{subject} were'
+    if _previous_word(text, m.start()) in _COORDINATORS:
+        return None  # my sister and I is → are，不是 am
+    if verb == 'is':
+        return f"{subject} {'am' if subject.lower() == 'i' else 'are'}"
+    if _PAST_TIME.search(text):
+        return None  # they goes yesterday → went，不是 go
+    return f'{subject} {_BASE_FORMS[verb]}'
+
+
+def _auxiliary_base(m: re.Match, text: str) -> str | None:
+    return f'{m.group(1)} {_BASE_FORMS[m.group(2).lower()]}'
+
+
+def _embedded_if(text: str, pos: int) -> bool:
+    """pos 的 if 是否由 ask / tell / know / wonder 等字帶出（可隔一個受詞）"""
+    words = _previous_words(text, pos, 3)
+    if words[:1] and words[0] in _OBJECT_PRONOUNS:
+        words = words[1:]
+    elif len(words) >= 2 and words[1] in _DETERMINERS:
+        words = words[2:]
+    return bool(words) and words[0] in _EMBEDDED_IF_CONTEXT
+
+
+def _if_will(m: re.Match, text: str) -> str | None:
+    if _embedded_if(text, m.start()):
+        return None
+    subject, verb = m.group(1), m.group(2).lower()
+    singular = subject.lower() in ('he', 'she', 'it')
+    if verb == 'be':
+        present = 'am' if subject.lower() == 'i' else 'is' if singular else 'are'
+    else:
+        present = third_person(verb) if singular else verb
+    return f'if {subject} {present}'
+
+
+def _a_vowel(m: re.Match, text: str) -> str | None:
+    word = m.group(2)
+    if word.isupper() or not _vowel_sound(word):
+        return None
+    return f"{'An' if m.group(1) == 'A' else 'an'} {word}"
+
+
+def _an_consonant(m: re.Match, text: str) -> str | None:
+    word = m.group(2)
+    if word.isupper() or _vowel_sound(word):
+        return None
+    return f"{'A' if m.group(1) == 'An' else 'a'} {word}"
+
+
+def _job_article(m: re.Match, text: str) -> str | None:
+    job = m.group(2)
+    return f"{m.group(1)} {'an' if _vowel_sound(job) else 'a'} {job}"
+
+
+def _template(replacement: str) -> _Fix:
+    return lambda m, text: m.expand(replacement)
+
+
+_UNCOUNTABLE = {
+    'informations': 'information', 'advices': 'advice', 'furnitures': 'furniture',
+    'equipments': 'equipment', 'homeworks': 'homework', 'knowledges': 'knowledge',
+    'feedbacks': 'feedback', 'luggages': 'luggage', 'researches': 'research',
+}
+
+_RULES: list[tuple[re.Pattern, _Fix, str]] = [
+    (rf"\b(he|she|it)\s+({_alt(_VERBS)}|don't)\b", _he_base_verb,
+     '主詞是第三人稱單數（he / she / it），現在式動詞要加 -s / -es，否定用 doesn\'t。'),
+    (r'\b(he|she|it)\s+(are|were)\b', _he_are,
+     '第三人稱單數主詞搭配 is / was。'),
+    (rf"\b(I|you|we|they)\s+({_alt(third_person(v) for v in _VERBS)}|doesn't|is|was)\b",
+     _plural_subject_verb,
+     '主詞是 I / you / we / they 時，動詞用原形（I 用 am，you / we / they 用 are / were）。'),
+    (r'\bpeople\s+(is|was)\b',
+     lambda m, text: f"people {'are' if m.group(1).lower() == 'is' else 'were'}",
+     'people 是複數，動詞用 are / were。'),
+    (r'\b(everyone|everybody|someone|somebody|nobody|no one)\s+are\b',
+     _template(r'\1 is'),
+     'everyone / somebody 等不定代名詞視為單數，動詞用 is。'),
+    (rf'\bthere\s+is\s+(many|two|three|four|five|several|\d+)\b', _template(r'there are \1'),
+     'there is / are 依後面名詞的單複數決定，複數用 there are。'),
+    (rf"\b(can|could|should|will|would|must|may|might)\s+({_alt(_BASE_FORMS)})\b", _auxiliary_base,
+     '助動詞（can / should / will…）後面接原形動詞。'),
+    (rf"\b(didn't|did not|doesn't|does not|don't|do not)\s+({_alt(_BASE_FORMS)})\b", _auxiliary_base,
+     'do / does / did 之後接原形動詞，時態由助動詞表示。'),
+    (rf"\b(did (?:I|you|he|she|it|we|they))\s+({_alt(_PAST_IRREGULAR)}|{_alt(_PAST_REGULAR)})\b",
+     _auxiliary_base,
+     '疑問句已用 did 表示過去，主要動詞用原形。'),
+    (r'\bif\s+(I|you|we|they|he|she|it)\s+will\s+([a-z]+)\b', _if_will,
+     '表示條件的 if 子句用現在式表達未來，不用 will。'),
+    (r'\b(a|A)\s+([aeiouhAEIOUH][a-zA-Z]*)\b', _a_vowel,
+     '後面的字以母音發音開頭，冠詞用 an。'),
+    (r'\b(an|An)\s+([a-zA-Z]+)\b', _an_consonant,
+     '後面的字以子音發音開頭，冠詞用 a。'),
+    (rf"\b(I am|I'm|he is|she is|he's|she's|my \w+ is)\s+({_alt(_JOBS)})\b", _job_article,
+     '單數可數名詞（職業）前面要加冠詞 a / an。'),
+    (rf"\bmarried\s+with\b(?=\s+(?:him|her|them|(?:a|an|my|his|her|the)\s+(?:{_alt(_SPOUSES)})\b))",
+     _template('married to'),
+     '和某人結婚是 be married to。'),
+    (r'\b(depend|depends|depended|depending)\s+of\b', _template(r'\1 on'),
+     'depend 後面接 on。'),
+    (r'\binterested\s+(?:about|for|on)\b', _template('interested in'),
+     '對…有興趣是 interested in。'),
+    (r'\b(good|bad)\s+in\s+(\w+ing)\b', _template(r'\1 at \2'),
+     '擅長 / 不擅長做某事用 good / bad at + V-ing。'),
+    (r'\b(arrive|arrives|arrived|arriving)\s+to\b', _template(r'\1 at'),
+     '抵達用 arrive at（地點）或 arrive in（城市、國家），不用 to。'),
+    (r'\b(discuss|discusses|discussed|discussing)\s+about\b', _template(r'\1'),
+     'discuss 是及物動詞，後面直接接受詞，不加 about。'),
+    (r'\b(explain|explains|explained)\s+me\b', _template(r'\1 to me'),
+     'explain 後面不能直接接人，要說 explain (something) to me。'),
+    (r'\b(listen|listens|listened|listening)\s+(music|the radio|podcasts?|him|her|me|them|you)\b',
+     _template(r'\1 to \2'),
+     'listen 後面接受詞要加 to。'),
+    (r'\bresponsible\s+of\b', _template('responsible for'),
+     '負責…是 responsible for。'),
+    (r'\bafraid\s+from\b', _template('afraid of'),
+     '害怕…是 afraid of。'),
+    (r'\bon\s+the\s+(morning|afternoon|evening)\b(?!\s+of\b)', _template(r'in the \1'),
+     '早上 / 下午 / 晚上用 in the morning；只有特定日期才用 on（on the morning of May 1）。'),
+    (rf'\bsince\s+({_NUMBERS})\s+(years?|months?|weeks?|days?|hours?)\b', _template(r'for \1 \2'),
+     '一段時間用 for；since 後面接起始的時間點（since 2020）。'),
+    (r'\b(look|looks|looking)\s+forward\s+to\s+(meet|see|hear|work|talk|speak|join)\b',
+     _template(r'\1 forward to \2ing'),
+     'look forward to 的 to 是介系詞，後面接 V-ing。'),
+    (r"\b(?:I am|I'm)\s+agree\b", _template('I agree'),
+     'agree 本身是動詞，不需要 be 動詞。'),
+    (r'\bmore\s+(better|worse|easier|harder|faster|bigger|smaller|cheaper)\b', _template(r'\1'),
+     '比較級已經表示「更」，不再加 more。'),
+    (rf'\b({_alt(_UNCOUNTABLE)})\b', lambda m, text: _UNCOUNTABLE[m.group(1).lower()],
+     '這是不可數名詞，沒有複數形。'),
+    (r'\bI\s+have\s+(\d+)\s+years\s+old\b', _template(r'I am \1 years old'),
+     '表達年齡用 be 動詞：I am 25 years old。'),
+    (r'\bdo\s+(a|many|some|a lot of|the same)\s+(mistakes?)\b', _template(r'make \1 \2'),
+     '犯錯是 make a mistake。'),
+    (r'\baccording\s+to\s+me\b', _template('in my opinion'),
+     'according to 用來引述別人或資料，表達自己的看法用 in my opinion。'),
+    (r'\b(return|returns|returned)\s+back\b', _template(r'\1'),
+     'return 已有「回來」的意思，不加 back。'),
+    (r'\b(emphasize|emphasizes|emphasized)\s+on\b', _template(r'\1'),
+     'emphasize 是及物動詞，不加 on（名詞才說 put emphasis on）。'),
+    (r'\b(reach|reached)\s+to\b', _template(r'\1'),
+     'reach 是及物動詞，後面直接接地點。'),
+    (r'\bcan\s+able\s+to\b', _template('can'),
+     'can 與 be able to 意思相同，擇一使用。'),
+    (r'\bvery\s+like\b', _template('really like'),
+     '修飾動詞 like 用 really，或說 like it very much。'),
+]
+
+
+class GrammarChecker:
+    """以預編譯規則檢查一段英文"""
+
+    def __init__(self):
+        self._rules = [
+            (re.compile(pattern, re.IGNORECASE), fix, explanation)
+            for pattern, fix, explanation in _RULES
+        ]
+
+    def _scan(self, text: str) -> list[tuple[int, int, Correction]]:
+        """(start, end, 修正)，依位置排序且互不重疊（同位置取較長的）"""
+        found: list[tuple[int, int, Correction]] = []
+        for pattern, fix, explanation in self._rules:
+            for m in pattern.finditer(text):
+                corrected = fix(m, text)
+                if corrected is None or corrected == m.group(0):
+                    continue
+                found.append((m.start(), m.end(), Correction(
+                    m.group(0), _keep_case(m.group(0), corrected), explanation,
+                )))
+        found.sort(key=lambda item: (item[0], -item[1]))
+
+        result: list[tuple[int, int, Correction]] = []
+        for item in found:
+            if not result or item[0] >= result[-1][1]:
+                result.append(item)
+        return result
+
+    def check(self, text: str) -> list[Correction]:
+        """回傳依出現位置排序的修正"""
+        return [c for _, _, c in self._scan(text)]
+
+    def corrected_text(self, text: str) -> tuple[str, list[Correction]]:
+        """(套用全部修正後的句子, 修正列表)"""
+        spans = self._scan(text)
+        parts, pos = [], 0
+        for start, end, c in spans:
+            parts.append(text[pos:start])
+            parts.append(c.corrected)
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts), [c for _, _, c in spans]
+
+    def notes(self, text: str) -> str:
+        """---GRAMMAR--- 區段內容（繁中說明）"""
+        corrected, corrections = self.corrected_text(text)
+        if not corrections:
+            return '沒有發現常見的文法錯誤。（離線模式只檢查常見錯誤）'
+        lines = [f'- "{c.original}" → "{c.corrected}"：{c.explanation}' for c in corrections]
+        lines.append(f'\n建議改為：{corrected}')
+        return '\n'.join(lines)
+
+
+# 全域單例
+grammar_checker = GrammarChecker()
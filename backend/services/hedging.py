@@ -0,0 +1,170 @@
+"""上游呼叫的 deadline 與 hedged request
+
+SDK 預設 timeout 長達數分鐘，一條卡住的連線會讓請求一直掛著。這裡：
+- 整個請求有總 deadline，超過就丟 asyncio.TimeoutError（由呼叫端改走 fallback）
+- 第一個 attempt 跑超過近期 p95 延遲仍未完成時，再送一個 hedge，誰先回來用誰，輸的取消
+- hedge 從預算扣：每個請求累積 budget_ratio 個 token（預設 5%），送一次 hedge 花 1 個，
+  額外呼叫量最多約為總請求數的 budget_ratio
+- 每個 attempt 自己的 timeout 由呼叫端包在 attempt 裡（才能算進 admission 的壅塞訊號）
+
+串流另外提供 iter_with_timeouts：第一個 token 與之後每段 delta 都有等待上限，
+串流已經送出內容後無法換成另一個 attempt，所以不做 hedge。
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import TypeVar
+
+from services.admission import AdmissionRejected
+
+T = TypeVar('T')
+
+# 估 p95 前至少要有的樣本數
+_MIN_SAMPLES = 20
+_WINDOW_SIZE = 500
+# hedge 時機用的 p95 最多多久重算一次（不在每個請求都排序整個時間窗）
+_P95_REFRESH_SECONDS = 1.0
+# 預算最多累積的 hedge 數（避免長時間沒 hedge 後一次爆量）
+_MAX_BUDGET = 10.0
+
+
+def _percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+class HedgedCaller:
+    def __init__(self, deadline_seconds: float = 30, budget_ratio: float = 0.05,
+                 min_hedge_delay_seconds: float = 1.0):
+        self._deadline = deadline_seconds
+        self._budget_ratio = budget_ratio
+        self._min_hedge_delay = min_hedge_delay_seconds
+        self._budget = 0.0
+        # 單一 attempt 成功時的延遲（決定 hedge 時機）與實際回給請求的延遲
+        self._attempt_latencies: deque[float] = deque(maxlen=_WINDOW_SIZE)
+        self._served_latencies: deque[float] = deque(maxlen=_WINDOW_SIZE)
+        self._attempt_p95 = 0.0
+        self._attempt_p95_at = float('-inf')
+        self._counters = {
+            'requests': 0, 'hedges': 0, 'hedge_wins': 0, 'primary_wins_after_hedge': 0,
+            'budget_denied': 0, 'hedge_shed': 0, 'attempt_timeouts': 0, 'deadline_exceeded': 0,
+        }
+
+    def configure(self, deadline_seconds: float, budget_ratio: float, min_hedge_delay_seconds: float):
+        self._deadline = deadline_seconds
+        self._budget_ratio = budget_ratio
+        self._min_hedge_delay = min_hedge_delay_seconds
+
+    def _hedge_delay(self) -> float | None:
+        """何時送 hedge（相對請求開始的秒數）；樣本不足或關閉時回傳 None"""
+        if self._budget_ratio <= 0 or len(self._attempt_latencies) < _MIN_SAMPLES:
+            return None
+        now = time.monotonic()
+        if now - self._attempt_p95_at >= _P95_REFRESH_SECONDS:
+            self._attempt_p95 = _percentile(self._attempt_latencies, 0.95)
+            self._attempt_p95_at = now
+        return max(self._attempt_p95, self._min_hedge_delay)
+
+    async def _attempt(self, factory: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await factory()
+        self._attempt_latencies.append(time.monotonic() - start)
+        return result
+
+    async def call(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        hedge: Callable[[], Awaitable[T]] | None = None,
+    ) -> T:
+        """執行 primary；需要時在 p95 延遲後加送 hedge，回傳先成功的結果"""
+        start = time.monotonic()
+        deadline = start + self._deadline
+        self._counters['requests'] += 1
+        self._budget = min(self._budget + self._budget_ratio, _MAX_BUDGET)
+        hedge_delay = self._hedge_delay() if hedge is not None else None
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+
+        tasks: dict[asyncio.Task, str] = {asyncio.ensure_future(self._attempt(primary)): 'primary'}
+        hedged = False
+        last_error: BaseException | None = None
+        try:
+            while tasks:
+                now = time.monotonic()
+                if now >= deadline:
+                    self._counters['deadline_exceeded'] += 1
+                    raise asyncio.TimeoutError(f'upstream deadline {self._deadline}s exceeded')
+                wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+                done, _ = await asyncio.wait(
+                    tasks, timeout=max(wake - now, 0), return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                for task in done:
+                    role = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if role == 'hedge':
+                            self._counters['hedge_wins'] += 1
+                        elif hedged:
+                            self._counters['primary_wins_after_hedge'] += 1
+                        self._served_latencies.append(time.monotonic() - start)
+                        return task.result()
+                    if isinstance(error, asyncio.TimeoutError):
+                        self._counters['attempt_timeouts'] += 1
+                    if role == 'hedge' and isinstance(error, AdmissionRejected):
+                        # hedge 拿不到名額就算了，繼續等 primary
+                        self._counters['hedge_shed'] += 1
+                        continue
+                    last_error = error
+
+                if hedge_at is not None and tasks and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if self._budget >= 1:
+                        self._budget -= 1
+                        hedged = True
+                        self._counters['hedges'] += 1
+                        tasks[asyncio.ensure_future(self._attempt(hedge))] = 'hedge'
+                    else:
+                        self._counters['budget_denied'] += 1
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+                # 取消的 attempt 結果不再需要，避免 "exception was never retrieved"
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def get_status(self) -> dict:
+        requests = self._counters['requests']
+        hedges = self._counters['hedges']
+        return {
+            'deadline_seconds': self._deadline,
+            'budget_ratio': self._budget_ratio,
+            'hedge_delay_ms': round((self._hedge_delay() or 0) * 1000, 1),
+            **self._counters,
+            'hedge_rate': round(hedges / requests, 4) if requests else 0.0,
+            'hedge_win_rate': round(self._counters['hedge_wins'] / hedges, 3) if hedges else 0.0,
+            # attempt_p99 只含完成的 attempt（被取消的慢 primary 不計，實際未 hedge 的尾端只會更長），
+            # 與 served_p99 一起看 hedge 後的尾端延遲；hedge 省下多少以 hedge_budget_ratio=0 對照量測
+            'attempt_p99_ms': round(_percentile(self._attempt_latencies, 0.99) * 1000, 1),
+            'served_p99_ms': round(_percentile(self._served_latencies, 0.99) * 1000, 1),
+        }
+
+
+async def iter_with_timeouts(
+    source: AsyncIterator[T], first_timeout: float, idle_timeout: float,
+) -> AsyncIterator[T]:
+    """逐一取出 source 的項目；第一項等超過 first_timeout、之後兩項間隔超過 idle_timeout 就丟 TimeoutError"""
+    iterator = source.__aiter__()
+    timeout = first_timeout
+    while True:
+        try:
+            item = await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        yield item
+        timeout = idle_timeout
+
+
+# 全域單例
+upstream_hedger = HedgedCaller()
@@ -0,0 +1,91 @@
+"""HTTP 條件請求與壓縮協商的小工具
+
+- ETag / If-None-Match 比對
+- 依 Accept-Encoding 從預先壓好的版本中挑一個（br 優先，其次 gzip）
+- 動態內容的壓縮協商（較低的壓縮等級，換取每個請求的 CPU 時間）
+
+brotli 為選用依賴：未安裝時只提供 gzip。
+"""
+
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 選用依賴
+    brotli = None
+
+# 偏好順序
+ENCODINGS = ('br', 'gzip')
+# 每個請求現壓的內容用的等級（預先壓好的內容用最高等級）
+FAST_LEVELS = {'br': 5, 'gzip': 6}
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match（可能是逗號分隔的多個值或 *）是否包含 etag（弱比對）"""
+    if not if_none_match:
+        return False
+    target = etag.removeprefix('W/')
+    tags = [t.strip().removeprefix('W/') for t in if_none_match.split(',')]
+    return '*' in tags or target in tags
+
+
+def accepted_encodings(accept_encoding: str | None) -> set[str]:
+    """Accept-Encoding 中可接受（q > 0）的編碼"""
+    accepted: set[str] = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(name)
+    if '*' in accepted:
+        accepted.update(ENCODINGS)
+    return accepted
+
+
+def available_encodings() -> tuple[str, ...]:
+    return ENCODINGS if brotli is not None else tuple(e for e in ENCODINGS if e != 'br')
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """用戶端接受且本機支援的編碼中最偏好的一個；都不接受時回傳 None"""
+    accepted = accepted_encodings(accept_encoding)
+    return next((e for e in available_encodings() if e in accepted), None)
+
+
+def compress(data: bytes, encoding: str, fast: bool = False) -> bytes:
+    """壓縮；預設最高壓縮率（只適合一次壓好、重複送出的內容），fast 用 FAST_LEVELS"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=FAST_LEVELS['br'] if fast else 11)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=FAST_LEVELS['gzip'] if fast else 9, mtime=0)
+    raise ValueError(f'不支援的編碼: {encoding}')
+
+
+class Precompressed:
+    """同一份內容的原始與預先壓縮版本"""
+
+    __slots__ = ('raw', 'encoded')
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.encoded = {encoding: compress(raw, encoding) for encoding in available_encodings()}
+
+    def pick(self, accept_encoding: str | None) -> tuple[bytes, str | None]:
+        """(要送出的 bytes, Content-Encoding)；用戶端都不接受時回傳原始內容"""
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return self.raw, None
+        return self.encoded[encoding], encoding
+
+    def sizes(self) -> dict[str, int]:
+        return {'raw': len(self.raw), **{e: len(b) for e, b in self.encoded.items()}}
@@ -0,0 +1,125 @@
+"""API JSON 回應的快速路徑
+
+- 伺服器自己組的回應（結構已知合法）不經 pydantic 驗證與 jsonable_encoder，
+  直接編成 bytes（有 orjson 用 orjson）
+- 題庫 fallback 的回覆來自有限的預組文字：編好的 body 與各編碼的壓縮結果依回覆字串快取，
+  同一則回覆只編碼 / 壓縮一次（含文法說明的回覆每則不同，不走這條路）
+- 依 Accept-Encoding 協商 br / gzip；小於門檻的 body 不壓（省下的位元組抵不過 CPU 與標頭）
+
+orjson 為選用依賴：未安裝時改用標準函式庫 json（輸出相同）。
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+from fastapi import Response
+
+from services.http_cache import compress, negotiate
+from services.metrics import response_bytes
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 選用依賴
+    orjson = None
+
+# 快取多少則不同的 fallback 回覆（每則含原始 body 與用到的壓縮版本）
+_REPLY_CACHE_CAPACITY = 1024
+
+
+def dumps(obj) -> bytes:
+    """JSON bytes（不跳脫非 ASCII，無多餘空白）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class JSONResponder:
+    """把 dict / 回覆字串編成（可能壓縮過的）Response"""
+
+    def __init__(self):
+        self.compression_enabled = True
+        self.min_bytes = 1024
+        self._lock = threading.Lock()
+        # 回覆字串 → {None: 原始 body, 編碼: 壓縮後 body}
+        self._replies: OrderedDict[str, dict[str | None, bytes]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._raw_bytes = 0
+        self._sent_bytes = 0
+
+    def configure(self, compression_enabled: bool, min_bytes: int):
+        self.compression_enabled = compression_enabled
+        self.min_bytes = max(0, min_bytes)
+
+    def _encoding(self, size: int, accept_encoding: str | None) -> str | None:
+        if not self.compression_enabled or size < self.min_bytes:
+            return None
+        return negotiate(accept_encoding)
+
+    def _response(self, raw: bytes, body: bytes, encoding: str | None, headers: dict | None) -> Response:
+        headers = dict(headers or {})
+        if self.compression_enabled:
+            headers['Vary'] = 'Accept-Encoding'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+            # 壓縮後與原始內容位元組不同，強 ETag 改成弱 ETag（If-None-Match 本來就是弱比對）
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f'W/{etag}'
+        with self._lock:
+            self._raw_bytes += len(raw)
+            self._sent_bytes += len(body)
+        response_bytes.labels(encoding or 'identity').inc(len(body))
+        return Response(body, media_type='application/json', headers=headers)
+
+    def render(self, obj, accept_encoding: str | None, headers: dict | None = None) -> Response:
+        """一次性的內容（API 回覆、查詢結果）：編碼後視大小現壓"""
+        raw = dumps(obj)
+        encoding = self._encoding(len(raw), accept_encoding)
+        body = compress(raw, encoding, fast=True) if encoding else raw
+        return self._response(raw, body, encoding, headers)
+
+    def reply(self, reply: str, accept_encoding: str | None) -> Response:
+        """題庫 fallback 的 {"reply": ...}：body 與壓縮結果依回覆快取
+
+        只給內容完全來自題庫的回覆用；含使用者相關內容（文法說明）的回覆幾乎不會重複，
+        放進來只會用最高壓縮等級白壓一次、把可重用的回覆擠出快取，改用 render()。
+        """
+        with self._lock:
+            entry = self._replies.get(reply)
+            if entry is None:
+                self._misses += 1
+                entry = {None: dumps({'reply': reply})}
+                self._replies[reply] = entry
+                if len(self._replies) > _REPLY_CACHE_CAPACITY:
+                    self._replies.popitem(last=False)
+            else:
+                self._hits += 1
+                self._replies.move_to_end(reply)
+        raw = entry[None]
+        encoding = self._encoding(len(raw), accept_encoding)
+        body = raw
+        if encoding:
+            body = entry.get(encoding)
+            if body is None:
+                # 會重複送出，用最高壓縮率；多個請求同時壓到同一則只是重工，結果相同
+                body = entry[encoding] = compress(raw, encoding)
+        return self._response(raw, body, encoding, None)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'serializer': 'orjson' if orjson is not None else 'json',
+                'compression': self.compression_enabled,
+                'min_bytes': self.min_bytes,
+                'cached_replies': len(self._replies),
+                'reply_cache_hit_rate': round(self._hits / lookups, 3) if lookups else None,
+                'raw_bytes': self._raw_bytes,
+                'sent_bytes': self._sent_bytes,
+            }
+
+
+# 全域單例
+json_responses = JSONResponder()
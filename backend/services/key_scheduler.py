@@ -0,0 +1,259 @@
+"""per-API-key 公平排程與配額
+
+所有 Claude 呼叫共用同一個上游並發上限（services/admission.py）。沒有隔離時，
+一個狂送請求的班級（同一把 key）就能佔滿名額與上游的速率限制，其他人一起變慢。
+這裡在取得上游名額之前先過每把 key 自己的關卡：
+
+- 配額：每把 key 兩個 token bucket，每分鐘請求數（RPM）與估計 token 數（TPM）。
+  以預約方式扣：不夠時算出要等多久，超過可等待時間就不扣、直接改走題庫；
+  回應後依實際用量多退少補
+- 公平：排隊等上游名額時依 start-time fair queuing 的 finish tag 排序
+  （tag = max(虛擬時間, 這把 key 上一個 tag) + 估計 token / 權重），
+  量大的 key 只會排在自己後面，不會擋住其他 key
+- 排隊上限：每把 key 同時在等的請求數有上限，超過直接改走題庫
+
+env key（沒帶 X-Api-Key 的請求）視為一把 key，可另外設定配額與權重。
+狀態中的 key 只顯示 hash 前綴。
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+
+from services.admission import AdaptiveLimiter, AdmissionRejected, Permit, upstream_limiter
+
+ENV_KEY_ID = 'env'
+
+# 最多記住多少把 key 的狀態（超過時淘汰最久沒用、且沒有排隊中請求的）
+_MAX_KEYS = 4096
+_WAIT_EWMA_ALPHA = 0.1
+
+
+class Throttled(AdmissionRejected):
+    """超過這把 key 的配額或排隊上限，改走 fallback"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason  # rpm / tpm / queue_full
+
+
+def key_id(api_key: str | None) -> str:
+    if not api_key:
+        return ENV_KEY_ID
+    return 'key-' + hashlib.sha256(api_key.encode()).hexdigest()[:10]
+
+
+def _text_length(content) -> int:
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(block.get('text', '')) for block in content if isinstance(block, dict))
+    return 0
+
+
+def estimate_tokens(params: dict) -> int:
+    """一次呼叫的估計 token 數：輸入約 4 字元 = 1 token，加上 max_tokens"""
+    chars = _text_length(params.get('system', ''))
+    chars += sum(_text_length(m.get('content', '')) for m in params.get('messages', []))
+    return chars // 4 + params.get('max_tokens', 0)
+
+
+def usage_tokens(usage) -> int:
+    """實際計入配額的 token（cache read 不算）"""
+    return sum(
+        getattr(usage, kind, None) or 0
+        for kind in ('input_tokens', 'cache_creation_input_tokens', 'output_tokens')
+    )
+
+
+class TokenBucket:
+    """每分鐘 per_minute 的 token bucket，容量為一分鐘的量；可預約（餘額可為負）"""
+
+    __slots__ = ('capacity', 'rate', 'level', 'updated')
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserved(self, amount: float) -> float:
+        """預約 amount 實際扣的量（單次超過容量時以容量計，否則永遠等不到）"""
+        return min(amount, self.capacity)
+
+    def delay(self, amount: float, now: float) -> float:
+        """扣 amount 需要等的秒數"""
+        self._refill(now)
+        short = self.reserved(amount) - self.level
+        return short / self.rate if short > 0 else 0.0
+
+    def take(self, amount: float) -> float:
+        """扣掉 amount，回傳實際扣的量"""
+        taken = self.reserved(amount)
+        self.level -= taken
+        return taken
+
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _KeyState:
+    __slots__ = (
+        'id', 'weight', 'requests', 'tokens', 'finish', 'pending',
+        'admitted', 'throttled', 'timed_out', 'wait_ms', 'last_used',
+    )
+
+    def __init__(self, kid: str, weight: float, rpm: int, tpm: int):
+        self.id = kid
+        self.weight = weight
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.finish = 0.0
+        self.pending = 0
+        self.admitted = 0
+        self.throttled = {'rpm': 0, 'tpm': 0, 'queue_full': 0}
+        self.timed_out = 0
+        self.wait_ms = 0.0
+        self.last_used = time.monotonic()
+
+    def get_status(self) -> dict:
+        now = time.monotonic()
+        status = {
+            'weight': self.weight,
+            'pending': self.pending,
+            'admitted': self.admitted,
+            'throttled': dict(self.throttled),
+            'timed_out': self.timed_out,
+            'avg_wait_ms': round(self.wait_ms, 1),
+        }
+        for name, bucket in (('rpm', self.requests), ('tpm', self.tokens)):
+            if bucket is not None:
+                bucket._refill(now)
+                status[f'{name}_limit'] = int(bucket.capacity)
+                status[f'{name}_available'] = int(bucket.level)
+        return status
+
+
+class KeyScheduler:
+    def __init__(self, limiter: AdaptiveLimiter):
+        self._limiter = limiter
+        self._keys: OrderedDict[str, _KeyState] = OrderedDict()
+        self._vtime = 0.0
+        self._key_rpm = 0
+        self._key_tpm = 0
+        self._env_rpm = 0
+        self._env_tpm = 0
+        self._env_weight = 1.0
+        self._max_pending = 8
+
+    def configure(self, key_rpm: int, key_tpm: int, env_rpm: int, env_tpm: int,
+                  env_weight: float, max_pending: int):
+        """limit 為 0 表示不限；設定變更後既有 key 的狀態重建"""
+        self._key_rpm, self._key_tpm = key_rpm, key_tpm
+        self._env_rpm, self._env_tpm = env_rpm, env_tpm
+        self._env_weight = max(env_weight, 0.01)
+        self._max_pending = max(1, max_pending)
+        self._keys.clear()
+
+    def _state(self, api_key: str | None) -> _KeyState:
+        kid = key_id(api_key)
+        state = self._keys.get(kid)
+        if state is None:
+            if kid == ENV_KEY_ID:
+                state = _KeyState(kid, self._env_weight, self._env_rpm, self._env_tpm)
+            else:
+                state = _KeyState(kid, 1.0, self._key_rpm, self._key_tpm)
+            self._keys[kid] = state
+            self._evict()
+        else:
+            self._keys.move_to_end(kid)
+        state.last_used = time.monotonic()
+        return state
+
+    def _evict(self):
+        if len(self._keys) <= _MAX_KEYS:
+            return
+        for kid in [k for k, s in self._keys.items() if s.pending == 0][:len(self._keys) - _MAX_KEYS]:
+            del self._keys[kid]
+
+    async def acquire(self, api_key: str | None, cost: int, wait: float) -> Permit:
+        """過這把 key 的配額與公平排隊後取得上游名額；最多等 wait 秒
+
+        超過配額或排隊上限丟 Throttled，等不到上游名額丟 AdmissionRejected（都改走題庫）。
+        """
+        state = self._state(api_key)
+        if state.pending >= self._max_pending:
+            state.throttled['queue_full'] += 1
+            raise Throttled('queue_full')
+
+        now = time.monotonic()
+        delay = 0.0
+        for name, bucket, amount in (('rpm', state.requests, 1), ('tpm', state.tokens, cost)):
+            if bucket is None:
+                continue
+            needed = bucket.delay(amount, now)
+            if needed > wait:
+                state.throttled[name] += 1
+                raise Throttled(name)
+            delay = max(delay, needed)
+        if state.requests is not None:
+            state.requests.take(1)
+        taken = state.tokens.take(cost) if state.tokens is not None else 0
+
+        start = max(self._vtime, state.finish)
+        finish = start + max(cost, 1) / state.weight
+        state.finish = finish
+        state.pending += 1
+        try:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            permit = await self._limiter.acquire(wait - delay, priority=finish)
+        except BaseException as e:
+            # 沒送出去：退回預約的配額，tag 也退回（後面沒有更新的 tag 時）
+            if state.requests is not None:
+                state.requests.refund(1)
+            if state.tokens is not None:
+                state.tokens.refund(taken)
+            if state.finish == finish:
+                state.finish = start
+            if isinstance(e, AdmissionRejected):
+                state.timed_out += 1
+            raise
+        finally:
+            state.pending -= 1
+
+        self._vtime = max(self._vtime, start)
+        state.admitted += 1
+        waited_ms = (time.monotonic() - now) * 1000
+        state.wait_ms += _WAIT_EWMA_ALPHA * (waited_ms - state.wait_ms)
+        return permit
+
+    def settle(self, api_key: str | None, cost: int, usage):
+        """回應後以實際用量修正 TPM 的預約（多退少補，以 acquire 時實際扣的量為準）"""
+        state = self._keys.get(key_id(api_key))
+        if state is None or state.tokens is None or usage is None:
+            return
+        state.tokens.refund(state.tokens.reserved(cost) - usage_tokens(usage))
+
+    def get_status(self) -> dict:
+        keys = sorted(self._keys.values(), key=lambda s: s.last_used, reverse=True)
+        return {
+            'key_rpm_limit': self._key_rpm,
+            'key_tpm_limit': self._key_tpm,
+            'env_rpm_limit': self._env_rpm,
+            'env_tpm_limit': self._env_tpm,
+            'max_pending_per_key': self._max_pending,
+            'tracked_keys': len(keys),
+            'pending': sum(s.pending for s in keys),
+            # 最近用過的前 50 把
+            'keys': {s.id: s.get_status() for s in keys[:50]},
+        }
+
+
+# 全域單例
+key_scheduler = KeyScheduler(upstream_limiter)
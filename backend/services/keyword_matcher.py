@@ -0,0 +1,83 @@
+"""預建回應 keyword 匹配（Aho–Corasick）
+
+load() 時把每個場景的全部 keyword 編譯成一個自動機，
+查詢時只掃描訊息一次，回傳「第一個有 keyword 命中的 entry」的 index，
+與原本逐筆 `any(kw in msg)` 的優先順序完全相同。
+"""
+
+from collections import deque
+
+_NO_MATCH = -1
+
+
+class KeywordMatcher:
+    """多 keyword 子字串匹配，回傳最小（最優先）的 entry index"""
+
+    def __init__(self, keyword_lists: list[list[str]]):
+        # 每個節點：子節點 dict、fail link、此節點（含 fail 鏈）能命中的最小 entry index
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[int] = [_NO_MATCH]
+        # 空字串 keyword 永遠命中（`'' in msg` 為 True）
+        self._always = _NO_MATCH
+
+        for entry_idx, keywords in enumerate(keyword_lists):
+            for kw in keywords:
+                kw = kw.lower()
+                if not kw:
+                    if self._always == _NO_MATCH:
+                        self._always = entry_idx
+                    continue
+                self._insert(kw, entry_idx)
+
+        self._build_fail_links()
+
+    def _insert(self, keyword: str, entry_idx: int):
+        node = 0
+        for ch in keyword:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(_NO_MATCH)
+            node = nxt
+        if self._best[node] == _NO_MATCH or entry_idx < self._best[node]:
+            self._best[node] = entry_idx
+
+    def _build_fail_links(self):
+        """BFS 建 fail link，並把 fail 鏈上的最小 index 併進每個節點"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                inherited = self._best[self._fail[child]]
+                if inherited != _NO_MATCH and (
+                    self._best[child] == _NO_MATCH or inherited < self._best[child]
+                ):
+                    self._best[child] = inherited
+
+    def find(self, text: str) -> int:
+        """回傳命中的最小 entry index，沒有命中回傳 -1（text 需已轉小寫）"""
+        best = self._always
+        if best == 0:
+            return 0
+
+        goto, fail, node_best = self._goto, self._fail, self._best
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node_best[node]
+            if hit != _NO_MATCH and (best == _NO_MATCH or hit < best):
+                best = hit
+                if best == 0:
+                    break
+        return best
@@ -0,0 +1,242 @@
+"""Prometheus 文字格式的 metrics（/metrics）
+
+不另外裝 prometheus_client：只需要 counter 與固定 bucket 的 histogram。
+每次 observe 是一次 bisect 加幾個整數累加（以 lock 保護，threadpool 中也能用），
+常駐開著的成本可以忽略。label 值只用固定的小集合（路由樣板、模型名、階段名），
+不放使用者輸入，避免時間序列數量失控。
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+
+import anyio.to_thread
+
+# 秒；涵蓋題庫查詢（sub-ms）到上游呼叫（數十秒）
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: tuple[str, ...], child) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ('_lock', 'value')
+
+    def __init__(self, lock: threading.Lock):
+        self._lock = lock
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class _HistogramChild:
+    __slots__ = ('_lock', '_buckets', 'counts', 'sum')
+
+    def __init__(self, lock: threading.Lock, buckets: tuple[float, ...]):
+        self._lock = lock
+        self._buckets = buckets
+        # 最後一格為 +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = buckets
+
+    def _new_child(self):
+        return _HistogramChild(self._lock, self._buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        with self._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self._buckets, float('inf')), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            labels = _format_labels(self.labelnames, values, f'le="{le}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {total!r}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """量 HTTP 請求總時間的 ASGI middleware（不用 BaseHTTPMiddleware，串流回應不會被緩衝）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = '500'
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = str(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 以路由樣板當 label（FastAPI 比對成功後會把 route 放進 scope）
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            http_request_duration.labels(scope['method'], path, status).observe(
+                time.perf_counter() - start,
+            )
+
+
+async def probe_threadpool(interval: float):
+    """定期丟一個空工作進 anyio threadpool（sync 路由跑的地方），量從送出到開始執行的等待時間"""
+    while True:
+        submitted = time.perf_counter()
+        started = await anyio.to_thread.run_sync(time.perf_counter)
+        threadpool_queue_wait.observe(started - submitted)
+        await asyncio.sleep(interval)
+
+
+# 全域單例
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    'tutor_http_request_duration_seconds',
+    'HTTP 請求總時間（串流算到最後一個 chunk 送出）',
+    ('method', 'route', 'status'),
+)
+upstream_request_duration = registry.histogram(
+    'tutor_upstream_request_duration_seconds',
+    '單次 Claude 呼叫的時間（串流為到第一個 token）',
+    ('model', 'mode', 'outcome'),
+)
+fallback_stage_duration = registry.histogram(
+    'tutor_fallback_stage_duration_seconds',
+    'get_fallback_reply 與各子步驟的時間',
+    ('stage',),
+)
+threadpool_queue_wait = registry.histogram(
+    'tutor_threadpool_queue_wait_seconds',
+    'threadpool 中工作開始執行前的等待時間（定期 probe）',
+)
+upstream_tokens = registry.counter(
+    'tutor_upstream_tokens_total',
+    'Claude 回報的 token 用量',
+    ('model', 'type'),
+)
+chat_replies = registry.counter(
+    'tutor_chat_replies_total',
+    '聊天回覆的來源（api / cache / fallback）',
+    ('endpoint', 'source'),
+)
+fallback_reasons = registry.counter(
+    'tutor_fallback_total',
+    '改用題庫的原因',
+    ('reason',),
+)
+response_bytes = registry.counter(
+    'tutor_response_bytes_total',
+    'JSON 回應實際送出的 body 位元組（依 Content-Encoding）',
+    ('encoding',),
+)
@@ -0,0 +1,91 @@
+"""單一請求的 cProfile（opt-in）
+
+設定 PROFILING_ENABLED=true 後，帶 X-Profile: 1 的請求會在 cProfile 下執行，
+結果寫成 .prof 檔（可用 snakeviz / pstats 開），檔名（profile_dir 下的相對名稱，
+不含伺服器上的絕對路徑）放在回應 header X-Profile-File。
+有設 ADMIN_TOKEN 時另外要帶相同的 X-Admin-Token。
+
+cProfile 掛在 event loop 所在的 thread 上，請求 await 期間同一個 loop 上的其他請求
+也會被算進去；量單一請求時請在沒有其他流量的情況下送。同時只 profile 一個請求，
+其餘帶 header 的請求照常執行、不 profile。
+"""
+
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# log 中列出的函式數
+_TOP_FUNCTIONS = 15
+
+
+class ProfilingMiddleware:
+    """ASGI middleware：依 header 決定是否 profile 這個請求"""
+
+    def __init__(self, app, enabled: bool = False, output_dir: Path = Path('data/profiles'),
+                 admin_token: str = ''):
+        self.app = app
+        self.enabled = enabled
+        self.output_dir = output_dir
+        self.admin_token = admin_token
+        self._busy = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        headers = dict(scope.get('headers') or ())
+        if headers.get(b'x-profile') not in (b'1', b'true'):
+            return False
+        if self.admin_token:
+            return headers.get(b'x-admin-token', b'').decode('latin-1') == self.admin_token
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if (not self.enabled or scope['type'] != 'http' or not self._requested(scope)
+                or not self._busy.acquire(blocking=False)):
+            await self.app(scope, receive, send)
+            return
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f'{time.strftime("%Y%m%d-%H%M%S")}-{time.perf_counter_ns()}.prof'
+
+        profiler = cProfile.Profile()
+        dumped = False
+
+        def finish():
+            nonlocal dumped
+            if dumped:
+                return
+            dumped = True
+            profiler.disable()
+            profiler.dump_stats(path)
+            logger.info('profile %s %s -> %s\n%s', scope['method'], scope['path'], path, summarize(path))
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers') or [])
+                headers.append((b'x-profile-file', path.name.encode('utf-8')))
+                message = {**message, 'headers': headers}
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                # 最後一段送出前先寫好檔案，client 收到回應時 .prof 已經可以讀
+                finish()
+            await send(message)
+
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                finish()
+        finally:
+            self._busy.release()
+
+
+def summarize(path: Path, limit: int = _TOP_FUNCTIONS, sort: str = 'cumulative') -> str:
+    """.prof 檔的前幾名函式（pstats 文字輸出）"""
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,84 @@
+"""Prompt caching
+
+每次 /api/chat 都會重送完整的 system prompt（含文法 / 翻譯說明）與整段對話紀錄。
+這裡自動加上兩個 cache breakpoint：
+- system prompt：同一個場景的 system prompt 幾乎不變
+- 最後一則訊息：這次請求的整段對話前綴寫入快取，下一輪請求只多了
+  新的回覆與提問，前面的部分就能直接讀快取
+
+伺服器端對話的滾動摘要放在 system prompt 之後的第二個 block，摘要更新時不影響 system prompt 的快取。
+
+太短的內容上游本來就不會快取（加了 cache_control 也不會出錯），因此不另外判斷長度。
+另外彙整 response usage 的 cache 讀寫 token 數，供 /api/status 觀察命中率。
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+_EPHEMERAL = {'type': 'ephemeral'}
+
+
+def summary_text(summary: str) -> str:
+    return f'Summary of the earlier conversation:\n{summary}'
+
+
+def with_cache_breakpoints(
+    system_prompt: str, messages: list[dict], summary: str = '',
+) -> tuple[list[dict], list[dict]]:
+    """回傳加上 cache_control 的 (system, messages)，不修改傳入的 messages"""
+    system = [{'type': 'text', 'text': system_prompt, 'cache_control': _EPHEMERAL}]
+    if summary:
+        system.append({'type': 'text', 'text': summary_text(summary)})
+    if not messages:
+        return system, messages
+
+    last = messages[-1]
+    content = last['content']
+    if isinstance(content, str):
+        content = [{'type': 'text', 'text': content}]
+    content = [*content[:-1], {**content[-1], 'cache_control': _EPHEMERAL}]
+    return system, [*messages[:-1], {**last, 'content': content}]
+
+
+class PromptCacheStats:
+    """累計上游回應的 token 用量"""
+
+    def __init__(self):
+        self._requests = 0
+        self._input_tokens = 0
+        self._cache_read_tokens = 0
+        self._cache_write_tokens = 0
+        self._output_tokens = 0
+
+    def record(self, usage):
+        """記錄一次回應的 usage（anthropic Usage 物件）"""
+        if usage is None:
+            return
+        cache_read = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        self._requests += 1
+        self._input_tokens += usage.input_tokens
+        self._cache_read_tokens += cache_read
+        self._cache_write_tokens += cache_write
+        self._output_tokens += usage.output_tokens
+        logger.info(
+            'Claude usage: input=%d cache_read=%d cache_write=%d output=%d',
+            usage.input_tokens, cache_read, cache_write, usage.output_tokens,
+        )
+
+    def get_status(self) -> dict:
+        # input_tokens 只含未命中快取的部分，三者相加才是完整的 prompt 長度
+        prompt_tokens = self._input_tokens + self._cache_read_tokens + self._cache_write_tokens
+        return {
+            'requests': self._requests,
+            'input_tokens': self._input_tokens,
+            'cache_read_input_tokens': self._cache_read_tokens,
+            'cache_creation_input_tokens': self._cache_write_tokens,
+            'output_tokens': self._output_tokens,
+            'cache_read_ratio': round(self._cache_read_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+        }
+
+
+# 全域單例
+prompt_cache_stats = PromptCacheStats()
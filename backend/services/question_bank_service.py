@@ -6,211 +6,712 @@
 - 情境回應
 - 發音練習
 
-以及預建回應（keyword 匹配）。
+以及預建回應（keyword 匹配，可選搭配本機語意檢索），與依題型 / 程度 / 主題篩選練習題的查詢。
+回覆文字（英文 / 雙語）在載入時就組好，請求中只依 index 取字串；
+GRAMMAR_MODE 下另以規則式文法檢查產生 ---GRAMMAR--- 區段。
 """
 
+import base64
+import binascii
+import bisect
+import hashlib
 import json
-import random
 import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Sequence
+from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
+
+from services import semantic_index
+from services.bank_file import BANK_FILENAME, BankFile, LazyRecords, index_view
+from services.drill_index import (
+    CEFR_LEVELS,
+    DrillIndex,
+    describe_type,
+    drill_tags,
+    index_version,
+    load_drill_metadata,
+)
+from services.drill_rotation import DrillRotation
+from services.drill_text import (
+    GRAMMAR_SEPARATOR,
+    OFFLINE_NO_DRILLS,
+    RenderedView,
+    render_drill,
+    render_pair,
+    split_translation,
+    with_translation,
+)
+from services.grammar_checker import grammar_checker
+from services.http_cache import etag_matches
+from services.keyword_matcher import KeywordMatcher
+from services.metrics import fallback_stage_duration
 
 logger = logging.getLogger(__name__)
 
 DATA_DIR = Path(__file__).parent.parent / 'data' / 'question_bank'
 
+# keyword: 只用 keyword；semantic: 只用語意檢索；hybrid: keyword 沒中再用語意檢索
+RETRIEVAL_MODES = ('keyword', 'semantic', 'hybrid')
+BANK_FORMATS = ('auto', 'json', 'binary')
+DRILL_TYPES = ('grammar_fill', 'vocabulary', 'situational', 'pronunciation')
+
+# get_fallback_reply 各階段的 histogram（先取好 label，observe 時不必再查表）
+_STAGE_TOTAL = fallback_stage_duration.labels('total')
+_STAGE_DETECT = fallback_stage_duration.labels('detect_scenario')
+_STAGE_MATCH = fallback_stage_duration.labels('find_fallback_entry')
+_STAGE_DRILL = fallback_stage_duration.labels('get_random_drill')
+_STAGE_GRAMMAR = fallback_stage_duration.labels('grammar_check')
+
+# 記住多少種不同的 system prompt 的偵測結果（前端的 prompt 組合通常只有十幾種）
+_PROMPT_PROFILE_CAPACITY = 256
+
+# (英文回覆, 雙語回覆)，與題目 / 回應的 index 對齊
+ReplyTable = tuple[Sequence[str], Sequence[str]]
+
+
+def _record_keys(prefix: str, entries: Sequence[dict]) -> list[str]:
+    """快照紀錄的 key：prefix/id；沒有 id 或 id 重複時改用位置"""
+    keys, seen = [], set()
+    for i, entry in enumerate(entries):
+        key = f'{prefix}/{entry.get("id") or i}'
+        if key in seen:
+            key = f'{key}#{i}'
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+def _encode_cursor(version: str, idx: int) -> str:
+    return base64.urlsafe_b64encode(f'{version}.{idx}'.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor: str, version: str) -> int:
+    """cursor → 下一頁第一題的攤平 index；題庫內容已變更時丟 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        cursor_version, idx = raw.rsplit('.', 1)
+        idx = int(idx)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('無效的 cursor') from None
+    if cursor_version != version:
+        raise ValueError('cursor 已失效（題庫內容已變更），請重新查詢')
+    return idx
+
+
+class _PromptProfile(NamedTuple):
+    scenario: str | None
+    translation: bool
+    grammar: bool
+
+
+def _parse_bank_file(f: Path, list_key: str) -> list[dict]:
+    """解析單一題庫 JSON（list 或 {list_key: [...]}）；格式錯誤丟 ValueError"""
+    data = json.loads(f.read_text(encoding='utf-8'))
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and list_key in data:
+        return data[list_key]
+    raise ValueError(f'{f.name} 缺少 {list_key}')
+
+
+def _render_replies(records: Sequence[dict], render: Callable[[dict], str]) -> ReplyTable:
+    """組好整個區段的 (英文, 雙語) 回覆；舊版 bank.bin（沒有預組文字）改在取值時才組"""
+    if isinstance(records, LazyRecords):
+        return (
+            RenderedView(records, render),
+            RenderedView(records, lambda e: with_translation(render(e), e.get('response_zh'))),
+        )
+    pairs = [render_pair(render(e), e) for e in records]
+    return [en for en, _ in pairs], [bi for _, bi in pairs]
+
+
+def _bank_files(data_dir: Path) -> dict[tuple[str, str], Path]:
+    """列出題庫 JSON：(kind, name) -> path，kind 為 drills / fallback_responses"""
+    files: dict[tuple[str, str], Path] = {}
+    for drill_type in DRILL_TYPES:
+        f = data_dir / 'drills' / f'{drill_type}.json'
+        if f.exists():
+            files[('drills', drill_type)] = f
+    responses_dir = data_dir / 'fallback_responses'
+    if responses_dir.exists():
+        for f in sorted(responses_dir.glob('*.json')):
+            files[('fallback_responses', f.stem)] = f  # 例如 interview-prep, free-chat
+    return files
+
+
+_LIST_KEYS = {'drills': 'questions', 'fallback_responses': 'responses'}
+
+
+def load_json_bank(data_dir: Path = DATA_DIR) -> tuple[dict[str, list[dict]], dict[str, list[dict]]]:
+    """解析 JSON 題庫，回傳 (drills, fallback_responses)"""
+    bank: dict[str, dict[str, list[dict]]] = {'drills': {}, 'fallback_responses': {}}
+    for (kind, name), f in _bank_files(data_dir).items():
+        try:
+            bank[kind][name] = _parse_bank_file(f, _LIST_KEYS[kind])
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.error('載入 %s 失敗: %s', f.name, e)
+    return bank['drills'], bank['fallback_responses']
+
+
+class _BankState:
+    """一份建好的題庫快照（含索引），建好後不再修改
+
+    reload 時建一份新的，再以單一參照賦值換掉舊的；
+    進行中的請求一開始就拿到自己的快照，不會看到載入到一半的狀態。
+    """
+
+    def __init__(
+        self,
+        storage: str,
+        drills: dict[str, Sequence[dict]],
+        fallback_responses: dict[str, Sequence[dict]],
+        matchers: dict[str, KeywordMatcher],
+        semantic_indexes: dict[str, 'semantic_index.SemanticIndex'],
+        rotation: DrillRotation,
+        drill_replies: dict[str, ReplyTable],
+        response_replies: dict[str, ReplyTable],
+        drill_index: DrillIndex,
+    ):
+        self.storage = storage
+        self.drills = drills
+        self.fallback_responses = fallback_responses
+        self.matchers = matchers
+        self.semantic_indexes = semantic_indexes
+        self.rotation = rotation
+        self.drill_replies = drill_replies
+        self.response_replies = response_replies
+        self.drill_index = drill_index
+
+        # drill pool：各題型在攤平 index 中的起點，輪替只需記 index
+        self.pool_starts: list[int] = []
+        self.pool_types: list[str] = []
+        total = 0
+        for drill_type, questions in drills.items():
+            if questions:
+                self.pool_starts.append(total)
+                self.pool_types.append(drill_type)
+                total += len(questions)
+        self.total_drills = total
+
+    def drill_reply_at(self, idx: int, translation: bool) -> str:
+        """攤平 index → 預組好的回覆文字"""
+        pos = bisect.bisect_right(self.pool_starts, idx) - 1
+        return self.drill_replies[self.pool_types[pos]][translation][idx - self.pool_starts[pos]]
+
 
 class QuestionBankService:
     """英語題庫與 fallback 回應服務"""
 
-    def __init__(self):
-        self._drills: dict[str, list[dict]] = {
-            'grammar_fill': [],
-            'vocabulary': [],
-            'situational': [],
-            'pronunciation': [],
-        }
-        self._fallback_responses: dict[str, list[dict]] = {}
-        self._used_drill_ids: set[str] = set()
+    def __init__(self, retrieval_mode: str = 'keyword', semantic_threshold: float = 0.4):
+        self._retrieval_mode = retrieval_mode
+        self._semantic_threshold = semantic_threshold
+        self._bank_format = 'auto'
+        self._rotation_config: tuple[int, float] | None = None
+        self._data_dir = DATA_DIR
+        self._state = _BankState(
+            'json', {t: [] for t in DRILL_TYPES}, {}, {}, {}, DrillRotation(), {}, {},
+            DrillIndex({}),
+        )
         self._loaded = False
 
-    def load(self):
+        # 增量 reload 快取：檔案簽章 (mtime_ns, size, sha256) 與解析結果
+        self._reload_lock = threading.Lock()
+        self._file_cache: dict[Path, tuple[tuple[int, int, str], list[dict]]] = {}
+        # 場景索引快取：內容 key（檔案 hash 或 bank.bin 簽章）→ (matcher, semantic index)
+        self._index_cache: dict[str, tuple[str, KeywordMatcher, object]] = {}
+        self._bin_cache: tuple[tuple[int, int], BankFile] | None = None
+        self._generation = 0
+        self._last_reload_ms = 0.0
+        self._last_reload_at: str | None = None
+        self._last_reparsed: list[str] = []
+        # system prompt → 場景 / 翻譯 / 文法模式（以 prompt 字串本身為 key，hash 由 str 快取）
+        self._prompt_profiles: dict[str, _PromptProfile] = {}
+
+    def configure_retrieval(self, mode: str, semantic_threshold: float):
+        """設定 fallback 檢索模式（需在 load() 前呼叫）"""
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f'未知的檢索模式: {mode}')
+        self._retrieval_mode = mode
+        self._semantic_threshold = semantic_threshold
+
+    def configure_rotation(self, max_sessions: int, idle_ttl_seconds: float):
+        """設定 per-session 出題輪替的 session 上限與閒置淘汰秒數"""
+        self._rotation_config = (max_sessions, idle_ttl_seconds)
+        self._state.rotation.configure(max_sessions, idle_ttl_seconds)
+
+    def configure_storage(self, bank_format: str):
+        """設定題庫來源：json / binary / auto（bank.bin 存在且不舊於 JSON 時用 binary）"""
+        if bank_format not in BANK_FORMATS:
+            raise ValueError(f'未知的題庫格式: {bank_format}')
+        self._bank_format = bank_format
+
+    def load(self, data_dir: Path = DATA_DIR):
         """載入所有題庫和預建回應"""
-        # 載入練習題
-        drills_dir = DATA_DIR / 'drills'
-        if drills_dir.exists():
-            for drill_type in self._drills:
-                f = drills_dir / f'{drill_type}.json'
-                if f.exists():
-                    try:
-                        data = json.loads(f.read_text(encoding='utf-8'))
-                        if isinstance(data, list):
-                            self._drills[drill_type] = data
-                        elif isinstance(data, dict) and 'questions' in data:
-                            self._drills[drill_type] = data['questions']
-                    except (json.JSONDecodeError, KeyError) as e:
-                        logger.error('載入 %s 失敗: %s', f.name, e)
+        self._data_dir = data_dir
+        self.reload(force=True)
+
+    def reload(self, force: bool = False) -> dict:
+        """重新載入題庫（可在背景 thread 執行）
 
-        # 載入預建回應
-        responses_dir = DATA_DIR / 'fallback_responses'
-        if responses_dir.exists():
-            for f in responses_dir.glob('*.json'):
-                try:
-                    data = json.loads(f.read_text(encoding='utf-8'))
-                    scenario_name = f.stem  # 例如 interview-prep, free-chat
-                    if isinstance(data, list):
-                        self._fallback_responses[scenario_name] = data
-                    elif isinstance(data, dict) and 'responses' in data:
-                        self._fallback_responses[scenario_name] = data['responses']
-                except (json.JSONDecodeError, KeyError) as e:
-                    logger.error('載入 fallback 回應失敗 %s: %s', f.name, e)
-
-        self._loaded = True
-        drill_total = sum(len(d) for d in self._drills.values())
-        resp_total = sum(len(r) for r in self._fallback_responses.values())
+        只重新解析 mtime / 內容 hash 有變的檔案，沒變的沿用上次的解析結果與索引。
+        全部建好後才一次換掉 self._state；沒有任何變更時不換。
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            reparsed: list[str] = []
+            new_state = self._build_state(self._data_dir, reparsed, rebuild=force)
+            if new_state is None:
+                return {'changed': False, 'generation': self._generation}
+
+            self._state = new_state
+            self._loaded = True
+            self._generation += 1
+            self._last_reload_ms = (time.perf_counter() - start) * 1000
+            self._last_reload_at = datetime.now().isoformat(timespec='seconds')
+            self._last_reparsed = reparsed
+
+        resp_total = sum(len(r) for r in new_state.fallback_responses.values())
         logger.info(
-            '題庫載入完成: drills=%d, fallback_responses=%d',
-            drill_total, resp_total,
+            '題庫載入完成 (%s, generation %d, %.0f ms): drills=%d, fallback_responses=%d, 重新解析=%s',
+            new_state.storage, self._generation, self._last_reload_ms,
+            new_state.total_drills, resp_total, reparsed or '無',
         )
+        return {
+            'changed': True,
+            'generation': self._generation,
+            'duration_ms': round(self._last_reload_ms, 1),
+            'reparsed': reparsed,
+        }
 
-    @property
-    def is_loaded(self) -> bool:
-        return self._loaded
-
-    def detect_scenario(self, system_prompt: str) -> str | None:
-        """從 system_prompt 偵測場景"""
-        prompt_lower = system_prompt.lower()
-        if 'interview' in prompt_lower or 'interviewer' in prompt_lower:
-            return 'interview-prep'
-        if 'free chat' in prompt_lower or 'conversation partner' in prompt_lower:
-            return 'free-chat'
-        return None
-
-    def _find_fallback_entry(self, scenario: str, user_message: str) -> dict | None:
-        """用 keyword 匹配預建回應，回傳完整 entry（含 response_zh）"""
-        responses = self._fallback_responses.get(scenario, [])
-        if not responses:
+    def _build_state(
+        self, data_dir: Path, reparsed: list[str], rebuild: bool = False,
+    ) -> _BankState | None:
+        """建新快照；rebuild=False 且沒有任何變更時回傳 None"""
+        old = self._state
+        bin_path = data_dir / BANK_FILENAME
+        if self._use_binary(data_dir, bin_path):
+            storage = 'binary'
+            changed, drills, responses, content_keys = self._read_binary(bin_path, reparsed)
+        else:
+            storage = 'json'
+            changed, drills, responses, content_keys = self._read_json(data_dir, reparsed)
+
+        changed = changed or storage != old.storage or set(responses) != set(old.fallback_responses)
+        if not changed and not rebuild and self._loaded:
             return None
 
-        msg_lower = user_message.lower().strip()
-
-        for entry in responses:
-            keywords = entry.get('keywords', [])
-            if any(kw.lower() in msg_lower for kw in keywords):
-                return entry
-
-        return None
-
-    def get_random_drill(self, want_translation: bool = False) -> str:
-        """隨機取得一題練習題，格式化為回覆文字"""
-        available_types = [t for t, qs in self._drills.items() if qs]
-        if not available_types:
-            return (
-                "I'm currently in offline mode and don't have practice exercises available. "
-                "Please try again later when the AI service is back online."
-            )
-
-        drill_type = random.choice(available_types)
-        questions = self._drills[drill_type]
+        drills = {drill_type: drills.get(drill_type, []) for drill_type in DRILL_TYPES}
+        matchers, indexes = self._build_indexes(responses, content_keys)
+        drill_replies, response_replies = self._build_replies(storage, drills, responses)
+        drill_index = self._build_drill_index(data_dir, drills, content_keys)
+
+        total = sum(len(q) for q in drills.values())
+        rotation = old.rotation
+        if total != old.total_drills:
+            rotation = DrillRotation()
+            if self._rotation_config:
+                rotation.configure(*self._rotation_config)
+            rotation.reset(total)
+
+        return _BankState(
+            storage, drills, responses, matchers, indexes, rotation, drill_replies, response_replies,
+            drill_index,
+        )
 
-        # 過濾已出過的
-        unused = [q for q in questions if q.get('id') not in self._used_drill_ids]
-        if not unused:
-            self._used_drill_ids = set()
-            unused = questions.copy()
+    def _build_drill_index(
+        self, data_dir: Path, drills: dict[str, Sequence[dict]], content_keys: dict[str, str],
+    ) -> DrillIndex:
+        """題型 / 程度 / 主題索引；內容與 metadata 都沒變時沿用（連同查詢結果快取）
 
-        question = random.choice(unused)
-        if question.get('id'):
-            self._used_drill_ids.add(question['id'])
+        metadata.json 不在變更偵測內，只改 metadata 時需強制 reload。
+        """
+        metadata = load_drill_metadata(data_dir)
+        version = index_version({t: content_keys.get(t, '') for t in drills}, metadata)
+        old = self._state.drill_index
+        if old.version == version:
+            return old
+        # 二進位題庫只解碼編譯時存好的 tag，不碰題目本身
+        tags = {
+            drill_type: [drill_tags(e) for e in index_view(questions)]
+            for drill_type, questions in drills.items()
+        }
+        descriptions = {drill_type: describe_type(metadata.get(drill_type, {})) for drill_type in drills}
+        return DrillIndex(tags, version, descriptions)
+
+    def _build_replies(
+        self, storage: str, drills: dict[str, Sequence[dict]], responses: dict[str, Sequence[dict]],
+    ) -> tuple[dict[str, ReplyTable], dict[str, ReplyTable]]:
+        """(各題型, 各場景) 的預組回覆；bank.bin 直接取編譯時組好的文字區段"""
+        drill_replies = response_replies = None
+        if storage == 'binary':
+            bank = self._bin_cache[1]
+            drill_replies, response_replies = bank.drill_replies(), bank.response_replies()
+        if drill_replies is None:
+            drill_replies = {
+                drill_type: _render_replies(questions, lambda q, t=drill_type: render_drill(q, t))
+                for drill_type, questions in drills.items()
+            }
+        if response_replies is None:
+            response_replies = {
+                scenario: _render_replies(entries, lambda e: e.get('response', ''))
+                for scenario, entries in responses.items()
+            }
+        return drill_replies, response_replies
+
+    def _read_json(self, data_dir: Path, reparsed: list[str]):
+        """增量讀 JSON：stat 沒變直接沿用；變了再比對內容 hash"""
+        bank: dict[str, dict[str, list[dict]]] = {'drills': {}, 'fallback_responses': {}}
+        content_keys: dict[str, str] = {}
+        changed = False
+        files = _bank_files(data_dir)
+
+        for (kind, name), f in files.items():
+            st = f.stat()
+            cached = self._file_cache.get(f)
+            if cached and cached[0][:2] == (st.st_mtime_ns, st.st_size):
+                signature, data = cached
+            else:
+                raw = f.read_bytes()
+                digest = hashlib.sha256(raw).hexdigest()
+                if cached and cached[0][2] == digest:
+                    signature, data = (st.st_mtime_ns, st.st_size, digest), cached[1]
+                else:
+                    try:
+                        data = _parse_bank_file(f, _LIST_KEYS[kind])
+                    except (json.JSONDecodeError, ValueError) as e:
+                        # 寫到一半或格式錯誤：保留上一版內容
+                        logger.error('載入 %s 失敗: %s', f.name, e)
+                        if not cached:
+                            continue
+                        bank[kind][name] = cached[1]
+                        content_keys[name] = cached[0][2]
+                        continue
+                    signature = (st.st_mtime_ns, st.st_size, digest)
+                    reparsed.append(f'{kind}/{f.name}')
+                    changed = True
+                self._file_cache[f] = (signature, data)
+            bank[kind][name] = data
+            content_keys[name] = signature[2]
+
+        removed = [f for f in self._file_cache if f not in files.values()]
+        for f in removed:
+            del self._file_cache[f]
+            changed = True
+        return changed, bank['drills'], bank['fallback_responses'], content_keys
+
+    def _read_binary(self, bin_path: Path, reparsed: list[str]):
+        """bank.bin 沒變就沿用同一個 mmap，變了才重新開檔"""
+        st = bin_path.stat()
+        signature = (st.st_mtime_ns, st.st_size)
+        changed = False
+        if self._bin_cache is None or self._bin_cache[0] != signature:
+            # 舊的 BankFile 不主動 close：進行中的請求可能還在讀，交給 GC 回收
+            self._bin_cache = (signature, BankFile(bin_path))
+            reparsed.append(bin_path.name)
+            changed = True
+        bank = self._bin_cache[1]
+        responses = bank.fallback_responses()
+        drills = bank.drills()
+        key = f'bin:{signature[0]}:{signature[1]}'
+        return changed, drills, responses, {name: key for name in (*drills, *responses)}
+
+    def _build_indexes(self, responses: dict[str, Sequence[dict]], content_keys: dict[str, str]):
+        """建 keyword 自動機與語意索引；內容沒變的場景直接沿用"""
+        use_semantic = self._retrieval_mode != 'keyword'
+        if use_semantic and not semantic_index.is_available():
+            logger.warning('未安裝 numpy，fallback 檢索改用 keyword 模式')
+            self._retrieval_mode = 'keyword'
+            use_semantic = False
+
+        matchers: dict[str, KeywordMatcher] = {}
+        indexes: dict[str, semantic_index.SemanticIndex] = {}
+        for scenario, entries in responses.items():
+            key = content_keys.get(scenario, '')
+            cached = self._index_cache.get(scenario)
+            if cached and cached[0] == key and (cached[2] is not None or not use_semantic):
+                matcher, index = cached[1], cached[2]
+            else:
+                # 二進位題庫只解碼 keywords / user_example，不碰 response
+                light = index_view(entries)
+                matcher = KeywordMatcher([e.get('keywords', []) for e in light])
+                index = (
+                    semantic_index.SemanticIndex([semantic_index.entry_text(e) for e in light])
+                    if use_semantic else None
+                )
+                self._index_cache[scenario] = (key, matcher, index)
+            matchers[scenario] = matcher
+            if index is not None and use_semantic:
+                indexes[scenario] = index
+
+        for scenario in [s for s in self._index_cache if s not in responses]:
+            del self._index_cache[scenario]
+        return matchers, indexes
+
+    def _use_binary(self, data_dir: Path, bin_path: Path) -> bool:
+        """判斷是否讀 bank.bin"""
+        if self._bank_format == 'json':
+            return False
+        if not bin_path.exists():
+            if self._bank_format == 'binary':
+                logger.warning('找不到 %s，改讀 JSON 題庫', bin_path.name)
+            return False
+        if self._bank_format == 'auto':
+            bin_mtime = bin_path.stat().st_mtime
+            if any(f.stat().st_mtime > bin_mtime for f in _bank_files(data_dir).values()):
+                logger.warning('%s 比 JSON 題庫舊，改讀 JSON（請重新編譯）', bin_path.name)
+                return False
+        return True
 
-        reply = question.get('response', self._format_drill(question, drill_type))
-        if want_translation:
-            return self._append_translation(reply, question.get('response_zh'))
-        return reply
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
 
-    def _format_drill(self, question: dict, drill_type: str) -> str:
-        """格式化練習題為回覆文字"""
-        if drill_type == 'grammar_fill':
-            sentence = question.get('sentence', '')
-            options = question.get('options', [])
-            answer = question.get('answer', '')
-            opts_text = '\n'.join(f'{i+1}. {o}' for i, o in enumerate(options))
-            return (
-                f"Let's practice grammar! Fill in the blank:\n\n"
-                f"{sentence}\n\n{opts_text}\n\n"
-                f"(The correct answer is: {answer})"
-            )
-        elif drill_type == 'vocabulary':
-            prompt_text = question.get('prompt', '')
-            options = question.get('options', [])
-            answer = question.get('answer', '')
-            opts_text = '\n'.join(f'{i+1}. {o}' for i, o in enumerate(options))
-            return (
-                f"Vocabulary check!\n\n{prompt_text}\n\n{opts_text}\n\n"
-                f"(The correct answer is: {answer})"
-            )
-        elif drill_type == 'situational':
-            situation = question.get('situation', '')
-            example = question.get('example_response', '')
-            return (
-                f"Situational response practice:\n\n"
-                f"Situation: {situation}\n\n"
-                f"How would you respond?\n\n"
-                f"Example answer: {example}"
-            )
-        elif drill_type == 'pronunciation':
-            word = question.get('word', '')
-            tip = question.get('tip', '')
-            return (
-                f"Pronunciation practice:\n\n"
-                f"Word: {word}\n\n"
-                f"Tip: {tip}"
+    @property
+    def generation(self) -> int:
+        """每次有變更的 reload 加一"""
+        return self._generation
+
+    def _prompt_profile(self, system_prompt: str) -> _PromptProfile:
+        """偵測結果依 system prompt 記住；同一個 prompt 不必每次 lower() 再掃一遍"""
+        profile = self._prompt_profiles.get(system_prompt)
+        if profile is None:
+            prompt_lower = system_prompt.lower()
+            if 'interview' in prompt_lower or 'interviewer' in prompt_lower:
+                scenario = 'interview-prep'
+            elif 'free chat' in prompt_lower or 'conversation partner' in prompt_lower:
+                scenario = 'free-chat'
+            else:
+                scenario = None
+            profile = _PromptProfile(
+                scenario,
+                '---TRANSLATION_MODE---' in system_prompt,
+                '---GRAMMAR_MODE---' in system_prompt,
             )
-        return question.get('response', 'Practice question not available.')
+            if len(self._prompt_profiles) >= _PROMPT_PROFILE_CAPACITY:
+                self._prompt_profiles.clear()  # prompt 種類異常多時整批重來，不逐筆淘汰
+            self._prompt_profiles[system_prompt] = profile
+        return profile
 
-    def _has_translation_mode(self, system_prompt: str) -> bool:
-        """檢查是否啟用翻譯模式"""
-        return '---TRANSLATION_MODE---' in system_prompt
+    def detect_scenario(self, system_prompt: str) -> str | None:
+        """從 system_prompt 偵測場景"""
+        return self._prompt_profile(system_prompt).scenario
 
-    def _append_translation(self, response: str, translation: str | None) -> str:
-        """如有翻譯則附加 ---TRANSLATION--- 區塊"""
-        if translation:
-            return f"{response}\n\n---TRANSLATION---\n\n{translation}"
-        return response
+    def _find_fallback_index(
+        self, scenario: str, user_message: str, state: _BankState | None = None,
+    ) -> int:
+        """匹配預建回應，回傳 entry index（沒匹配回傳 -1）
 
-    def get_fallback_reply(self, system_prompt: str, user_message: str) -> str:
+        keyword 命中優先；hybrid / semantic 模式下再以語意相似度找最接近的 entry，
+        分數低於門檻視為沒匹配（交給練習題）。
+        """
+        state = state or self._state
+        if not state.fallback_responses.get(scenario):
+            return -1
+
+        if self._retrieval_mode != 'semantic':
+            idx = state.matchers[scenario].find(user_message.lower().strip())
+            if idx >= 0:
+                return idx
+
+        index = state.semantic_indexes.get(scenario)
+        if index is not None:
+            hits = index.search(user_message, k=1)
+            if hits and hits[0][1] >= self._semantic_threshold:
+                return hits[0][0]
+
+        return -1
+
+    def get_random_drill(
+        self, want_translation: bool = False, session_id: str = '',
+        state: _BankState | None = None,
+    ) -> str:
+        """依 session 輪替取得一題練習題的回覆文字
+
+        同一 session 出完全部題目前不重複；不同 session 各自輪替、互不影響。
+        """
+        state = state or self._state
+        idx = state.rotation.draw(session_id)
+        if idx < 0:
+            return OFFLINE_NO_DRILLS
+        return state.drill_reply_at(idx, want_translation)
+
+    def get_fallback_reply(
+        self, system_prompt: str, user_message: str, session_id: str = '',
+    ) -> str:
         """取得 fallback 回覆（主要入口）
 
-        1. 偵測場景
+        1. 偵測場景（依 system prompt 記住結果）
         2. keyword 匹配預建回應
         3. 都沒匹配 → 出一般練習題
+        4. 文法模式 → 在回覆與翻譯之間插入 ---GRAMMAR--- 區段
         """
-        want_translation = self._has_translation_mode(system_prompt)
-        scenario = self.detect_scenario(system_prompt)
+        start = time.perf_counter()
+        state = self._state  # 整個請求都用同一份快照
+        profile = self._prompt_profile(system_prompt)
+        now = time.perf_counter()
+        _STAGE_DETECT.observe(now - start)
+
+        # 文法模式的說明插在英文回覆與翻譯之間，因此另外取英文版
+        reply = english = None
+        if profile.scenario:
+            stage_start = now
+            idx = self._find_fallback_index(profile.scenario, user_message, state)
+            now = time.perf_counter()
+            _STAGE_MATCH.observe(now - stage_start)
+            if idx >= 0:
+                table = state.response_replies[profile.scenario]
+                reply = table[profile.translation][idx]
+                english = table[0][idx] if profile.grammar else reply
+
+        if reply is None:
+            drill_idx = state.rotation.draw(session_id)
+            if drill_idx < 0:
+                reply = english = OFFLINE_NO_DRILLS
+            else:
+                reply = state.drill_reply_at(drill_idx, profile.translation)
+                english = state.drill_reply_at(drill_idx, False) if profile.grammar else reply
+            _STAGE_DRILL.observe(time.perf_counter() - now)
+
+        if profile.grammar:
+            stage_start = time.perf_counter()
+            notes = grammar_checker.notes(user_message)
+            reply = f'{english}\n\n{GRAMMAR_SEPARATOR}\n\n{notes}{reply[len(english):]}'
+            _STAGE_GRAMMAR.observe(time.perf_counter() - stage_start)
+
+        _STAGE_TOTAL.observe(time.perf_counter() - start)
+        return reply
 
-        if scenario:
-            matched = self._find_fallback_entry(scenario, user_message)
-            if matched:
-                reply = matched.get('response', '')
-                if want_translation:
-                    return self._append_translation(reply, matched.get('response_zh'))
-                return reply
+    def query_drills(
+        self,
+        drill_type: str | None = None,
+        level: str | None = None,
+        topic: str | None = None,
+        limit: int = 20,
+        cursor: str | None = None,
+        sample: int | None = None,
+        seed: int | None = None,
+        if_none_match: str | None = None,
+    ) -> tuple[str | None, dict | None]:
+        """依題型 / 程度 / 主題篩選練習題：cursor 分頁，或指定 sample 隨機抽題
+
+        回傳 (ETag, 內容)；if_none_match 已包含此 ETag 時內容為 None（回 304）。
+        不帶 seed 的抽樣每次結果不同，沒有 ETag。條件不合法時丟 ValueError。
+        """
+        state = self._state
+        index = state.drill_index
+        if drill_type is not None and drill_type not in DRILL_TYPES:
+            raise ValueError(f'未知的題型: {drill_type}')
+        if level is not None:
+            level = level.strip().upper()
+            if level not in CEFR_LEVELS:
+                raise ValueError(f'未知的程度: {level}（可用 {", ".join(CEFR_LEVELS)}）')
+        if topic is not None:
+            topic = topic.strip().lower()
+        start = _decode_cursor(cursor, index.version) if cursor else 0
+
+        etag = None
+        if sample is None or seed is not None:
+            key = json.dumps([index.version, drill_type, level, topic, limit, start, sample, seed])
+            etag = '"' + hashlib.sha256(key.encode()).hexdigest()[:24] + '"'
+            if etag_matches(if_none_match, etag):
+                return etag, None
+
+        matched = index.match(drill_type, level, topic)
+        next_cursor = None
+        if sample is not None:
+            picked = random.Random(seed).sample(matched, min(sample, len(matched)))
+        else:
+            pos = bisect.bisect_left(matched, start)
+            picked = matched[pos:pos + limit]
+            if pos + limit < len(matched):
+                next_cursor = _encode_cursor(index.version, matched[pos + limit])
+
+        items = []
+        for idx in picked:
+            item_type, local = index.locate(idx)
+            items.append({
+                'id': index.drill_id(idx),
+                'type': item_type,
+                'question': state.drills[item_type][local],
+            })
+        return etag, {
+            'version': index.version,
+            'total': len(matched),
+            'items': items,
+            'next_cursor': next_cursor,
+        }
+
+    def drill_facets(self, if_none_match: str | None = None) -> tuple[str, dict | None]:
+        """各題型 / 程度 / 主題的題數（儀表板建篩選選單用）；回傳 (ETag, 內容)"""
+        index = self._state.drill_index
+        etag = f'"facets-{index.version}"'
+        if etag_matches(if_none_match, etag):
+            return etag, None
+        return etag, {'version': index.version, **index.facets()}
+
+    def export_records(self) -> tuple[int, dict[str, dict]]:
+        """(generation, 離線快照用的紀錄)
 
-        return self.get_random_drill(want_translation)
+        - drill/<題型>/<id>：{'type', 'en', 'zh'}
+        - response/<場景>/<id>：{'scenario', 'keywords', 'en', 'zh'}
+
+        回覆文字取自載入時預組好的表，沒有翻譯時不帶 zh；
+        同一場景的預建回應依原本順序排列（即 keyword 匹配的優先順序）。
+        """
+        generation, state = self._generation, self._state
+        records: dict[str, dict] = {}
+        for drill_type, questions in state.drills.items():
+            if not questions:
+                continue
+            english, bilingual = state.drill_replies[drill_type]
+            for i, key in enumerate(_record_keys(f'drill/{drill_type}', index_view(questions))):
+                record = {'type': drill_type, 'en': english[i]}
+                zh = split_translation(english[i], bilingual[i])
+                if zh is not None:
+                    record['zh'] = zh
+                records[key] = record
+        for scenario, entries in state.fallback_responses.items():
+            english, bilingual = state.response_replies[scenario]
+            light = index_view(entries)
+            for i, key in enumerate(_record_keys(f'response/{scenario}', light)):
+                record = {
+                    'scenario': scenario,
+                    'keywords': [kw.lower() for kw in light[i].get('keywords', [])],
+                    'en': english[i],
+                }
+                zh = split_translation(english[i], bilingual[i])
+                if zh is not None:
+                    record['zh'] = zh
+                records[key] = record
+        return generation, records
 
     def get_status(self) -> dict:
         """回傳題庫狀態"""
+        state = self._state
         return {
             'loaded': self._loaded,
+            'storage': state.storage,
+            'retrieval_mode': self._retrieval_mode,
+            'generation': self._generation,
+            'last_reload_ms': round(self._last_reload_ms, 1),
+            'last_reload_at': self._last_reload_at,
+            'last_reparsed': self._last_reparsed,
             'drills': {
                 dtype: len(questions)
-                for dtype, questions in self._drills.items()
+                for dtype, questions in state.drills.items()
             },
             'fallback_responses': {
                 scenario: len(responses)
-                for scenario, responses in self._fallback_responses.items()
+                for scenario, responses in state.fallback_responses.items()
             },
-            'total_drills': sum(len(d) for d in self._drills.values()),
-            'total_responses': sum(len(r) for r in self._fallback_responses.values()),
+            'total_drills': state.total_drills,
+            'rotation': state.rotation.get_status(),
+            'drill_index': state.drill_index.get_status(),
+            'total_responses': sum(len(r) for r in state.fallback_responses.values()),
         }
 
 
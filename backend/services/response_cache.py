@@ -0,0 +1,164 @@
+"""完全相同請求的回覆快取
+
+場景招呼語、各場景第一句 "hi" / "hello"、課堂統一練習等請求，
+(model, system, messages, max_tokens) 完全相同，回覆可以直接共用：
+- key 為請求參數的 canonical JSON 加上 scope（呼叫用的 API key）的 sha256；
+  不同 key 的請求不共用回覆，不會拿別人額度換來的回覆給失效 / 被限流的 key
+- LRU + TTL 淘汰，總大小（回覆 UTF-8 bytes）有上限
+- single-flight：同一個 key 同時進來的請求只打一次上游，其餘等待同一個結果；
+  帶頭請求自己的錯誤（排不到名額、配額、認證）不轉給等待者，由等待者自己重打
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+
+def cache_key(params: dict, scope: str = '') -> str:
+    """請求參數與 scope 的 canonical hash（dict 順序不影響結果）"""
+    canonical = json.dumps([scope, params], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _always_shared(error: Exception) -> bool:
+    return True
+
+
+class ResponseCache:
+    """回覆文字快取（只在 event loop 中使用，不需要鎖）"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 3600):
+        self.enabled = False
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        # key -> (回覆, 大小, 寫入時間)；順序即 LRU 順序
+        self._entries: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def configure(self, enabled: bool, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.enabled = enabled
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._evict()
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] >= self._ttl:
+            self._remove(key)
+            self._expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, reply: str):
+        size = len(key) + len(reply.encode('utf-8'))
+        if size > self._max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (reply, size, time.monotonic())
+        self._bytes += size
+        self._evict()
+
+    def lookup(self, key: str) -> str | None:
+        """只查已完成的快取並計入統計（串流端點用，不參與 single-flight）"""
+        reply = self.get(key)
+        if reply is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return reply
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[str]],
+        shared_error: Callable[[Exception], bool] = _always_shared,
+    ) -> tuple[str, bool]:
+        """回傳 (回覆, 是否來自快取)；同 key 進行中的請求共用同一次 fetch
+
+        帶頭的 fetch 失敗時，shared_error 為 True 的錯誤等待者一起收到（上游本身的問題）；
+        其他錯誤只屬於帶頭的請求，等待者改由自己重新 fetch。
+        """
+        while True:
+            reply = self.get(key)
+            if reply is not None:
+                self._hits += 1
+                return reply, True
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                reply = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # 帶頭的請求被取消（client 斷線），由這個請求重新發起
+                if pending.cancelled():
+                    continue
+                raise
+            except Exception as e:
+                if shared_error(e):
+                    raise
+                continue
+            self._coalesced += 1
+            return reply, True
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            reply = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 沒有等待者時避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self.put(key, reply)
+        future.set_result(reply)
+        return reply, False
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+            self._remove(next(iter(self._entries)))
+            self._evictions += 1
+
+    def get_status(self) -> dict:
+        lookups = self._hits + self._misses + self._coalesced
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self._max_bytes,
+            'hits': self._hits,
+            'coalesced': self._coalesced,
+            'misses': self._misses,
+            'hit_rate': round((self._hits + self._coalesced) / lookups, 3) if lookups else 0.0,
+            'evictions': self._evictions,
+            'expirations': self._expirations,
+        }
+
+
+# 全域單例
+response_cache = ResponseCache()
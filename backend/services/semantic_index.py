@@ -0,0 +1,154 @@
+"""預建回應語意檢索（本機 TF-IDF 向量索引）
+
+keyword 匹配抓不到換句話說的訊息，這裡用 hashed 字元 n-gram + 單字特徵
+建 TF-IDF 向量，每個 entry 取 `user_example` 與 `keywords` 當文本。
+
+- 不需網路、不需下載模型
+- 以欄為主的稀疏格式（類 CSC）存 float32 權重，記憶體約為非零數 × 8 bytes
+- 查詢只碰訊息特徵對應的 posting，一次 bincount 算完全部 cosine，再取 top-k
+
+NumPy 為選用依賴：未安裝時 `is_available()` 回傳 False，呼叫端退回 keyword 匹配。
+"""
+
+import math
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 選用依賴
+    np = None
+
+NGRAM = 3
+# 超過此比例 entry 都出現的特徵視為停用詞（僅在大型題庫套用）
+MAX_DF_RATIO = 0.05
+MAX_DF_MIN_ROWS = 1000
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def is_available() -> bool:
+    return np is not None
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word: str) -> tuple[int, ...]:
+    """單字 → hashed 特徵（單字本身 + 字元 n-gram）；詞彙有限，快取後建索引只需查表"""
+    padded = f' {word} '
+    return (
+        zlib.crc32(b'w:' + word.encode('utf-8')),
+        *(zlib.crc32(padded[i:i + NGRAM].encode('utf-8')) for i in range(len(padded) - NGRAM + 1)),
+    )
+
+
+def _features(text: str) -> Counter:
+    """文字 → {hashed 特徵: 次數}"""
+    counts: Counter = Counter()
+    for word in _NON_WORD.sub(' ', text.lower()).split():
+        counts.update(_word_features(word))
+    return counts
+
+
+def entry_text(entry: dict) -> str:
+    """建索引用的 entry 文本"""
+    return ' '.join([entry.get('user_example', ''), *entry.get('keywords', [])])
+
+
+class SemanticIndex:
+    """單一場景的 TF-IDF cosine 索引"""
+
+    def __init__(self, texts: list[str]):
+        if np is None:
+            raise RuntimeError('SemanticIndex 需要 numpy')
+
+        self._rows_count = len(texts)
+        row_ids: list[int] = []
+        feat_ids: list[int] = []
+        counts: list[int] = []
+        for row, text in enumerate(texts):
+            c = _features(text)
+            row_ids.extend([row] * len(c))
+            feat_ids.extend(c.keys())
+            counts.extend(c.values())
+
+        rows = np.asarray(row_ids, dtype=np.int32)
+        feats = np.asarray(feat_ids, dtype=np.uint32)
+        tf = 1.0 + np.log(np.asarray(counts, dtype=np.float32))
+
+        # 特徵 → 連續欄位編號，並算 df / idf
+        columns, cols = np.unique(feats, return_inverse=True)
+        df = np.bincount(cols, minlength=len(columns))
+        n = max(self._rows_count, 1)
+        idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+
+        if self._rows_count >= MAX_DF_MIN_ROWS:
+            keep_col = df <= MAX_DF_RATIO * n
+            keep = keep_col[cols]
+            remap = np.cumsum(keep_col) - 1
+            rows, tf, cols = rows[keep], tf[keep], remap[cols[keep]]
+            columns, idf, df = columns[keep_col], idf[keep_col], df[keep_col]
+
+        # 每列 L2 正規化，讓內積即為 cosine
+        weights = tf * idf[cols]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=self._rows_count))
+        norms[norms == 0] = 1.0
+        weights = (weights / norms[rows]).astype(np.float32)
+
+        # 依欄位排序 → posting list
+        order = np.argsort(cols, kind='stable')
+        self._rows = rows[order]
+        self._weights = weights[order]
+        self._indptr = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum(df, out=self._indptr[1:])
+        self._columns = columns
+        self._idf = idf
+        # 未見過的特徵以最大 idf 計入查詢向量長度，讓陌生訊息分數偏低
+        self._unseen_idf = float(math.log(1 + n) + 1)
+
+    def __len__(self) -> int:
+        return self._rows_count
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (
+            self._rows, self._weights, self._indptr, self._columns, self._idf,
+        ))
+
+    def search(self, text: str, k: int = 1) -> list[tuple[int, float]]:
+        """回傳 cosine 最高的 k 筆 (entry index, score)，分數相同時 index 小的優先"""
+        counts = _features(text)
+        if not counts or len(self._columns) == 0:
+            return []
+
+        feats = np.fromiter(counts.keys(), dtype=np.uint32, count=len(counts))
+        qtf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+
+        pos = np.searchsorted(self._columns, feats)
+        pos[pos >= len(self._columns)] = 0
+        known = self._columns[pos] == feats
+
+        qw = qtf * np.where(known, self._idf[pos], self._unseen_idf)
+        qnorm = float(np.sqrt(np.dot(qw, qw)))
+        if qnorm == 0 or not known.any():
+            return []
+
+        cols = pos[known]
+        qw = qw[known] / qnorm
+        bounds = zip(self._indptr[cols].tolist(), self._indptr[cols + 1].tolist())
+        slices = [slice(start, end) for start, end in bounds]
+        lengths = [sl.stop - sl.start for sl in slices]
+        scores = np.bincount(
+            np.concatenate([self._rows[sl] for sl in slices]),
+            weights=np.concatenate([self._weights[sl] for sl in slices]) * np.repeat(qw, lengths),
+            minlength=self._rows_count,
+        )
+
+        k = min(k, self._rows_count)
+        if k == 1:
+            best = int(np.argmax(scores))
+            return [(best, float(scores[best]))]
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(i), float(scores[i])) for i in top]
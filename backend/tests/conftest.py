@@ -0,0 +1,33 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# 測試直接 import backend 的模組（與 uvicorn main:app 相同的 import 路徑）
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture(scope='session')
+def offline_app():
+    """整個 app 的 TestClient（需要 httpx）；不用 env 的 API key，回覆一律來自題庫，不會連到上游"""
+    pytest.importorskip('httpx')
+    from fastapi.testclient import TestClient
+
+    import main
+
+    patch = pytest.MonkeyPatch()
+    patch.setattr(main.client_pool, '_default_client', None)
+    with TestClient(main.app) as client:
+        yield client
+    patch.undo()
+
+
+@pytest.fixture
+def bank_dir(tmp_path) -> Path:
+    """隨附題庫（JSON）的暫存複本，測試可以任意修改或編譯"""
+    from services.question_bank_service import DATA_DIR
+
+    path = tmp_path / 'question_bank'
+    shutil.copytree(DATA_DIR, path, ignore=shutil.ignore_patterns('bank.bin', '*.tmp'))
+    return path
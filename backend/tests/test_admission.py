@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from services import admission
+from services.admission import AdaptiveLimiter, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(admission, 'time', clock)
+    return clock
+
+
+def test_rejects_without_waiting_when_full():
+    limiter = AdaptiveLimiter(2, min_limit=1, max_limit=4)
+
+    async def run():
+        first, second = await limiter.acquire(0), await limiter.acquire(0)
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire(0)
+        first.release()
+        second.release()
+        (await limiter.acquire(0)).release()
+
+    asyncio.run(run())
+    status = limiter.get_status()
+    assert (status['admitted'], status['rejected'], status['inflight']) == (3, 1, 0)
+
+
+def test_waiters_are_admitted_by_priority():
+    limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1)
+    order: list[float] = []
+
+    async def waiter(priority: float):
+        async with await limiter.acquire(5, priority=priority):
+            order.append(priority)
+
+    async def run():
+        holder = await limiter.acquire(0)
+        tasks = [asyncio.create_task(waiter(p)) for p in (3.0, 1.0, 2.0)]
+        await asyncio.sleep(0)
+        assert limiter.get_status()['waiting'] == 3
+        holder.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == [1.0, 2.0, 3.0]
+
+
+def test_timed_out_and_cancelled_waiters_leave_no_trace():
+    limiter = AdaptiveLimiter(1, min_limit=1, max_limit=1)
+
+    async def run():
+        holder = await limiter.acquire(0)
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire(0.01)
+        task = asyncio.create_task(limiter.acquire(5))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.get_status()['waiting'] == 0
+        holder.release()
+        (await limiter.acquire(0)).release()
+
+    asyncio.run(run())
+    assert limiter.get_status()['inflight'] == 0
+
+
+def test_errors_cut_the_limit_once_per_round_trip(clock):
+    limiter = AdaptiveLimiter(16, min_limit=2, max_limit=64)
+    limiter._on_sample(1.0, False)
+    assert limiter.limit == 12
+    # 同一個來回內的其他失敗樣本反映的還是舊上限，不再往下降
+    clock.now += 0.5
+    limiter._on_sample(1.0, False)
+    assert limiter.limit == 12
+    clock.now += 1.0
+    limiter._on_sample(1.0, False)
+    assert limiter.limit == 9
+
+
+def test_sustained_latency_rise_cuts_the_limit(clock):
+    limiter = AdaptiveLimiter(16, min_limit=2, max_limit=64)
+    for _ in range(120):
+        clock.now += 0.5
+        limiter._on_sample(0.2, True)
+    assert limiter.get_status()['decreases'] == 0
+
+    for _ in range(20):
+        clock.now += 0.5
+        limiter._on_sample(1.0, True)
+    assert limiter.get_status()['decreases'] >= 1
+    assert limiter.limit < 16
+
+
+def test_busy_and_healthy_grows_the_limit_additively(clock):
+    limiter = AdaptiveLimiter(4, min_limit=1, max_limit=8)
+    limiter._inflight = 2
+    limiter._on_sample(0.2, True)
+    assert limiter._limit == pytest.approx(4.25)
+    # 上限沒被用到（inflight 不到一半）時不長
+    limiter._inflight = 1
+    limiter._on_sample(0.2, True)
+    assert limiter._limit == pytest.approx(4.25)
@@ -0,0 +1,62 @@
+import os
+import time
+
+import pytest
+
+from services.api_health import APIHealthChecker, fcntl
+
+pytestmark = pytest.mark.skipif(fcntl is None or not hasattr(os, 'fork'), reason='需要 fork 與 flock')
+
+WORKERS = 4
+
+
+def _checker(path) -> APIHealthChecker:
+    checker = APIHealthChecker()
+    # 與 serve.py 相同：fork 之前就設定好共用檔案
+    checker.configure(0.5, 5, 30, 15, 300, 2, state_file=path)
+    return checker
+
+
+def _fork_workers(target) -> list[int]:
+    pids = []
+    for _ in range(WORKERS):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                target()
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+        pids.append(pid)
+    return pids
+
+
+def _join(pids):
+    for pid in pids:
+        _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+
+def test_forked_workers_do_not_lose_updates(tmp_path):
+    checker = _checker(tmp_path / 'breaker.bin')
+
+    def work():
+        for _ in range(2000):
+            checker.mark_success()
+
+    _join(_fork_workers(work))
+    assert checker.get_status()['successes'] == WORKERS * 2000
+
+
+def test_forked_workers_exclude_each_other(tmp_path):
+    checker = _checker(tmp_path / 'breaker.bin')
+
+    def work():
+        with checker._guard():
+            time.sleep(0.2)
+
+    start = time.monotonic()
+    _join(_fork_workers(work))
+    assert time.monotonic() - start >= WORKERS * 0.2
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from services.bank_file import BANK_FILENAME, INDEX_FIELDS, BankFile, compile_bank
+from services.question_bank_service import DRILL_TYPES, QuestionBankService, load_json_bank
+
+GRAMMAR_PROMPT = 'free chat\n---TRANSLATION_MODE---\n---GRAMMAR_MODE---'
+
+
+@pytest.fixture
+def compiled(bank_dir):
+    drills, responses = load_json_bank(bank_dir)
+    compile_bank(drills, responses, bank_dir / BANK_FILENAME)
+    bank = BankFile(bank_dir / BANK_FILENAME)
+    yield bank, drills, responses
+    bank.close()
+
+
+def test_records_round_trip(compiled):
+    bank, drills, responses = compiled
+    for drill_type, questions in drills.items():
+        assert list(bank.drills()[drill_type]) == questions
+    for scenario, entries in responses.items():
+        lazy = bank.fallback_responses()[scenario]
+        assert list(lazy) == entries
+        assert lazy.index_entries() == [{k: e[k] for k in INDEX_FIELDS if k in e} for e in entries]
+
+
+def test_lazy_records_behave_like_a_sequence(compiled):
+    bank, drills, _ = compiled
+    lazy, questions = bank.drills()['vocabulary'], drills['vocabulary']
+    assert len(lazy) == len(questions)
+    assert lazy[-1] == questions[-1]
+    assert lazy[1:3] == questions[1:3]
+    with pytest.raises(IndexError):
+        lazy[len(questions)]
+
+
+def test_drill_tags_are_stored_per_item(compiled):
+    bank, drills, _ = compiled
+    tags = bank.drills()['grammar_fill'].index_entries()
+    assert [t['id'] for t in tags] == [q['id'] for q in drills['grammar_fill']]
+
+
+def test_rejects_files_that_are_not_banks(tmp_path):
+    path = tmp_path / BANK_FILENAME
+    path.write_bytes(b'not a bank' + bytes(32))
+    with pytest.raises(ValueError):
+        BankFile(path)
+
+
+def _service(bank_dir, bank_format: str) -> QuestionBankService:
+    service = QuestionBankService()
+    service.configure_storage(bank_format)
+    service.load(bank_dir)
+    return service
+
+
+def test_binary_and_json_serve_the_same_replies(compiled, bank_dir):
+    from_json, from_bin = _service(bank_dir, 'json'), _service(bank_dir, 'binary')
+    assert from_bin.get_status()['storage'] == 'binary'
+    assert from_json.get_status()['storage'] == 'json'
+
+    json_state, bin_state = from_json._state, from_bin._state
+    assert json_state.total_drills == bin_state.total_drills
+    for idx in range(json_state.total_drills):
+        for translation in (False, True):
+            assert json_state.drill_reply_at(idx, translation) == bin_state.drill_reply_at(idx, translation)
+    # 都有 keyword 命中（沒命中會隨機出練習題，兩邊不可比）
+    for message in ('Any plans for the weekend?', 'What food do you like?', 'I goes to work by bus.'):
+        for prompt in ('free chat', GRAMMAR_PROMPT):
+            assert from_json.get_fallback_reply(prompt, message) == from_bin.get_fallback_reply(prompt, message)
+
+
+def test_auto_prefers_json_when_the_binary_is_stale(compiled, bank_dir):
+    assert _service(bank_dir, 'auto').get_status()['storage'] == 'binary'
+    path = bank_dir / 'drills' / f'{DRILL_TYPES[0]}.json'
+    path.write_text(path.read_text(encoding='utf-8'), encoding='utf-8')
+    # 確保 mtime 比 bank.bin 新（檔案系統時間解析度可能較粗）
+    stat = (bank_dir / BANK_FILENAME).stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert _service(bank_dir, 'auto').get_status()['storage'] == 'json'
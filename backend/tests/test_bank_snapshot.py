@@ -0,0 +1,151 @@
+import copy
+import json
+
+from services.bank_snapshot import BankSnapshotService
+
+
+class FakeBank:
+    def __init__(self, records: dict[str, dict]):
+        self.generation = 1
+        self.records = records
+        self.exports = 0
+
+    def export(self) -> tuple[int, dict[str, dict]]:
+        self.exports += 1
+        return self.generation, copy.deepcopy(self.records)
+
+    def update(self, fn):
+        fn(self.records)
+        self.generation += 1
+
+
+def _records() -> dict[str, dict]:
+    return {
+        'drill/vocabulary/v1': {'type': 'vocabulary', 'en': 'Word one'},
+        'drill/vocabulary/v2': {'type': 'vocabulary', 'en': 'Word two'},
+        'response/restaurant/r1': {'scenario': 'restaurant', 'keywords': ['menu'], 'en': 'Here is the menu.'},
+        'response/restaurant/r2': {'scenario': 'restaurant', 'keywords': ['bill'], 'en': 'Here is the bill.'},
+        'response/hotel/h1': {'scenario': 'hotel', 'keywords': ['room'], 'en': 'Your room is ready.'},
+    }
+
+
+def _service(bank: FakeBank, history: int = 8) -> BankSnapshotService:
+    service = BankSnapshotService()
+    service.configure(lambda: bank.generation, bank.export, history=history)
+    return service
+
+
+def _body(payload) -> dict:
+    return json.loads(payload.body.raw)
+
+
+def _apply(snapshot: dict, delta: dict) -> dict:
+    """用戶端套用差異的方式"""
+    records = {k: v for k, v in snapshot['records'].items() if k not in delta['deletes']}
+    records.update(delta['upserts'])
+    order = {**snapshot['order'], **delta['order']}
+    return {'records': records, 'order': {s: keys for s, keys in order.items() if keys}}
+
+
+def test_snapshot_then_not_modified():
+    bank = FakeBank(_records())
+    service = _service(bank)
+    payload = service.get()
+    assert payload.kind == 'snapshot'
+    body = _body(payload)
+    assert body['version'] == payload.version and body['records'] == bank.records
+    assert body['order'] == {
+        'restaurant': ['response/restaurant/r1', 'response/restaurant/r2'],
+        'hotel': ['response/hotel/h1'],
+    }
+    again = service.get(payload.version)
+    assert again.kind == 'not_modified' and again.body is None
+    assert bank.exports == 1  # generation 沒變不重新匯出
+
+
+def test_unknown_version_gets_the_full_snapshot():
+    service = _service(FakeBank(_records()))
+    assert service.get('0123456789abcdef').kind == 'snapshot'
+
+
+def test_delta_carries_only_changes():
+    bank = FakeBank(_records())
+    service = _service(bank)
+    old = service.get()
+
+    def edit(records):
+        records['drill/vocabulary/v1']['en'] = 'Word one, revised'
+        del records['drill/vocabulary/v2']
+        records['drill/vocabulary/v3'] = {'type': 'vocabulary', 'en': 'Word three'}
+    bank.update(edit)
+
+    payload = service.get(old.version)
+    assert payload.kind == 'delta' and payload.version != old.version
+    delta = _body(payload)
+    assert delta['base'] == old.version
+    assert set(delta['upserts']) == {'drill/vocabulary/v1', 'drill/vocabulary/v3'}
+    assert delta['deletes'] == ['drill/vocabulary/v2']
+    assert delta['order'] == {}
+
+    current = _body(service.get())
+    assert _apply(_body(old), delta) == {'records': current['records'], 'order': current['order']}
+
+
+def test_reordering_a_scenario_only_sends_its_order():
+    bank = FakeBank(_records())
+    service = _service(bank)
+    old = service.get()
+
+    def reorder(records):
+        r1 = records.pop('response/restaurant/r1')
+        records['response/restaurant/r1'] = r1
+        del records['response/hotel/h1']
+    bank.update(reorder)
+
+    delta = _body(service.get(old.version))
+    assert delta['upserts'] == {}
+    assert delta['deletes'] == ['response/hotel/h1']
+    assert delta['order'] == {
+        'restaurant': ['response/restaurant/r2', 'response/restaurant/r1'],
+        'hotel': [],
+    }
+
+
+def test_same_content_keeps_the_version():
+    bank = FakeBank(_records())
+    service = _service(bank)
+    version = service.get().version
+    bank.update(lambda records: None)
+    assert service.get(version).kind == 'not_modified'
+    assert bank.exports == 2
+
+
+def test_deltas_are_cached_and_old_versions_age_out():
+    bank = FakeBank(_records())
+    service = _service(bank, history=2)
+    versions = [service.get().version]
+    for i in range(2):
+        bank.update(lambda records, i=i: records.update({f'drill/vocabulary/n{i}': {'type': 'vocabulary', 'en': str(i)}}))
+        versions.append(service.get().version)
+
+    assert service.get(versions[0]).kind == 'snapshot'  # 已不在歷史中
+    first = service.get(versions[1])
+    assert first.kind == 'delta' and service.get(versions[1]).body is first.body
+    status = service.get_status()
+    assert status['history'] == versions[1:] and status['cached_deltas'] == 1
+
+
+def test_snapshot_endpoint_versions_and_revalidates(offline_app):
+    plain = offline_app.get('/api/bank/snapshot', headers={'Accept-Encoding': 'identity'})
+    assert plain.status_code == 200 and plain.headers['X-Bank-Snapshot'] == 'snapshot'
+    version = plain.json()['version']
+    assert plain.headers['ETag'] == f'"{version}"'
+
+    gzipped = offline_app.get('/api/bank/snapshot', headers={'Accept-Encoding': 'gzip'})
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == f'W/"{version}"'
+    assert gzipped.json()['version'] == version
+
+    assert offline_app.get('/api/bank/snapshot', params={'since': version}).status_code == 304
+    revalidated = offline_app.get('/api/bank/snapshot', headers={'If-None-Match': f'"{version}"'})
+    assert revalidated.status_code == 304
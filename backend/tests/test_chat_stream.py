@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from services.chat_stream import SectionSplitter, chunk_text, reply_section, sse_event
+
+REPLY = 'Great answer!\n\n---GRAMMAR---\n\nLooks good.\n\n---TRANSLATION---\n\n回答得很好！'
+EXPECTED = [
+    ('reply', 'Great answer!\n\n'),
+    ('grammar', '\n\nLooks good.\n\n'),
+    ('translation', '\n\n回答得很好！'),
+]
+
+
+def _collect(deltas: list[str]) -> list[tuple[str, str]]:
+    """餵完全部 delta，相鄰同區段的片段合併"""
+    splitter = SectionSplitter()
+    merged: list[tuple[str, str]] = []
+    for section, text in [p for d in deltas for p in splitter.feed(d)] + splitter.flush():
+        if merged and merged[-1][0] == section:
+            merged[-1] = (section, merged[-1][1] + text)
+        else:
+            merged.append((section, text))
+    return merged
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 7, 13, len(REPLY)])
+def test_markers_split_across_deltas(size):
+    assert _collect(chunk_text(REPLY, size)) == EXPECTED
+
+
+def test_every_split_point_hides_markers():
+    for cut in range(len(REPLY)):
+        pairs = _collect([REPLY[:cut], REPLY[cut:]])
+        assert pairs == EXPECTED
+        assert not any('---' in text for _, text in pairs)
+
+
+def test_partial_marker_is_held_until_resolved():
+    splitter = SectionSplitter()
+    assert splitter.feed('Hello ---GRAM') == [('reply', 'Hello ')]
+    assert splitter.feed('MAR---ok') == [('grammar', 'ok')]
+    # 看起來像分隔符號開頭、最後不是的文字仍要送出
+    assert splitter.feed(' a --') == [('grammar', ' a ')]
+    assert splitter.flush() == [('grammar', '--')]
+
+
+def test_reply_section_drops_grammar_and_translation():
+    assert reply_section(REPLY) == 'Great answer!'
+    assert reply_section('Plain reply') == 'Plain reply'
+
+
+def test_sse_event_format():
+    event = sse_event('reply', {'text': 'line 1\nline 2'})
+    assert event.startswith('event: reply\ndata: ') and event.endswith('\n\n')
+    assert json.loads(event.split('data: ', 1)[1]) == {'text': 'line 1\nline 2'}
+
+
+def _parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_stream_endpoint_replays_fallback_as_events(offline_app):
+    with offline_app.stream('POST', '/api/chat/stream', json={
+        'messages': [{'role': 'user', 'content': 'hello'}],
+    }) as r:
+        assert r.status_code == 200
+        assert r.headers['content-type'].startswith('text/event-stream')
+        events = _parse_sse(r.read().decode())
+
+    assert events[-1] == ('done', {'source': 'fallback', 'reason': 'no_api_key'})
+    assert all(name == 'reply' for name, _ in events[:-1])
+    assert ''.join(data['text'] for _, data in events[:-1]).strip()
@@ -0,0 +1,115 @@
+import pytest
+
+from services import api_health as api_health_module
+from services.api_health import CLOSED, HALF_OPEN, OPEN, APIHealthChecker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(api_health_module, 'time', clock)
+    return clock
+
+
+def _breaker(**overrides) -> APIHealthChecker:
+    options = dict(error_threshold=0.5, min_requests=4, window_seconds=30, cooldown_seconds=10,
+                   max_cooldown_seconds=100, half_open_probes=2, probe_timeout_seconds=60)
+    options.update(overrides)
+    breaker = APIHealthChecker(**options)
+    breaker.set_has_api_key(True)
+    return breaker
+
+
+def _trip(breaker: APIHealthChecker):
+    for _ in range(4):
+        breaker.mark_failure()
+    assert breaker.state == OPEN
+
+
+def test_needs_min_requests_and_error_rate_to_trip(clock):
+    breaker = _breaker()
+    breaker.mark_failure()
+    breaker.mark_failure()
+    assert breaker.state == CLOSED  # 只有 2 個請求
+    for _ in range(4):
+        breaker.mark_success()
+    breaker.mark_failure()
+    assert breaker.state == CLOSED  # 3/7 < 50%
+    breaker.mark_failure()
+    assert breaker.state == OPEN  # 4/8
+
+
+def test_old_failures_age_out_of_the_window(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.mark_failure()
+    clock.now += 31
+    breaker.mark_failure()
+    assert breaker.state == CLOSED
+    assert breaker.get_status()['window_requests'] == 1
+
+
+def test_open_short_circuits_until_cooldown(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    cooldown = breaker.get_status()['current_cooldown_seconds']
+    assert 8 <= cooldown <= 12
+    assert not breaker.allow_request()
+    # get_status 把冷卻時間四捨五入到 0.1 秒，多走 0.1 秒才一定過了冷卻
+    clock.now += cooldown + 0.1
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert breaker.get_status()['short_circuited'] == 1
+
+
+def test_half_open_admits_only_the_probe_budget(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock.now += 20
+    assert breaker.allow_request() and breaker.allow_request()
+    assert not breaker.allow_request()
+    # 沒打到上游的 probe 歸還名額
+    breaker.mark_skipped()
+    assert breaker.allow_request()
+    breaker.mark_success()
+    breaker.mark_success()
+    assert breaker.state == CLOSED
+    assert breaker.get_status()['consecutive_trips'] == 0
+
+
+def test_failed_probe_reopens_with_longer_cooldown(clock):
+    breaker = _breaker()
+    _trip(breaker)
+    clock.now += 20
+    assert breaker.allow_request()
+    breaker.mark_failure()
+    status = breaker.get_status()
+    assert status['state'] == OPEN and status['consecutive_trips'] == 2
+    # 冷卻加倍（10 × 2，含 ±20% jitter）
+    assert 16 <= status['current_cooldown_seconds'] <= 24
+
+
+def test_abandoned_probes_expire(clock):
+    breaker = _breaker(probe_timeout_seconds=5)
+    _trip(breaker)
+    clock.now += 20
+    assert breaker.allow_request() and breaker.allow_request()
+    assert not breaker.allow_request()
+    clock.now += 6
+    assert breaker.allow_request()
+    assert breaker.get_status()['probe_timeouts'] == 2
+
+
+def test_without_api_key_never_calls_upstream(clock):
+    breaker = _breaker()
+    breaker.set_has_api_key(False)
+    assert not breaker.allow_request()
+    assert not breaker.is_available
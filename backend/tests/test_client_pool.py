@@ -0,0 +1,41 @@
+import asyncio
+
+from services.client_pool import AnthropicClientPool
+
+
+def _closed(client) -> bool:
+    return client._client.is_closed
+
+
+def test_evicted_client_waits_for_inflight_requests():
+    async def run():
+        pool = AnthropicClientPool(max_clients=1)
+        pool.configure('', timeout_seconds=5)
+        lease = pool.lease('sk-a')
+        pool.get('sk-b')  # LRU 淘汰 sk-a
+        await asyncio.sleep(0)
+        assert not _closed(lease.client)
+        assert pool.get_status()['draining_clients'] == 1
+
+        lease.release()
+        lease.release()  # 重複歸還不影響計數
+        await asyncio.gather(*pool._closing)
+        assert _closed(lease.client)
+        assert pool.get_status()['draining_clients'] == 0
+        await pool.aclose()
+
+    asyncio.run(run())
+
+
+def test_idle_evicted_client_closes_immediately():
+    async def run():
+        pool = AnthropicClientPool(max_clients=1)
+        pool.configure('', timeout_seconds=5)
+        with pool.lease('sk-a') as client:
+            pass
+        pool.get('sk-b')
+        await asyncio.gather(*pool._closing)
+        assert _closed(client)
+        await pool.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,120 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+import compact_question_bank as compact  # noqa: E402
+
+SENTENCE = 'If I had known about the meeting, I would have arrived much earlier than everyone else.'
+
+
+def _write(path: Path, items):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(items, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+@pytest.fixture
+def small_bank(tmp_path) -> Path:
+    data_dir = tmp_path / 'bank'
+    _write(data_dir / 'drills' / 'grammar_fill.json', [
+        {'id': 'g1', 'sentence': SENTENCE, 'answer': 'had known'},
+        {'id': 'g2', 'sentence': SENTENCE.replace('much earlier', 'much  earlier!'), 'answer': 'had known'},
+        {'id': 'g3', 'sentence': SENTENCE.replace('arrived', 'arrivied'), 'answer': 'had known'},
+        {'id': 'g4', 'sentence': 'She has been living in this small town since she was a child.', 'answer': 'has been'},
+    ])
+    # 與 grammar_fill 同文字，但不同檔案不互相比對
+    _write(data_dir / 'drills' / 'vocabulary.json', [{'id': 'v1', 'prompt': SENTENCE}])
+    _write(data_dir / 'fallback_responses' / 'restaurant.json', [
+        {'id': 'r1', 'keywords': ['menu'], 'user_example': 'Could I please see the menu for tonight?', 'response': 'Sure.'},
+        {'id': 'r2', 'keywords': ['Menu', 'dinner list'], 'user_example': 'Could I please see the menu for tonight',
+         'response': 'Of course.'},
+        {'id': 'r3', 'keywords': ['bill'], 'user_example': 'Can we get the bill, please?', 'response': 'Right away.'},
+    ])
+    _write(data_dir / 'metadata.json', {
+        'stats': {'drills': 5, 'responses': 3},
+        'files': {'drills': [{'file': 'grammar_fill.json', 'count': 4, 'level': 'B2'}]},
+    })
+    return data_dir
+
+
+def _compact(data_dir: Path, work_dir: Path, threshold: float = 0.7) -> compact.Compactor:
+    compactor = compact.Compactor(compact.BankFiles(data_dir), work_dir, threshold)
+    compactor.fingerprint()
+    compactor.cluster()
+    return compactor
+
+
+def _read(path: Path) -> list[dict]:
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def test_minhash_estimates_similarity():
+    a = compact.minhash(compact.normalize(SENTENCE))
+    assert np.array_equal(a, compact.minhash(compact.normalize(SENTENCE.upper() + '!!')))
+    near = (a == compact.minhash(compact.normalize(SENTENCE.replace('arrived', 'arrivied')))).mean()
+    far = (a == compact.minhash(compact.normalize('Could I please see the menu for tonight?'))).mean()
+    assert near >= 0.7 and far < 0.2
+
+
+def test_streaming_reader_handles_chunk_boundaries(tmp_path, monkeypatch):
+    items = [{'id': i, 'text': 'x' * (i * 7)} for i in range(50)]
+    path = tmp_path / 'items.json'
+    _write(path, items)
+    monkeypatch.setattr(compact, 'CHUNK_SIZE', 64)
+    assert list(compact.iter_json_array(path)) == items
+
+    _write(path, {'questions': items[:3]})
+    assert list(compact.iter_json_array(path)) == items[:3]
+
+
+def test_array_writer_matches_json_dumps(tmp_path):
+    items = [{'id': 'a', 'zh': '中文', 'options': [1, 2]}, {'id': 'b'}]
+    writer = compact.ArrayWriter(tmp_path / 'out' / 'items.json')
+    for item in items:
+        writer.write(item)
+    writer.close()
+    assert writer.path.read_text(encoding='utf-8') == json.dumps(items, ensure_ascii=False, indent=2)
+
+
+def test_near_duplicates_cluster_to_the_earliest_item(small_bank, tmp_path):
+    compactor = _compact(small_bank, tmp_path)
+    # 序號：grammar_fill 0-3、vocabulary 4、restaurant 5-7
+    assert compactor.parent.tolist() == [0, 0, 0, 3, 4, 5, 5, 7]
+
+
+def test_write_keeps_survivors_with_stable_ids_and_merged_keywords(small_bank, tmp_path):
+    out_dir = tmp_path / 'out'
+    compactor = _compact(small_bank, tmp_path)
+    counts = compactor.write(out_dir, small_bank, compactor.merged_keywords())
+    assert counts == {('drills', 'grammar_fill'): 2, ('drills', 'vocabulary'): 1, ('fallback_responses', 'restaurant'): 2}
+
+    grammar = _read(out_dir / 'drills' / 'grammar_fill.json')
+    assert [q['sentence'] for q in grammar] == [SENTENCE, 'She has been living in this small town since she was a child.']
+    assert all(q['id'].startswith('grammar_fill_') for q in grammar)
+
+    responses = _read(out_dir / 'fallback_responses' / 'restaurant.json')
+    assert responses[0]['response'] == 'Sure.'
+    assert responses[0]['keywords'] == ['menu', 'dinner list']
+    assert responses[1]['keywords'] == ['bill']
+
+    # 內容不變 id 就不變：再壓一次結果相同
+    work_dir, again_dir = tmp_path / 'again_work', tmp_path / 'again'
+    work_dir.mkdir()
+    again = _compact(out_dir, work_dir)
+    again.write(again_dir, out_dir, again.merged_keywords())
+    assert _read(again_dir / 'drills' / 'grammar_fill.json') == grammar
+
+
+def test_metadata_counts_are_updated_in_place(small_bank, tmp_path):
+    out_dir = tmp_path / 'out'
+    compactor = _compact(small_bank, tmp_path)
+    counts = compactor.write(out_dir, small_bank, compactor.merged_keywords())
+    compact.update_metadata(out_dir, small_bank, counts, removed=3, threshold=0.7)
+    metadata = _read(out_dir / 'metadata.json')
+    assert metadata['stats'] == {'drills': 3, 'responses': 2}
+    assert metadata['files']['drills'] == [{'file': 'grammar_fill.json', 'count': 2, 'level': 'B2'}]
+    assert metadata['compaction']['removed'] == 3
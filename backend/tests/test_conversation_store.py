@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.conversation_store import ConversationOutOfSync, ConversationService
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def service(request, tmp_path):
+    svc = ConversationService()
+    svc.configure(request.param, tmp_path / 'conversations.db', token_budget=60, keep_recent=2)
+    yield svc
+    svc.close()
+
+
+def _user(text: str) -> dict:
+    return {'role': 'user', 'content': text}
+
+
+def test_offload_runs_sqlite_off_the_event_loop(service):
+    async def caller_thread():
+        loop_thread = threading.get_ident()
+        return loop_thread, await service.offload(threading.get_ident)
+
+    loop_thread, worker_thread = asyncio.run(caller_thread())
+    assert (worker_thread != loop_thread) == (service.get_status()['backend'] == 'sqlite')
+
+
+def test_turns_append_and_detect_out_of_sync(service):
+    turn = service.prepare('c1', 0, [_user('hi')])
+    service.commit('c1', turn, 'hello')
+    turn = service.prepare('c1', 2, [_user('how are you?')])
+    assert [m['content'] for m in turn.messages] == ['hi', 'hello', 'how are you?']
+    service.commit('c1', turn, 'fine')
+    with pytest.raises(ConversationOutOfSync):
+        service.prepare('c1', 2, [_user('stale')])
+
+
+def test_compact_folds_old_messages_into_summary(service):
+    history = 0
+    for i in range(4):
+        turn = service.prepare('c1', history, [_user(f'message number {i} ' + 'word ' * 20)])
+        over_budget = service.commit('c1', turn, f'reply {i} ' + 'word ' * 20)
+        history += 2
+    assert over_budget
+
+    asyncio.run(service.compact('c1'))
+    turn = service.prepare('c1', history, [_user('next')])
+    assert turn.summary
+    assert turn.total == history + 1
+    assert len(turn.messages) < history + 1
+    assert turn.messages[0]['role'] == 'user'
+    assert service.get_status()['compactions'] == 1
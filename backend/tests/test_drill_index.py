@@ -0,0 +1,140 @@
+import json
+
+import pytest
+
+from services.drill_index import DrillIndex, describe_type, drill_tags, parse_levels
+from services.question_bank_service import QuestionBankService
+
+FILE_META = {'level': 'B2-C1', 'topics': ['Conditionals', 'prepositions']}
+
+
+def test_parse_levels_expands_ranges():
+    assert parse_levels('B2-C1') == ['B2', 'C1']
+    assert parse_levels(['a1', 'B1-B2']) == ['A1', 'B1', 'B2']
+    assert parse_levels('advanced') == []
+
+
+def test_drill_tags_use_only_item_fields():
+    assert drill_tags({'id': 'g1'}) == {'id': 'g1', 'levels': [], 'topics': []}
+    assert drill_tags({'id': 'g2', 'level': 'B1', 'topic': ' Modals '}) == {
+        'id': 'g2', 'levels': ['B1'], 'topics': ['modals'],
+    }
+
+
+def test_file_description_is_not_a_filter():
+    index = DrillIndex(
+        {
+            'grammar_fill': [drill_tags({'id': 'g1'}), drill_tags({'id': 'g2', 'level': 'B2', 'topic': 'conditionals'})],
+            'vocabulary': [drill_tags({'id': 'v1', 'level': 'B2'})],
+        },
+        descriptions={'grammar_fill': describe_type(FILE_META)},
+    )
+    assert list(index.match(level='B2', topic='conditionals')) == [1]
+    assert list(index.match(topic='prepositions')) == []
+    assert list(index.match(drill_type='vocabulary', level='B2')) == [2]
+
+    facets = index.facets()
+    assert facets['types']['grammar_fill'] == {
+        'count': 2, 'levels': ['B2', 'C1'], 'topics': ['conditionals', 'prepositions'],
+    }
+    assert facets['types']['vocabulary'] == {'count': 1, 'levels': [], 'topics': []}
+    assert facets['topics'] == {'conditionals': 1}
+
+
+def _tag_grammar_drills(bank_dir, tags: dict[str, dict]):
+    path = bank_dir / 'drills' / 'grammar_fill.json'
+    questions = json.loads(path.read_text(encoding='utf-8'))
+    for question in questions:
+        question.update(tags.get(question['id'], {}))
+    path.write_text(json.dumps(questions, ensure_ascii=False), encoding='utf-8')
+
+
+@pytest.fixture
+def bank(bank_dir) -> QuestionBankService:
+    _tag_grammar_drills(bank_dir, {
+        'grammar_fill_001': {'level': 'B2', 'topic': 'conditionals'},
+        'grammar_fill_002': {'level': 'B1-B2', 'topic': 'conditionals'},
+        'grammar_fill_003': {'level': 'A2', 'topic': 'tenses'},
+    })
+    service = QuestionBankService()
+    service.configure_storage('json')
+    service.load(bank_dir)
+    return service
+
+
+def test_query_filters_by_item_tags(bank):
+    _, page = bank.query_drills(level='b2', topic=' Conditionals ')
+    assert page['total'] == 2
+    assert [item['id'] for item in page['items']] == ['grammar_fill_001', 'grammar_fill_002']
+    assert page['items'][0]['question']['id'] == 'grammar_fill_001'
+    assert page['items'][0]['type'] == 'grammar_fill'
+
+    _, page = bank.query_drills(drill_type='vocabulary', level='B2')
+    assert page['total'] == 0 and page['items'] == []
+
+
+def test_cursor_walks_every_match_once(bank):
+    _, first = bank.query_drills(limit=15)
+    total = first['total']
+    seen = [item['id'] for item in first['items']]
+    cursor = first['next_cursor']
+    while cursor:
+        _, page = bank.query_drills(limit=15, cursor=cursor)
+        seen += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+    assert len(seen) == total == len(set(seen))
+
+
+def test_invalid_query_is_rejected(bank):
+    with pytest.raises(ValueError):
+        bank.query_drills(drill_type='essay')
+    with pytest.raises(ValueError):
+        bank.query_drills(level='D1')
+    with pytest.raises(ValueError):
+        bank.query_drills(cursor='not-a-cursor')
+
+
+def test_cursor_expires_when_the_bank_changes(bank_dir, bank):
+    _, page = bank.query_drills(limit=5)
+    _tag_grammar_drills(bank_dir, {'grammar_fill_004': {'level': 'C1'}})
+    bank.load(bank_dir)
+    with pytest.raises(ValueError, match='cursor'):
+        bank.query_drills(limit=5, cursor=page['next_cursor'])
+
+
+def test_etag_revalidation(bank):
+    etag, page = bank.query_drills(level='B2')
+    assert etag and page is not None
+    assert bank.query_drills(level='B2', if_none_match=etag) == (etag, None)
+    assert bank.query_drills(level='B2', if_none_match=f'W/{etag}') == (etag, None)
+    other, page = bank.query_drills(level='B1', if_none_match=etag)
+    assert other != etag and page is not None
+
+    facets_etag, facets = bank.drill_facets()
+    assert facets['levels'] == {'A2': 1, 'B1': 1, 'B2': 2}
+    assert facets['topics'] == {'conditionals': 2, 'tenses': 1}
+    assert bank.drill_facets(if_none_match=facets_etag) == (facets_etag, None)
+
+
+def test_seeded_sample_is_reproducible(bank):
+    etag, first = bank.query_drills(sample=5, seed=7)
+    assert etag is not None
+    assert bank.query_drills(sample=5, seed=7)[1]['items'] == first['items']
+    assert len(first['items']) == 5 and first['next_cursor'] is None
+
+    etag, _ = bank.query_drills(sample=5)
+    assert etag is None  # 不帶 seed 每次不同，不能快取
+
+
+def test_drills_endpoint_revalidates_and_rejects_bad_queries(offline_app):
+    response = offline_app.get('/api/drills', params={'type': 'grammar_fill', 'limit': 3})
+    assert response.status_code == 200
+    assert len(response.json()['items']) == 3
+    etag = response.headers['ETag']
+    again = offline_app.get('/api/drills', params={'type': 'grammar_fill', 'limit': 3},
+                            headers={'If-None-Match': etag})
+    assert again.status_code == 304
+
+    assert offline_app.get('/api/drills', params={'level': 'Z9'}).status_code == 400
+    unseeded = offline_app.get('/api/drills', params={'sample': 2})
+    assert 'ETag' not in unseeded.headers and unseeded.headers['Cache-Control'] == 'no-store'
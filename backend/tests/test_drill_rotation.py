@@ -0,0 +1,24 @@
+from collections import Counter
+
+import pytest
+
+from services.drill_rotation import DrillRotation
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100, 1000, 4097])
+def test_each_round_is_a_permutation(size):
+    rotation = DrillRotation()
+    rotation.reset(size)
+    for _ in range(3):
+        assert sorted(rotation.draw('s') for _ in range(size)) == list(range(size))
+
+
+def test_order_has_no_visible_pattern():
+    rotation = DrillRotation()
+    rotation.reset(1000)
+    seq = [rotation.draw('s') for _ in range(1000)]
+    # 2 的次方 LCG 的低位元每次交替、步長固定；隨機排列兩者都不會出現
+    alternations = sum((a ^ b) & 1 for a, b in zip(seq, seq[1:]))
+    assert 350 < alternations < 650
+    strides = Counter((b - a) % 1000 for a, b in zip(seq, seq[1:]))
+    assert strides.most_common(1)[0][1] < 30
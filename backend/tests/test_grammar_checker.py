@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'scripts'))
+
+from bench_grammar_checker import CORRECT, ERRORS  # noqa: E402
+from services.grammar_checker import grammar_checker  # noqa: E402
+
+# 曾被誤改的正確句子（疑問句倒裝、感官 / 使役動詞的受詞、married with + 物、名詞子句的 if…will）
+REGRESSIONS = [
+    'What is it like to work there?',
+    'Was he like that?',
+    'Is it like this?',
+    'Have you ever seen it work?',
+    'I saw it go.',
+    'Are you married with children?',
+    'Tell me if he will be there.',
+    'I asked him if he will come.',
+]
+
+
+@pytest.mark.parametrize('sentence,expected', [(s, e) for s, e in ERRORS if e])
+def test_flags_learner_error(sentence, expected):
+    assert expected in [c.original for c in grammar_checker.check(sentence)]
+
+
+@pytest.mark.parametrize('sentence', CORRECT + REGRESSIONS)
+def test_no_false_correction(sentence):
+    assert grammar_checker.check(sentence) == []
+
+
+@pytest.mark.parametrize('sentence,corrected', [
+    ('He go to the office by bus every day.', 'He goes to the office by bus every day.'),
+    ('If it will rain tomorrow, we will cancel the trip.', 'If it rains tomorrow, we will cancel the trip.'),
+    ('I waited for a hour.', 'I waited for an hour.'),
+    ('She drew an unicorn for her daughter.', 'She drew a unicorn for her daughter.'),
+    ('I am engineer at a startup.', 'I am an engineer at a startup.'),
+    ('She is married with a doctor.', 'She is married to a doctor.'),
+    ('I will call you if it will rain.', 'I will call you if it rains.'),
+])
+def test_corrected_text(sentence, corrected):
+    assert grammar_checker.corrected_text(sentence)[0] == corrected
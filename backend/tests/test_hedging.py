@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionRejected
+from services.hedging import _MIN_SAMPLES, HedgedCaller, iter_with_timeouts
+
+
+def _value(result, delay: float = 0.0):
+    async def attempt():
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+    return attempt
+
+
+def _rejected():
+    async def attempt():
+        raise AdmissionRejected('full')
+    return attempt
+
+
+async def _warm_up(caller: HedgedCaller):
+    # 累積足夠的快速樣本，p95 ≈ 0，hedge 時機落在 min_hedge_delay
+    for _ in range(_MIN_SAMPLES):
+        await caller.call(_value('warm'), _value('warm'))
+
+
+def test_no_hedge_before_enough_samples():
+    caller = HedgedCaller(budget_ratio=1.0, min_hedge_delay_seconds=0.01)
+
+    async def run():
+        return await caller.call(_value('primary', 0.05), _value('hedge'))
+
+    assert asyncio.run(run()) == 'primary'
+    assert caller.get_status()['hedges'] == 0
+
+
+def test_slow_primary_loses_to_the_hedge():
+    caller = HedgedCaller(budget_ratio=1.0, min_hedge_delay_seconds=0.02)
+
+    async def run():
+        await _warm_up(caller)
+        return await caller.call(_value('primary', 1.0), _value('hedge'))
+
+    assert asyncio.run(run()) == 'hedge'
+    status = caller.get_status()
+    assert status['hedges'] == 1 and status['hedge_wins'] == 1
+
+
+def test_fast_primary_never_hedges():
+    caller = HedgedCaller(budget_ratio=1.0, min_hedge_delay_seconds=0.5)
+
+    async def run():
+        await _warm_up(caller)
+        return await caller.call(_value('primary', 0.01), _value('hedge'))
+
+    assert asyncio.run(run()) == 'primary'
+    assert caller.get_status()['hedges'] == 0
+
+
+def test_hedges_are_limited_by_the_budget():
+    # 21 個請求 × 0.01 = 0.21 個 token，不夠送一次 hedge
+    caller = HedgedCaller(budget_ratio=0.01, min_hedge_delay_seconds=0.01)
+
+    async def run():
+        await _warm_up(caller)
+        return await caller.call(_value('primary', 0.05), _value('hedge'))
+
+    assert asyncio.run(run()) == 'primary'
+    status = caller.get_status()
+    assert status['hedges'] == 0 and status['budget_denied'] == 1
+
+
+def test_rejected_hedge_keeps_waiting_for_the_primary():
+    caller = HedgedCaller(budget_ratio=1.0, min_hedge_delay_seconds=0.01)
+
+    async def run():
+        await _warm_up(caller)
+        return await caller.call(_value('primary', 0.05), _rejected())
+
+    assert asyncio.run(run()) == 'primary'
+    status = caller.get_status()
+    assert status['hedge_shed'] == 1 and status['hedge_wins'] == 0
+
+
+def test_deadline_raises_timeout():
+    caller = HedgedCaller(deadline_seconds=0.05)
+
+    async def run():
+        await caller.call(_value('primary', 1.0))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert caller.get_status()['deadline_exceeded'] == 1
+
+
+def test_primary_error_is_raised():
+    caller = HedgedCaller()
+
+    async def run():
+        await caller.call(_rejected())
+
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(run())
+
+
+async def _stream(delays):
+    for i, delay in enumerate(delays):
+        await asyncio.sleep(delay)
+        yield i
+
+
+async def _collect(source, first_timeout, idle_timeout):
+    return [item async for item in iter_with_timeouts(source, first_timeout, idle_timeout)]
+
+
+def test_stream_within_timeouts_passes_through():
+    items = asyncio.run(_collect(_stream([0.03, 0, 0]), first_timeout=0.5, idle_timeout=0.5))
+    assert items == [0, 1, 2]
+
+
+def test_slow_first_item_times_out():
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(_collect(_stream([0.2]), first_timeout=0.02, idle_timeout=1.0))
+
+
+def test_idle_gap_after_first_item_times_out():
+    received = []
+
+    async def run():
+        async for item in iter_with_timeouts(_stream([0, 0.2]), first_timeout=1.0, idle_timeout=0.02):
+            received.append(item)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+    assert received == [0]
@@ -0,0 +1,77 @@
+import json
+import threading
+
+from services.question_bank_service import QuestionBankService
+
+
+def _edit_weekend_reply(bank_dir, text: str):
+    path = bank_dir / 'fallback_responses' / 'free-chat.json'
+    entries = json.loads(path.read_text(encoding='utf-8'))
+    entry = next(e for e in entries if 'weekend' in e['keywords'])
+    entry['response'] = text
+    path.write_text(json.dumps(entries, ensure_ascii=False), encoding='utf-8')
+
+
+def _loaded(bank_dir) -> QuestionBankService:
+    service = QuestionBankService()
+    service.configure_storage('json')
+    service.load(bank_dir)
+    return service
+
+
+def test_reload_without_changes_keeps_the_snapshot(bank_dir):
+    service = _loaded(bank_dir)
+    state = service._state
+    assert service.reload() == {'changed': False, 'generation': 1}
+    assert service._state is state
+
+
+def test_reload_reparses_only_changed_files_and_swaps_atomically(bank_dir):
+    service = _loaded(bank_dir)
+    old_state = service._state
+    session_rotation = old_state.rotation
+
+    _edit_weekend_reply(bank_dir, 'Reloaded weekend reply.')
+    result = service.reload()
+
+    assert result['changed'] and result['generation'] == 2
+    assert result['reparsed'] == ['fallback_responses/free-chat.json']
+    assert service.get_fallback_reply('free chat', 'Weekend plans?') == 'Reloaded weekend reply.'
+    # 進行中的請求拿著舊快照，內容不受影響
+    assert old_state.fallback_responses['free-chat'] is not service._state.fallback_responses['free-chat']
+    assert 'Reloaded' not in json.dumps(old_state.fallback_responses['free-chat'])
+    # 題數沒變：出題輪替沿用，session 不會重新開始
+    assert service._state.rotation is session_rotation
+    # 沒變的場景沿用原本的索引
+    assert service._state.matchers['interview-prep'] is old_state.matchers['interview-prep']
+
+
+def test_readers_never_fail_during_reloads(bank_dir):
+    service = _loaded(bank_dir)
+    original = service.get_fallback_reply('free chat', 'Weekend plans?')
+    errors: list[BaseException] = []
+    replies: set[str] = set()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                replies.add(service.get_fallback_reply('free chat', 'Weekend plans?', 's'))
+            except BaseException as e:  # noqa: BLE001 - 任何例外都算失敗
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for i in range(20):
+        _edit_weekend_reply(bank_dir, f'Version {i}.')
+        service.reload()
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    # 每次讀到的都是某一版完整的回覆
+    assert replies <= {original} | {f'Version {i}.' for i in range(20)}
+    assert service.get_fallback_reply('free chat', 'Weekend plans?') == 'Version 19.'
@@ -0,0 +1,79 @@
+import gzip
+import json
+
+from services.drill_text import GRAMMAR_SEPARATOR
+from services.json_response import JSONResponder, dumps
+
+LONG_REPLY = 'Let us practise ordering food at a restaurant. ' * 40
+
+
+def _responder(min_bytes: int = 256) -> JSONResponder:
+    responder = JSONResponder()
+    responder.configure(compression_enabled=True, min_bytes=min_bytes)
+    return responder
+
+
+def test_dumps_is_compact_utf8():
+    assert dumps({'reply': '你好', 'n': [1, 2]}) == '{"reply":"你好","n":[1,2]}'.encode('utf-8')
+
+
+def test_reply_bodies_are_cached_per_reply_and_encoding():
+    responder = _responder()
+    first = responder.reply(LONG_REPLY, 'gzip')
+    second = responder.reply(LONG_REPLY, 'gzip, br')
+    third = responder.reply(LONG_REPLY, 'gzip')
+    assert first.headers['Content-Encoding'] == third.headers['Content-Encoding'] == 'gzip'
+    assert second.headers['Content-Encoding'] == 'br'
+    assert first.body is third.body  # 同一則回覆只壓一次
+    assert json.loads(gzip.decompress(first.body)) == {'reply': LONG_REPLY}
+    assert first.headers['Vary'] == 'Accept-Encoding'
+
+    status = responder.get_status()
+    assert status['cached_replies'] == 1
+    assert status['reply_cache_hit_rate'] == round(2 / 3, 3)
+
+
+def test_small_bodies_are_sent_uncompressed():
+    responder = _responder()
+    response = responder.reply('Hi!', 'gzip, br')
+    assert 'Content-Encoding' not in response.headers
+    assert json.loads(response.body) == {'reply': 'Hi!'}
+
+
+def test_render_does_not_touch_the_reply_cache():
+    responder = _responder()
+    response = responder.render({'reply': LONG_REPLY}, 'gzip')
+    assert json.loads(gzip.decompress(response.body)) == {'reply': LONG_REPLY}
+    assert responder.get_status()['cached_replies'] == 0
+
+
+def test_compressed_render_weakens_the_etag():
+    responder = _responder()
+    compressed = responder.render({'reply': LONG_REPLY}, 'gzip', {'ETag': '"v1"'})
+    assert compressed.headers['ETag'] == 'W/"v1"'
+    plain = responder.render({'reply': LONG_REPLY}, None, {'ETag': '"v1"'})
+    assert plain.headers['ETag'] == '"v1"'
+    already_weak = responder.render({'reply': LONG_REPLY}, 'gzip', {'ETag': 'W/"v1"'})
+    assert already_weak.headers['ETag'] == 'W/"v1"'
+
+
+def test_compression_can_be_disabled():
+    responder = JSONResponder()
+    responder.configure(compression_enabled=False, min_bytes=0)
+    response = responder.reply(LONG_REPLY, 'gzip, br')
+    assert 'Content-Encoding' not in response.headers and 'Vary' not in response.headers
+    assert responder.get_status()['sent_bytes'] == responder.get_status()['raw_bytes']
+
+
+def test_grammar_replies_bypass_the_reply_cache(offline_app):
+    def cached() -> int:
+        return offline_app.get('/api/status').json()['responses']['cached_replies']
+
+    before = cached()
+    response = offline_app.post('/api/chat', json={
+        'messages': [{'role': 'user', 'content': 'Yesterday I goed to the store with my friend.'}],
+        'system_prompt': 'free chat\n---GRAMMAR_MODE---',
+    })
+    assert response.status_code == 200
+    assert GRAMMAR_SEPARATOR in response.json()['reply']
+    assert cached() == before
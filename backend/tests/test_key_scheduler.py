@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.admission import AdaptiveLimiter
+from services.key_scheduler import KeyScheduler, Throttled
+
+
+def _scheduler(tpm: int) -> KeyScheduler:
+    scheduler = KeyScheduler(AdaptiveLimiter(4, min_limit=1, max_limit=4))
+    scheduler.configure(0, tpm, 0, 0, env_weight=1.0, max_pending=8)
+    return scheduler
+
+
+def _usage(tokens: int):
+    return SimpleNamespace(input_tokens=tokens, output_tokens=0, cache_creation_input_tokens=0)
+
+
+def test_settle_refunds_against_amount_taken():
+    scheduler = _scheduler(tpm=1000)
+
+    async def run():
+        async with await scheduler.acquire('sk-a', 5000, 1.0):
+            pass
+
+    asyncio.run(run())
+    # 估計 5000 超過容量只扣了 1000；實際用 800，只退 200（不是 4200）
+    scheduler.settle('sk-a', 5000, _usage(800))
+    bucket = scheduler._state('sk-a').tokens
+    assert 199 <= bucket.level <= 202
+
+
+def test_exhausted_quota_throttles():
+    scheduler = _scheduler(tpm=600)
+
+    async def run():
+        async with await scheduler.acquire('sk-a', 600, 0.0):
+            pass
+        try:
+            await scheduler.acquire('sk-a', 600, 0.0)
+        except Throttled as e:
+            return e.reason
+
+    assert asyncio.run(run()) == 'tpm'
@@ -0,0 +1,46 @@
+import random
+
+from services.keyword_matcher import KeywordMatcher
+
+
+def naive_find(keyword_lists: list[list[str]], text: str) -> int:
+    """原本的逐筆比對：第一個有 keyword 是子字串的 entry"""
+    for idx, keywords in enumerate(keyword_lists):
+        if any(kw.lower() in text for kw in keywords):
+            return idx
+    return -1
+
+
+def test_returns_first_matching_entry_not_first_position():
+    matcher = KeywordMatcher([['salary', 'pay'], ['team'], ['hi']])
+    # team 先出現在訊息裡，但 entry 0 的 pay 優先
+    assert matcher.find('tell me about the team and the pay') == 0
+    assert matcher.find('who is on the team') == 1
+    assert matcher.find('good weather today') == -1
+
+
+def test_overlapping_keywords_use_fail_links():
+    matcher = KeywordMatcher([['she sells'], ['he'], ['sell']])
+    assert matcher.find('ushers') == 1
+    assert matcher.find('she sells shells') == 0
+    assert matcher.find('sellers') == 2
+
+
+def test_keywords_are_case_insensitive_and_empty_keyword_always_matches():
+    assert KeywordMatcher([['Netflix']]).find('i watch netflix') == 0
+    assert KeywordMatcher([['x'], ['']]).find('anything') == 1
+    assert KeywordMatcher([]).find('anything') == -1
+
+
+def test_matches_naive_scan_on_random_banks():
+    rng = random.Random(7)
+    alphabet = 'abc '
+    for _ in range(200):
+        keyword_lists = [
+            [''.join(rng.choices(alphabet, k=rng.randint(1, 4))) for _ in range(rng.randint(1, 3))]
+            for _ in range(rng.randint(1, 6))
+        ]
+        matcher = KeywordMatcher(keyword_lists)
+        for _ in range(20):
+            text = ''.join(rng.choices(alphabet, k=rng.randint(0, 12)))
+            assert matcher.find(text) == naive_find(keyword_lists, text), (keyword_lists, text)
@@ -0,0 +1,47 @@
+import asyncio
+
+from services.response_cache import ResponseCache, cache_key
+
+
+class LeaderOnlyError(Exception):
+    pass
+
+
+def test_cache_key_depends_on_scope():
+    params = {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}]}
+    assert cache_key(params, 'env') == cache_key(dict(reversed(params.items())), 'env')
+    assert cache_key(params, 'env') != cache_key(params, 'key-0123456789')
+
+
+def _run_leader_and_follower(shared_error):
+    cache = ResponseCache()
+    calls = []
+
+    async def fetch():
+        calls.append(len(calls))
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise LeaderOnlyError()
+        return 'reply'
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_fetch('k', fetch, shared_error))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_fetch('k', fetch, shared_error))
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    return asyncio.run(main()), calls
+
+
+def test_follower_refetches_on_leader_only_error():
+    (leader, follower), calls = _run_leader_and_follower(lambda e: not isinstance(e, LeaderOnlyError))
+    assert isinstance(leader, LeaderOnlyError)
+    assert follower == ('reply', False)
+    assert len(calls) == 2
+
+
+def test_follower_shares_upstream_error():
+    (leader, follower), calls = _run_leader_and_follower(lambda e: True)
+    assert isinstance(leader, LeaderOnlyError)
+    assert isinstance(follower, LeaderOnlyError)
+    assert len(calls) == 1
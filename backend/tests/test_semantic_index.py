@@ -0,0 +1,76 @@
+import pytest
+
+from config import Settings
+from services.question_bank_service import QuestionBankService
+
+pytest.importorskip('numpy')
+
+from services.semantic_index import SemanticIndex  # noqa: E402
+
+DEFAULT_MODE = Settings.model_fields['fallback_retrieval_mode'].default
+DEFAULT_THRESHOLD = Settings.model_fields['semantic_fallback_threshold'].default
+
+# 與某個預建回應字面相近、意思無關的訊息：應交給練習題，不能回答預建回應
+NEAR_MISSES = [
+    ('free-chat', 'What time is it'),
+    ('free-chat', 'What do you do for a living?'),
+    ('free-chat', 'How old are you?'),
+    ('free-chat', 'What is your name?'),
+    ('interview-prep', 'Can you repeat the question?'),
+    ('interview-prep', 'Thank you for your time'),
+]
+
+
+@pytest.fixture(scope='module', params=[DEFAULT_MODE, 'hybrid'])
+def bank(request):
+    service = QuestionBankService()
+    service.configure_retrieval(request.param, DEFAULT_THRESHOLD)
+    service.load()
+    return service
+
+
+def test_retrieval_defaults_to_keyword():
+    assert DEFAULT_MODE == 'keyword'
+
+
+@pytest.mark.parametrize('scenario,message', NEAR_MISSES)
+def test_near_miss_is_not_answered(bank, scenario, message):
+    assert bank._find_fallback_index(scenario, message) == -1
+
+
+def test_keyword_hit_still_answers(bank):
+    idx = bank._find_fallback_index('free-chat', 'Any plans for the weekend?')
+    assert bank._state.fallback_responses['free-chat'][idx]['user_example'].startswith("I don't have any plans")
+
+
+def test_search_ranks_closest_text_first():
+    index = SemanticIndex(['what is the salary for this role', 'who is on the team', 'when can i start'])
+    hits = index.search('what salary does the role pay', k=2)
+    assert hits[0][0] == 0
+    assert hits[0][1] > hits[1][1]
+    assert index.search('', k=1) == []
+
+
+def test_identical_text_scores_one_and_topk_is_sorted():
+    texts = ['how much does the job pay', 'who is on the team', 'what does a typical day look like']
+    index = SemanticIndex(texts)
+    hits = index.search(texts[2], k=3)
+    assert hits[0][0] == 2
+    assert hits[0][1] == pytest.approx(1.0, abs=1e-4)
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+    assert len(index.search('team', k=10)) == len(texts)
+
+
+def test_unseen_words_score_low():
+    index = SemanticIndex(['what is the salary', 'tell me about the team'])
+    assert index.search('zzqx vvbw', k=1) == []
+    (_, score), = index.search('salary zzqxvv wwbbyy qqrrtt', k=1)
+    assert score < 0.5
+
+
+def test_paraphrase_matches_when_semantic_retrieval_is_enabled():
+    service = QuestionBankService()
+    service.configure_retrieval('semantic', 0.3)
+    service.load()
+    idx = service._find_fallback_index('free-chat', "what's your favourite dish")
+    assert 'food' in service._state.fallback_responses['free-chat'][idx]['keywords']
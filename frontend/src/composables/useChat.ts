@@ -1,6 +1,7 @@
 import { ref, computed } from 'vue'
 import { API_BASE } from '../config/api'
 import { scenarios, type Scenario } from '../config/scenarios'
+import { localFallbackReply, syncBank } from '../utils/offline-bank'
 
 export interface ChatMessage {
   role: 'user' | 'assistant'
@@ -30,12 +31,63 @@ In the translation section:
 - Keep the translation concise and natural, matching the tone of the original
 - Do NOT translate the grammar notes, only the main conversational response`
 
+/** 逐一解析 SSE 事件（event + JSON data） */
+async function readEventStream(
+  body: ReadableStream<Uint8Array>,
+  onEvent: (event: string, data: { text?: string; message?: string; source?: string; reason?: string }) => void,
+) {
+  const reader = body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  for (;;) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let sep: number
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, sep)
+      buffer = buffer.slice(sep + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim()
+        else if (line.startsWith('data:')) data += line.slice(5).trim()
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
+/** 後端回報只能用題庫回答時（依原因），接下來這段時間直接用本機題庫回答 */
+const LOCAL_FALLBACK_MS: Record<string, number> = {
+  no_api_key: 60_000,
+  breaker_open: 30_000,
+}
+
+/** 每個分頁一個 session id，後端據此輪替離線練習題 */
+function getSessionId(): string {
+  let id = sessionStorage.getItem('sessionId')
+  if (!id) {
+    id = crypto.randomUUID()
+    sessionStorage.setItem('sessionId', id)
+  }
+  return id
+}
+
 export function useChat() {
   const messages = ref<ChatMessage[]>([])
+  // 伺服器端對話：每段對話一個 id，只送後端還沒有的訊息
+  let conversationId = crypto.randomUUID()
+  let syncedCount = 0
   const isLoading = ref(false)
   const grammarMode = ref(false)
   const translationMode = ref(true)
   const currentScenarioId = ref(scenarios[0]!.id)
+  // 在此時間之前不打 backend，直接用本機題庫回答
+  let localUntil = 0
 
   // API key 管理
   const apiEnabled = ref(localStorage.getItem('apiEnabled') === 'true')
@@ -55,9 +107,15 @@ export function useChat() {
     () => scenarios.find(s => s.id === currentScenarioId.value) ?? scenarios[0]!
   )
 
+  function resetConversation() {
+    conversationId = crypto.randomUUID()
+    syncedCount = 0
+  }
+
   function switchScenario(id: string) {
     currentScenarioId.value = id
     messages.value = []
+    resetConversation()
     addGreeting()
   }
 
@@ -75,6 +133,18 @@ export function useChat() {
     }
   }
 
+  function answerLocally(systemPrompt: string, text: string): string | null {
+    const local = localFallbackReply(systemPrompt, text, translationMode.value)
+    if (!local) return null
+    messages.value.push({
+      role: 'assistant',
+      content: local.reply,
+      timestamp: Date.now(),
+      ...(local.translation ? { translation: local.translation } : {}),
+    })
+    return local.reply
+  }
+
   async function sendMessage(text: string): Promise<string | null> {
     if (!text.trim() || isLoading.value) return null
 
@@ -86,20 +156,23 @@ export function useChat() {
 
     isLoading.value = true
 
-    try {
-      const apiMessages = messages.value.map(m => ({
-        role: m.role,
-        content: m.content,
-      }))
+    let systemPrompt = currentScenario.value.systemPrompt
+    if (grammarMode.value) systemPrompt += GRAMMAR_PROMPT_SUFFIX
+    if (translationMode.value) systemPrompt += TRANSLATION_PROMPT_SUFFIX
+    const ownKey = apiEnabled.value && !!apiKey.value
 
-      let systemPrompt = currentScenario.value.systemPrompt
-      if (grammarMode.value) systemPrompt += GRAMMAR_PROMPT_SUFFIX
-      if (translationMode.value) systemPrompt += TRANSLATION_PROMPT_SUFFIX
+    try {
+      // 後端剛回報只會用題庫回答：直接在本機回答（文法模式需要後端的文法檢查，仍送出）
+      if (!ownKey && !grammarMode.value && Date.now() < localUntil) {
+        const reply = answerLocally(systemPrompt, text.trim())
+        if (reply !== null) return reply
+      }
 
       const headers: Record<string, string> = {
         'Content-Type': 'application/json',
+        'X-Session-Id': getSessionId(),
       }
-      if (apiEnabled.value && apiKey.value) {
+      if (ownKey) {
         headers['X-Api-Key'] = apiKey.value
       }
 
@@ -108,55 +181,77 @@ export function useChat() {
       else if (translationMode.value) maxTokens = 800
       else if (grammarMode.value) maxTokens = 600
 
-      const res = await fetch(`${API_BASE}/api/chat`, {
-        method: 'POST',
-        headers,
-        body: JSON.stringify({
-          messages: apiMessages,
-          system_prompt: systemPrompt,
-          max_tokens: maxTokens,
-        }),
-      })
-
-      if (!res.ok) {
-        throw new Error(`API error: ${res.status}`)
-      }
-
-      const data = await res.json()
-      let reply = data.reply as string
-      let grammarNote: string | undefined
-      let translation: string | undefined
+      const post = (historyLength: number) =>
+        fetch(`${API_BASE}/api/chat/stream`, {
+          method: 'POST',
+          headers,
+          body: JSON.stringify({
+            messages: messages.value.slice(historyLength).map(m => ({
+              role: m.role,
+              content: m.content,
+            })),
+            system_prompt: systemPrompt,
+            max_tokens: maxTokens,
+            conversation_id: conversationId,
+            history_length: historyLength,
+          }),
+        })
 
-      // 先拆翻譯（在最後面）
-      if (translationMode.value && reply.includes('---TRANSLATION---')) {
-        const parts = reply.split('---TRANSLATION---')
-        reply = (parts[0] ?? '').trim()
-        translation = (parts[1] ?? '').trim()
+      let res = await post(syncedCount)
+      if (res.status === 409) {
+        // 後端沒有這段對話（重啟或已淘汰），改送完整歷史
+        res = await post(0)
       }
 
-      // 再拆文法（在中間）
-      if (grammarMode.value && reply.includes('---GRAMMAR---')) {
-        const parts = reply.split('---GRAMMAR---')
-        reply = (parts[0] ?? '').trim()
-        grammarNote = (parts[1] ?? '').trim()
+      if (!res.ok || !res.body) {
+        throw new Error(`API error: ${res.status}`)
       }
 
+      // 後端已按區段分好事件（reply / grammar / translation），邊收邊顯示
       messages.value.push({
         role: 'assistant',
-        content: reply,
+        content: '',
         timestamp: Date.now(),
-        ...(grammarNote ? { grammarNote } : {}),
-        ...(translation ? { translation } : {}),
+      })
+      const assistant = messages.value[messages.value.length - 1]!
+      const sections: Record<string, string> = { reply: '', grammar: '', translation: '' }
+
+      await readEventStream(res.body, (event, data) => {
+        if (event === 'error') throw new Error(data.message ?? 'stream error')
+        if (event === 'done' && data.source === 'fallback' && data.reason && !ownKey) {
+          const ms = LOCAL_FALLBACK_MS[data.reason]
+          if (ms) localUntil = Date.now() + ms
+        }
+        if (!(event in sections) || !data.text) return
+        sections[event] += data.text
+        if (event === 'reply') {
+          assistant.content = sections.reply!.trim()
+        } else if (event === 'grammar' && grammarMode.value) {
+          assistant.grammarNote = sections.grammar!.trim()
+        } else if (event === 'translation' && translationMode.value) {
+          assistant.translation = sections.translation!.trim()
+        }
       })
 
-      return reply
+      syncedCount = messages.value.length
+      return assistant.content
     } catch (err) {
       console.error('Chat error:', err)
-      messages.value.push({
-        role: 'assistant',
-        content: 'Sorry, something went wrong. Please try again.',
-        timestamp: Date.now(),
-      })
+      const last = messages.value[messages.value.length - 1]
+      // 連不上 backend（fetch 本身失敗，還沒有任何回覆）：改用本機題庫
+      if (err instanceof TypeError && last?.role === 'user') {
+        const reply = answerLocally(systemPrompt, text.trim())
+        if (reply !== null) return reply
+      }
+      if (last?.role === 'assistant' && !last.content) {
+        last.content = 'Sorry, something went wrong. Please try again.'
+      } else {
+        messages.value.push({
+          role: 'assistant',
+          content: 'Sorry, something went wrong. Please try again.',
+          timestamp: Date.now(),
+        })
+      }
       return null
     } finally {
       isLoading.value = false
@@ -165,11 +260,14 @@ export function useChat() {
 
   function clearHistory() {
     messages.value = []
+    resetConversation()
     addGreeting()
   }
 
   // 初始化招呼語
   addGreeting()
+  // 背景同步離線題庫（IndexedDB 快取 + 差異更新）
+  syncBank().catch(err => console.warn('Bank sync failed:', err))
 
   return {
     messages,
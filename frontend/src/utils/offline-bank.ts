@@ -0,0 +1,168 @@
+import { API_BASE } from '../config/api'
+
+/** 題庫快照中的一筆紀錄：練習題（type）或預建回應（scenario + keywords） */
+interface BankRecord {
+  type?: string
+  scenario?: string
+  keywords?: string[]
+  en: string
+  zh?: string
+}
+
+interface BankData {
+  version: string
+  records: Record<string, BankRecord>
+  /** 各場景預建回應的 key，依 keyword 匹配優先順序 */
+  order: Record<string, string[]>
+}
+
+interface SnapshotPayload extends BankData {
+  format: number
+}
+
+interface DeltaPayload {
+  format: number
+  version: string
+  base: string
+  upserts: Record<string, BankRecord>
+  deletes: string[]
+  order: Record<string, string[]>
+}
+
+export interface LocalReply {
+  reply: string
+  translation?: string
+}
+
+const SNAPSHOT_FORMAT = 1
+const DB_NAME = 'tutor-bank'
+const STORE = 'snapshot'
+const KEY = 'current'
+
+let bank: BankData | null = null
+let drillKeys: string[] = []
+let deck: string[] = []
+
+function openDb(): Promise<IDBDatabase> {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open(DB_NAME, 1)
+    req.onupgradeneeded = () => req.result.createObjectStore(STORE)
+    req.onsuccess = () => resolve(req.result)
+    req.onerror = () => reject(req.error)
+  })
+}
+
+async function withStore<T>(mode: IDBTransactionMode, run: (store: IDBObjectStore) => IDBRequest<T>): Promise<T> {
+  const db = await openDb()
+  try {
+    return await new Promise<T>((resolve, reject) => {
+      const req = run(db.transaction(STORE, mode).objectStore(STORE))
+      req.onsuccess = () => resolve(req.result)
+      req.onerror = () => reject(req.error)
+    })
+  } finally {
+    db.close()
+  }
+}
+
+function useBank(data: BankData) {
+  bank = data
+  drillKeys = Object.keys(data.records).filter(key => data.records[key]?.type)
+  deck = []
+}
+
+function applyDelta(base: BankData, delta: DeltaPayload): BankData {
+  const records = { ...base.records, ...delta.upserts }
+  for (const key of delta.deletes) delete records[key]
+  const order = { ...base.order }
+  for (const [scenario, keys] of Object.entries(delta.order)) {
+    if (keys.length) order[scenario] = keys
+    else delete order[scenario]
+  }
+  return { version: delta.version, records, order }
+}
+
+/**
+ * 同步本機題庫：先載入 IndexedDB 中的版本，再向後端要差異（沒有快取時拿完整快照）。
+ * 無痕模式等沒有 IndexedDB 的情況只保留在記憶體。
+ */
+export async function syncBank(): Promise<void> {
+  let cached: BankData | undefined
+  try {
+    cached = await withStore<BankData | undefined>('readonly', store => store.get(KEY))
+  } catch {
+    cached = undefined
+  }
+  if (cached && !bank) useBank(cached)
+  const current = bank ?? cached
+
+  const since = current ? `?since=${encodeURIComponent(current.version)}` : ''
+  const res = await fetch(`${API_BASE}/api/bank/snapshot${since}`)
+  if (res.status === 304 || !res.ok) return
+
+  const payload = (await res.json()) as SnapshotPayload | DeltaPayload
+  if (payload.format !== SNAPSHOT_FORMAT) return
+  let next: BankData
+  if ('base' in payload) {
+    if (!current || payload.base !== current.version) return
+    next = applyDelta(current, payload)
+  } else {
+    next = { version: payload.version, records: payload.records, order: payload.order }
+  }
+
+  useBank(next)
+  try {
+    await withStore('readwrite', store => store.put(next, KEY))
+  } catch {
+    // 寫不進 IndexedDB 時這次仍可用記憶體中的版本
+  }
+}
+
+/** 與後端 detect_scenario 相同的判斷 */
+function detectScenario(systemPrompt: string): string | null {
+  const prompt = systemPrompt.toLowerCase()
+  if (prompt.includes('interview')) return 'interview-prep'
+  if (prompt.includes('free chat') || prompt.includes('conversation partner')) return 'free-chat'
+  return null
+}
+
+function drawDrill(): BankRecord | undefined {
+  if (!deck.length) {
+    // 一輪內不重複出題（Fisher–Yates 洗牌）
+    deck = [...drillKeys]
+    for (let i = deck.length - 1; i > 0; i--) {
+      const j = Math.floor(Math.random() * (i + 1))
+      ;[deck[i], deck[j]] = [deck[j]!, deck[i]!]
+    }
+  }
+  const key = deck.pop()
+  return key ? bank?.records[key] : undefined
+}
+
+/**
+ * 在本機以快取的題庫回答（與後端題庫 fallback 相同：keyword 匹配預建回應，沒中就出練習題）。
+ * 不含語意檢索與文法檢查；題庫尚未同步時回傳 null。
+ */
+export function localFallbackReply(systemPrompt: string, userMessage: string, withTranslation: boolean): LocalReply | null {
+  if (!bank || !drillKeys.length) return null
+
+  let record: BankRecord | undefined
+  const scenario = detectScenario(systemPrompt)
+  if (scenario) {
+    const message = userMessage.toLowerCase().trim()
+    for (const key of bank.order[scenario] ?? []) {
+      const candidate = bank.records[key]
+      if (candidate?.keywords?.some(kw => message.includes(kw))) {
+        record = candidate
+        break
+      }
+    }
+  }
+  record ??= drawDrill()
+  if (!record) return null
+
+  return {
+    reply: record.en,
+    ...(withTranslation && record.zh ? { translation: record.zh } : {}),
+  }
+}